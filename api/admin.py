@@ -1,8 +1,41 @@
+from datetime import date
+
 from django.contrib import admin
-from .models import Patient, Doctor, Schedule, Appointment
+from .models import Patient, Doctor, Schedule, Appointment, ArchivedAppointment, ScheduleTemplate, WaitlistEntry
+from .scheduling import materialize_templates
 
 # Register your models here.
 admin.site.register(Patient)
 admin.site.register(Doctor)
 admin.site.register(Schedule)
-admin.site.register(Appointment)
\ No newline at end of file
+admin.site.register(Appointment)
+
+
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(admin.ModelAdmin):
+    list_display = ('id', 'patient', 'doctor', 'date', 'start_time', 'status', 'archived_at')
+    list_filter = ('status',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('patient', 'doctor', 'date', 'status', 'created_at')
+    list_filter = ('status',)
+
+
+@admin.register(ScheduleTemplate)
+class ScheduleTemplateAdmin(admin.ModelAdmin):
+    list_display = ('doctor', 'weekdays', 'start_time', 'end_time', 'slot_minutes', 'valid_from', 'valid_until', 'is_active')
+    list_filter = ('is_active',)
+    actions = ['generate_four_weeks']
+
+    @admin.action(description='Generate slots for the next 4 weeks')
+    def generate_four_weeks(self, request, queryset):
+        generated = materialize_templates(queryset.filter(is_active=True), date.today(), 4)
+        self.message_user(request, f'Generated {generated} slots (existing slots were left untouched).')
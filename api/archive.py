@@ -0,0 +1,100 @@
+"""
+Archival of past schedules.
+
+Nothing reads Schedule rows for past dates on the hot paths, but they
+stay in the table and its indexes, and vacuum keeps scanning them. Past
+slots are therefore moved out in small batches:
+
+- their appointments are copied, together with the slot's doctor, date
+  and times, into ArchivedAppointment. Patients still see them at
+  /api/appointments/history/.
+- the Schedule rows and any past SlotGrid rows are deleted, with any
+  SlotHold left on them. A past unbooked slot carries no history.
+
+Each batch is one statement in its own short transaction. It picks its
+rows with FOR UPDATE SKIP LOCKED on the date index, so it never queues
+behind a booking. It also gives up after LOCK_TIMEOUT if a concurrent
+cancellation holds one of the batch's appointments. That is shorter than
+Postgres' deadlock_timeout, so when the two collide the archiver backs
+off, not the patient's request. The batch is simply retried later.
+
+Archive tables are used rather than declarative date partitioning of
+api_schedule. A partitioned table needs the partition key in its primary
+key and in every unique constraint. That would change Schedule's id, its
+(doctor, date, start_time) constraint and the foreign key from
+Appointment.
+"""
+from django.db import connection, transaction
+
+from .models import Appointment, ArchivedAppointment, Schedule, SlotGrid, SlotHold, WaitlistEntry
+from .versioning import bump_versions_on_commit
+
+LOCK_TIMEOUT = '500ms'
+
+ARCHIVE_SCHEDULES_SQL = f"""
+WITH batch AS (
+    SELECT id, doctor_id, date, start_time, end_time FROM {Schedule._meta.db_table}
+    WHERE date < %(cutoff)s
+    ORDER BY date, start_time, id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+), moved AS (
+    -- = ANY(ARRAY(...)) probes the schedule_id index once per slot instead of hashing the whole table.
+    DELETE FROM {Appointment._meta.db_table} AS appointment USING batch
+    WHERE appointment.schedule_id = ANY(ARRAY(SELECT id FROM batch)) AND appointment.schedule_id = batch.id
+    RETURNING appointment.id, appointment.patient_id, batch.doctor_id, batch.date, batch.start_time,
+              batch.end_time, appointment.status, appointment.created_at
+), archived AS (
+    INSERT INTO {ArchivedAppointment._meta.db_table} (id, patient_id, doctor_id, date, start_time, end_time, status, created_at, archived_at)
+    SELECT id, patient_id, doctor_id, date, start_time, end_time, status, created_at, now() FROM moved
+), unlinked AS (
+    -- WaitlistEntry.appointment is SET_NULL.
+    UPDATE {WaitlistEntry._meta.db_table} SET appointment_id = NULL WHERE appointment_id = ANY(ARRAY(SELECT id FROM moved))
+), unheld AS (
+    -- Holds on past slots the sweeper has not released yet (see api.holds); they would fail the FK at commit.
+    DELETE FROM {SlotHold._meta.db_table} WHERE schedule_id = ANY(ARRAY(SELECT id FROM batch))
+), deleted AS (
+    DELETE FROM {Schedule._meta.db_table} WHERE id = ANY(ARRAY(SELECT id FROM batch)) RETURNING doctor_id
+)
+SELECT (SELECT count(*) FROM deleted), (SELECT count(*) FROM moved), ARRAY(SELECT DISTINCT doctor_id FROM deleted)
+"""
+
+DELETE_GRIDS_SQL = f"""
+DELETE FROM {SlotGrid._meta.db_table} WHERE id IN (
+    SELECT id FROM {SlotGrid._meta.db_table}
+    WHERE date < %(cutoff)s
+    ORDER BY date, start_time, id
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING doctor_id
+"""
+
+
+def archive_schedules(cutoff, limit):
+    """
+    Archive up to `limit` schedules dated before `cutoff`, oldest first, with
+    their appointments. Returns (schedules deleted, appointments archived).
+    A result of (0, 0) means nothing is left to do, or every remaining row
+    is locked right now.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(ARCHIVE_SCHEDULES_SQL, {'cutoff': cutoff, 'limit': limit})
+        schedules, appointments, doctor_ids = cursor.fetchone()
+        # Lists for past dates change; raw SQL sends no signals.
+        bump_versions_on_commit(doctor_ids)
+    return schedules, appointments
+
+
+def delete_slot_grids(cutoff, limit):
+    """
+    Delete up to `limit` slot grids dated before `cutoff`. Their booked slots
+    have Schedule rows, which archive_schedules handles. Returns the number deleted.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'")
+        cursor.execute(DELETE_GRIDS_SQL, {'cutoff': cutoff, 'limit': limit})
+        rows = cursor.fetchall()
+        bump_versions_on_commit({doctor_id for doctor_id, in rows})
+    return len(rows)
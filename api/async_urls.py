@@ -0,0 +1,17 @@
+"""
+Async versions of the read-heavy endpoints. Only routed under ASGI
+(see med_appointment/asgi_urls.py); the paths and names match api/urls.py,
+except for the slot event stream, which only exists under ASGI.
+"""
+from django.urls import path
+from .async_views import (
+    AsyncDoctorListView, AsyncDoctorDetailView, AsyncScheduleListView, AsyncAppointmentListView, SlotEventStreamView
+)
+
+urlpatterns = [
+    path('doctors/', AsyncDoctorListView.as_view(), name='doctor-list'),
+    path('doctors/<int:pk>/', AsyncDoctorDetailView.as_view(), name='doctor-detail'),
+    path('schedules/', AsyncScheduleListView.as_view(), name='schedule-list'),
+    path('schedules/events/', SlotEventStreamView.as_view(), name='schedule-events'),
+    path('appointments/', AsyncAppointmentListView.as_view(), name='appointment-list'),
+]
@@ -0,0 +1,320 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import (
+    APIException, AuthenticationFailed, NotAuthenticated, NotFound, ParseError, ValidationError
+)
+
+from .authentication import CachedTokenAuthentication
+from .caching import aget_or_compute, payload_key
+from .events import hub
+from .fastpath import dumps, row_serializer
+from .models import Appointment, Doctor, Schedule
+from .pagination import AppointmentCursorPagination, DoctorCursorPagination, ScheduleCursorPagination
+from .passwords import aauthenticate, ahash_password
+from .serializers import (
+    AppointmentSerializer, DoctorSerializer, EmailAuthTokenSerializer, PatientSerializer, ScheduleSerializer,
+    SlotEventQuerySerializer,
+)
+from .versioning import ROSTER_KEY, Validators, aget_version, doctor_key
+from .slotgrid import grid_storage_enabled
+from .views import (
+    AppointmentListCreateView, ScheduleListView, expanded_appointment_serializer, filter_schedules, schedule_version_key
+)
+
+
+class APIJsonResponse(HttpResponse):
+    """
+    JSON response that keeps the payload on `.data`, like DRF's Response, and
+    encodes it byte-for-byte the way DRF's JSONRenderer does (see api.fastpath.dumps).
+    """
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data), **kwargs)
+        self.data = data
+
+
+class AsyncAPIView(View):
+    """
+    Base for plain Django async views that speak the same JSON dialect as the DRF views.
+
+    DRF views are synchronous; under ASGI Django runs them all on a single
+    thread per worker. Endpoints that mostly wait (on the password hashing
+    pool, or the database) are written as async views instead so they don't
+    hold that thread.
+    """
+
+    authentication_classes = []
+    requires_authentication = False
+    # Same as views.ConditionalGetMixin.payload_cache_name; the sync and async views share entries.
+    payload_cache_name = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token-authenticated API, no session cookies: exempt from CSRF like DRF's APIView.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            await self.authenticate(request)
+            key = self.get_version_key(request, **kwargs) if request.method in ('GET', 'HEAD') else None
+            if key is None:
+                return await super().dispatch(request, *args, **kwargs)
+            # Same validators as views.ConditionalGetMixin; these views only render JSON.
+            version, updated_at = await aget_version(key)
+            validators = Validators(key, version, updated_at, variant=['application/json'], daily=self.version_is_daily(request))
+            not_modified = validators.evaluate(request)
+            if not_modified is not None:
+                return not_modified
+            payload = None
+            if self.payload_cache_name is not None:
+                payload = payload_key(
+                    self.payload_cache_name, key, version, updated_at, request.GET, request.build_absolute_uri('/'),
+                    self.version_is_daily(request),
+                )
+            if payload is None:
+                return validators.apply(await super().dispatch(request, *args, **kwargs))
+
+            async def fetch():
+                return (await super(AsyncAPIView, self).dispatch(request, *args, **kwargs)).data
+            return validators.apply(APIJsonResponse(await aget_or_compute(payload, fetch)))
+        except APIException as exc:
+            # Same body as DRF's exception handler: field errors as they are, anything else under 'detail'.
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            response = APIJsonResponse(data, status=exc.status_code)
+            retry_after = getattr(exc, 'retry_after', None)
+            if retry_after:
+                response['Retry-After'] = str(retry_after)
+            if isinstance(exc, (NotAuthenticated, AuthenticationFailed)) and self.authentication_classes:
+                response.status_code = status.HTTP_401_UNAUTHORIZED
+                response['WWW-Authenticate'] = self.authentication_classes[0]().authenticate_header(request)
+            return response
+
+    async def authenticate(self, request):
+        """
+        Mirrors DRF: a bad token is rejected even on public endpoints, and
+        `requires_authentication` views need a valid one.
+        """
+        request.auth = None
+        for authentication_class in self.authentication_classes:
+            result = await authentication_class().aauthenticate(request)
+            if result is not None:
+                request.user, request.auth = result
+                return
+        if self.requires_authentication:
+            raise NotAuthenticated()
+
+    def get_version_key(self, request, **kwargs):
+        """
+        The api.versioning counter GET responses depend on, or None for no conditional GET support.
+        """
+        return None
+
+    def version_is_daily(self, request):
+        return False
+
+    def parse_body(self, request):
+        if request.content_type == 'application/json':
+            try:
+                return json.loads(request.body or b'{}')
+            except ValueError as exc:
+                raise ParseError(f'JSON parse error - {exc}')
+        return request.POST.dict()
+
+
+class PatientRegistrationView(AsyncAPIView):
+    """
+    Allows new patients to register.
+    """
+    http_method_names = ['post']
+
+    async def post(self, request, format=None):
+        serializer = PatientSerializer(data=self.parse_body(request))
+        # Validation checks the email is unique, which needs the database.
+        if not await sync_to_async(serializer.is_valid)():
+            return APIJsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        password_hash = await ahash_password(serializer.validated_data['password'])
+        await sync_to_async(serializer.save)(password_hash=password_hash)
+        return APIJsonResponse(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class CustomAuthToken(AsyncAPIView):
+    """
+    Exchanges an email and password for the patient's API token.
+    """
+    http_method_names = ['post']
+
+    async def post(self, request, format=None):
+        serializer = EmailAuthTokenSerializer(data=self.parse_body(request))
+        if not serializer.is_valid():
+            return APIJsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        user = await aauthenticate(serializer.validated_data['email'], serializer.validated_data['password'])
+        if user is None:
+            return APIJsonResponse(
+                {'non_field_errors': ['Unable to log in with provided credentials.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        token, created = await Token.objects.aget_or_create(user=user)
+        return APIJsonResponse({
+            'token': token.key,
+            'user_id': user.pk,
+            'email': user.email
+        })
+
+
+class AsyncListView(AsyncAPIView):
+    """
+    Async, read-only counterpart of a DRF ListAPIView using the async ORM.
+
+    Other methods on the same URL are handed to `sync_view`, e.g. booking on
+    /api/appointments/, so one route can serve both.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    serializer_class = None
+    pagination_class = None
+    sync_view = None
+
+    def get_queryset(self, request):
+        raise NotImplementedError
+
+    def get_serializer_class(self, request):
+        return self.serializer_class
+
+    async def dispatch(self, request, *args, **kwargs):
+        if self.sync_view is not None and request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def get(self, request, format=None):
+        # Same values_list() read path as views.FastListMixin.
+        rows = row_serializer(self.get_serializer_class(request))
+        queryset = rows.values_list(self.get_queryset(request))
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(queryset, request)
+        if page is None:
+            return APIJsonResponse(rows.to_representation([row async for row in queryset]))
+        return APIJsonResponse(paginator.get_paginated_data(rows.to_representation(page)))
+
+
+class AsyncDoctorListView(AsyncListView):
+    """
+    Provides a list of all doctors, one cursor page at a time.
+    """
+    serializer_class = DoctorSerializer
+    pagination_class = DoctorCursorPagination
+    payload_cache_name = 'doctors'
+
+    def get_queryset(self, request):
+        return Doctor.objects.all()
+
+    def get_version_key(self, request, **kwargs):
+        return ROSTER_KEY
+
+
+class AsyncDoctorDetailView(AsyncAPIView):
+    """
+    Provides details of a single doctor.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+
+    def get_version_key(self, request, **kwargs):
+        return doctor_key(kwargs['pk'])
+
+    async def get(self, request, pk, format=None):
+        try:
+            doctor = await Doctor.objects.aget(pk=pk)
+        except Doctor.DoesNotExist:
+            raise NotFound('No Doctor matches the given query.')
+        return APIJsonResponse(DoctorSerializer(doctor).data)
+
+
+class AsyncScheduleListView(AsyncListView):
+    """
+    List schedules, filtered by doctor_id and date (see views.filter_schedules).
+    """
+    serializer_class = ScheduleSerializer
+    pagination_class = ScheduleCursorPagination
+    payload_cache_name = 'schedules'
+    grid_view = staticmethod(ScheduleListView.as_view())
+
+    async def dispatch(self, request, *args, **kwargs):
+        if grid_storage_enabled():
+            # Expanding slot grids streams rows through a server-side cursor; leave it to the DRF view.
+            return await sync_to_async(self.grid_view)(request, *args, **kwargs)
+        return await super().dispatch(request, *args, **kwargs)
+
+    def get_queryset(self, request):
+        return filter_schedules(Schedule.objects.all(), request.GET)
+
+    def get_version_key(self, request, **kwargs):
+        return schedule_version_key(request.GET)
+
+    def version_is_daily(self, request):
+        return 'date' not in request.GET
+
+
+class AsyncAppointmentListView(AsyncListView):
+    """
+    Lists the logged-in patient's appointments; bookings are handled by the sync view.
+    """
+    serializer_class = AppointmentSerializer
+    pagination_class = AppointmentCursorPagination
+    requires_authentication = True
+    sync_view = staticmethod(AppointmentListCreateView.as_view())
+
+    def get_queryset(self, request):
+        return Appointment.objects.filter(patient=request.user)
+
+    def get_serializer_class(self, request):
+        return expanded_appointment_serializer(request.GET)
+
+
+class SlotEventStreamView(AsyncAPIView):
+    """
+    Streams availability changes of a doctor's slots as Server-Sent Events.
+
+    Each booking or cancellation is sent as a 'slot' event carrying the
+    slot's id, doctor, date, start_time and is_available, within moments of
+    its commit (see api.events). A 'resync' event means events were lost
+    and the client should reload the schedule list. Comment lines are sent
+    every HEARTBEAT seconds so proxies keep idle streams open.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    HEARTBEAT = 15
+
+    async def get(self, request, format=None):
+        params = SlotEventQuerySerializer(data=request.GET)
+        if not params.is_valid():
+            raise ValidationError(params.errors)
+        query = params.validated_data
+        # Subscribe before answering, so no change committed after the response starts is missed.
+        subscription = await hub.subscribe(query['doctor_id'], query.get('date'))
+
+        response = StreamingHttpResponse(self.stream(subscription), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Let nginx pass events through instead of buffering the response.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def stream(self, subscription):
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(subscription.get(), self.HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                else:
+                    yield f'event: {event}\ndata: {data}\n\n'
+        finally:
+            hub.unsubscribe(subscription)
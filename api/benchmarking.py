@@ -0,0 +1,191 @@
+"""
+Helpers shared by the `bench_*` management commands.
+
+The benchmarks drive the real WSGI application in-process, so every request
+goes through the same middleware, authentication and connection handling as
+under gunicorn, minus the network hop.
+"""
+import io
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+
+
+def percentile(sorted_values, fraction):
+    """
+    Nearest-rank percentile of an already sorted list, e.g. fraction=0.95 for p95.
+    """
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def summarize_latencies(latencies):
+    """
+    Latency summary in milliseconds.
+    """
+    ordered = sorted(latencies)
+    if not ordered:
+        return {'count': 0}
+    return {
+        'count': len(ordered),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+class EndpointRecorder:
+    """
+    Thread-safe collection of latency, query count and status code per endpoint label.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, label, elapsed, status_code, query_count=None):
+        with self._lock:
+            self.latencies[label].append(elapsed)
+            self.statuses[label][status_code] += 1
+            if query_count is not None:
+                self.queries[label].append(query_count)
+
+    def report(self, wall_time):
+        endpoints = {}
+        for label, latencies in self.latencies.items():
+            queries = self.queries.get(label) or []
+            endpoints[label] = {
+                **summarize_latencies(latencies),
+                'throughput_rps': round(len(latencies) / wall_time, 2) if wall_time else None,
+                'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+                'max_queries': max(queries) if queries else None,
+                'statuses': {str(code): count for code, count in sorted(self.statuses[label].items())},
+            }
+        total = sum(len(latencies) for latencies in self.latencies.values())
+        return {
+            'wall_time_s': round(wall_time, 3),
+            'requests': total,
+            'throughput_rps': round(total / wall_time, 2) if wall_time else None,
+            'endpoints': endpoints,
+        }
+
+
+class WSGIClient:
+    """
+    Minimal in-process HTTP client that calls the project's WSGI application
+    directly and counts the queries each request runs on this thread's connection.
+    """
+
+    def __init__(self, application=None, token=None):
+        self.application = application or get_wsgi_application()
+        self.token = token
+
+    def request(self, method, path, data=None):
+        """
+        Returns (status_code, parsed JSON body or None, query_count).
+        """
+        url = urlsplit(path)
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': url.path,
+            'QUERY_STRING': url.query,
+            'SERVER_NAME': 'bench.local',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': io.StringIO(),
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if self.token:
+            environ['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+
+        captured = {}
+
+        def start_response(status, headers, exc_info=None):
+            captured['status'] = int(status.split(' ', 1)[0])
+
+        query_count = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal query_count
+            query_count += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            result = self.application(environ, start_response)
+            try:
+                content = b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+
+        try:
+            payload = json.loads(content) if content else None
+        except ValueError:
+            payload = None
+        return captured['status'], payload, query_count
+
+
+def timed(recorder, label, client, method, path, data=None):
+    """
+    Issue one request through `client`, record it under `label` and return (status, payload).
+    """
+    started = time.perf_counter()
+    status_code, payload, query_count = client.request(method, path, data)
+    recorder.record(label, time.perf_counter() - started, status_code, query_count)
+    return status_code, payload
+
+
+def run_metadata(options):
+    """
+    Context stored next to the numbers so runs from different commits can be diffed.
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'started_at': datetime.now(dt_timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'options': {key: value for key, value in options.items() if key not in ('stdout', 'stderr')},
+    }
+
+
+def default_output_path(benchmark, metadata):
+    suffix = metadata['commit'] or datetime.now().strftime('%Y%m%d%H%M%S')
+    return os.path.join(settings.BASE_DIR, 'bench-results', f'{benchmark}-{suffix}.json')
+
+
+def write_report(path, report):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as fh:
+        json.dump(report, fh, indent=2, sort_keys=True, default=str)
+    return path
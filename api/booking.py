@@ -0,0 +1,214 @@
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .events import publish_slot_changes
+from .jobs import enqueue, enqueue_many
+from .models import Appointment, Schedule
+from .slotgrid import GridSlot, claim_schedule_bit, claim_slot, get_slot, grid_storage_enabled, is_slot_ref, release_slot
+from .versioning import bump_versions_on_commit
+from .waitlist import assign_freed_schedules
+
+# Per-item outcomes of the batch operations.
+BOOKED = 'booked'
+CANCELLED = 'cancelled'
+UNAVAILABLE = 'unavailable'
+NOT_CANCELLABLE = 'not_cancellable'
+NOT_FOUND = 'not_found'
+SKIPPED = 'skipped'
+
+
+class SlotUnavailable(APIException):
+    """
+    Raised when a schedule was claimed by someone else between validation and booking.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This schedule is not available.'
+    default_code = 'slot_unavailable'
+
+
+def claim_schedule(schedule):
+    """
+    Take `schedule` off the market, or raise SlotUnavailable if someone else
+    got it first. Returns the slot's id as the schedule list shows it and the
+    Schedule row. Must run inside the caller's transaction.
+
+    The slot is claimed with a single conditional UPDATE, so concurrent
+    bookers race on the row itself instead of on an earlier read of
+    `is_available`. Exactly one of them sees a row count of 1.
+
+    `schedule` may also be a GridSlot (see api.slotgrid), whose bit is
+    claimed the same way before its Schedule row is created. A Schedule
+    made from a grid has its grid bit cleared too, so the slot cannot be
+    booked again through its reference.
+    """
+    slot_id = schedule.id
+    if isinstance(schedule, GridSlot):
+        schedule = claim_slot(schedule)
+        if schedule is None:
+            raise SlotUnavailable()
+    else:
+        claimed = Schedule.objects.filter(pk=schedule.pk, is_available=True).update(is_available=False)
+        # Raising rolls the row back with the caller's transaction.
+        if not claimed or (grid_storage_enabled() and not claim_schedule_bit(schedule)):
+            raise SlotUnavailable()
+    return slot_id, schedule
+
+
+def book_schedule(patient, schedule):
+    """
+    Claim `schedule` for `patient` (see claim_schedule) and create the appointment.
+    """
+    try:
+        with transaction.atomic():
+            slot_id, schedule = claim_schedule(schedule)
+            appointment = Appointment.objects.create(patient=patient, schedule=schedule)
+            enqueue('send_booking_confirmation', appointment_id=appointment.pk)
+            publish_slot_changes([(slot_id, schedule.doctor_id, schedule.date, schedule.start_time, False)])
+    except IntegrityError:
+        # Another booked appointment already points at this schedule.
+        raise SlotUnavailable()
+
+    schedule.is_available = False
+    return appointment
+
+
+def cancel_appointment(appointment):
+    """
+    Cancel a booked appointment and release its schedule, or hand it to the
+    next patient on the waitlist (see api.waitlist).
+
+    Returns False if the appointment was no longer booked, e.g. because a
+    concurrent request cancelled it first.
+    """
+    with transaction.atomic():
+        cancelled = Appointment.objects.filter(pk=appointment.pk, status='booked').update(status='cancelled')
+        if not cancelled:
+            return False
+        schedule = appointment.schedule
+        if assign_freed_schedules([schedule], released_by={schedule.pk: appointment.patient_id}):
+            Schedule.objects.filter(pk=schedule.pk).update(is_available=True)
+            # In grid mode the list shows the slot reference, unless the schedule was not made from a grid.
+            slot_id = (grid_storage_enabled() and release_slot(schedule)) or schedule.pk
+            publish_slot_changes([(slot_id, schedule.doctor_id, schedule.date, schedule.start_time, True)])
+        enqueue('send_cancellation_notice', appointment_id=appointment.pk)
+        # The booking side is covered by Appointment's post_save signal.
+        bump_versions_on_commit([appointment.schedule.doctor_id])
+
+    appointment.status = 'cancelled'
+    return True
+
+
+def book_schedules(patient, schedule_ids, all_or_nothing=True):
+    """
+    Book several schedules for `patient` in one transaction.
+
+    The requested rows are locked with one SELECT ... FOR UPDATE, in primary
+    key order so concurrent batches cannot deadlock, then the free ones are
+    claimed with one UPDATE and booked with one INSERT. Slot references (see
+    api.slotgrid) are claimed one at a time within the same transaction.
+
+    Returns [(schedule id, outcome, appointment or None), ...] in request
+    order. With `all_or_nothing`, any failure rolls the whole batch back and
+    the items that would have been booked are reported as SKIPPED.
+    """
+    pks = [value for value in schedule_ids if not is_slot_ref(value)]
+    outcomes = {}
+    schedules = {}
+    try:
+        with transaction.atomic():
+            rows = Schedule.objects.select_for_update().filter(pk__in=pks).order_by('pk')
+            found = {schedule.pk: schedule for schedule in rows.only('doctor_id', 'date', 'start_time', 'is_available')}
+            for pk in pks:
+                if pk not in found:
+                    outcomes[pk] = NOT_FOUND
+                elif not found[pk].is_available or (grid_storage_enabled() and not claim_schedule_bit(found[pk])):
+                    outcomes[pk] = UNAVAILABLE
+                else:
+                    schedules[pk] = found[pk]
+                    found[pk].is_available = False
+            if schedules:
+                Schedule.objects.filter(pk__in=list(schedules)).update(is_available=False)
+
+            for ref in schedule_ids:
+                if not is_slot_ref(ref):
+                    continue
+                slot = get_slot(ref)
+                schedule = claim_slot(slot) if slot is not None else None
+                if schedule is None:
+                    outcomes[ref] = NOT_FOUND if slot is None else UNAVAILABLE
+                else:
+                    schedules[ref] = schedule
+
+            if all_or_nothing and outcomes:
+                transaction.set_rollback(True)
+                return [(value, outcomes.get(value, SKIPPED), None) for value in schedule_ids]
+
+            appointments = dict(zip(schedules, Appointment.objects.bulk_create(
+                Appointment(patient=patient, schedule=schedule) for schedule in schedules.values()
+            )))
+            if appointments:
+                # bulk_create sends no post_save signals.
+                bump_versions_on_commit(schedule.doctor_id for schedule in schedules.values())
+                enqueue_many('send_booking_confirmation', [{'appointment_id': a.pk} for a in appointments.values()])
+                publish_slot_changes(
+                    (slot_id, schedule.doctor_id, schedule.date, schedule.start_time, False) for slot_id, schedule in schedules.items()
+                )
+    except IntegrityError:
+        # Another booked appointment already points at one of these schedules.
+        raise SlotUnavailable()
+
+    return [
+        (value, BOOKED, appointments[value]) if value in appointments else (value, outcomes[value], None)
+        for value in schedule_ids
+    ]
+
+
+def cancel_appointments(patient, appointment_ids, all_or_nothing=True):
+    """
+    Cancel several of `patient`'s appointments in one transaction: one locking
+    SELECT, then one UPDATE for the appointments and one for the schedules
+    nobody on the waitlist takes over.
+
+    Returns [(appointment id, outcome), ...] in request order. With
+    `all_or_nothing`, nothing is cancelled unless every appointment can be,
+    and the others are reported as SKIPPED.
+    """
+    with transaction.atomic():
+        rows = (
+            Appointment.objects.select_for_update(of=('self',))
+            .filter(pk__in=appointment_ids, patient=patient)
+            .order_by('pk')
+            .values_list('pk', 'status', 'schedule_id', 'schedule__doctor_id', 'schedule__date', 'schedule__start_time')
+        )
+        found = {pk: row for pk, *row in rows}
+        outcomes = {}
+        for pk in appointment_ids:
+            if pk not in found:
+                outcomes[pk] = NOT_FOUND
+            elif found[pk][0] != 'booked':
+                outcomes[pk] = NOT_CANCELLABLE
+
+        cancel = [pk for pk in appointment_ids if pk not in outcomes]
+        if all_or_nothing and outcomes:
+            return [(pk, outcomes.get(pk, SKIPPED)) for pk in appointment_ids]
+
+        if cancel:
+            Appointment.objects.filter(pk__in=cancel).update(status='cancelled')
+            released = assign_freed_schedules(
+                [
+                    Schedule(pk=schedule_id, doctor_id=doctor_id, date=day, start_time=start_time, is_available=False)
+                    for _, schedule_id, doctor_id, day, start_time in (found[pk] for pk in cancel)
+                ],
+                released_by={found[pk][1]: patient.pk for pk in cancel},
+            )
+            if released:
+                Schedule.objects.filter(pk__in=[schedule.pk for schedule in released]).update(is_available=True)
+            publish_slot_changes([
+                ((grid_storage_enabled() and release_slot(schedule)) or schedule.pk, schedule.doctor_id, schedule.date, schedule.start_time, True)
+                for schedule in released
+            ])
+            bump_versions_on_commit(found[pk][2] for pk in cancel)
+            enqueue_many('send_cancellation_notice', [{'appointment_id': pk} for pk in cancel])
+
+    return [(pk, outcomes.get(pk, CANCELLED)) for pk in appointment_ids]
@@ -0,0 +1,107 @@
+"""
+Cache of the serialized payloads behind the busiest public reads: the doctor
+roster and the per-doctor (and per-date) schedule listings.
+
+Payloads live in the 'api' cache (settings.CACHES): process memory by
+default, or a Redis-compatible server shared by every worker with
+API_CACHE_BACKEND=redis. Keys embed the api.versioning counter the listing
+already depends on for its ETag. Every write that can change a listing bumps
+that counter once it commits: bookings, cancellations, admin edits (through
+api/signals.py), bulk writes in api.booking and api.scheduling. The next read
+therefore looks under a new key and the stale entry is never served again;
+it just expires after API_CACHE_TTL. Because the version is read from the
+database, this holds across workers even with the per-process backend.
+
+When a hot key is missing, e.g. right after a booking moved its doctor's
+counter, only one request per key recomputes it (single flight). The others
+wait for that result instead of all running the same query.
+"""
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+API_CACHE = 'api'
+POLL_INTERVAL = 0.02  # seconds between checks while another request recomputes a key
+
+_missing = object()
+
+
+def payload_key(name, version_key, version, updated_at, params, origin, daily=False):
+    """
+    The cache key of a listing named `name` with these query parameters, at
+    this version of its counter, or None when the counter has never been
+    bumped and so can't tell two states of the data apart.
+
+    `origin` is the scheme and host the request came in on
+    (request.build_absolute_uri('/')): the payload's `next` link is an
+    absolute URL, so clients reaching the API under another host name or
+    over another scheme must not share it.
+    """
+    if updated_at is None:
+        return None
+    parts = [origin, version_key, str(version), updated_at.isoformat()]
+    if daily:
+        parts.append(timezone.localdate().isoformat())
+    parts.extend(f'{param}={value}' for param, values in sorted(params.lists()) for value in values)
+    return f'payload:{name}:' + hashlib.sha1('&'.join(parts).encode()).hexdigest()
+
+
+def get_or_compute(key, compute):
+    """
+    The cached value of `key`, or the result of `compute()`, cached. If
+    another request is already computing the key, wait for its result
+    (up to API_CACHE_LOCK_TIMEOUT) rather than computing it again.
+    """
+    cache = caches[API_CACHE]
+    value = cache.get(key, _missing)
+    if value is not _missing:
+        return value
+
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + settings.API_CACHE_LOCK_TIMEOUT
+    while not cache.add(lock, 1, settings.API_CACHE_LOCK_TIMEOUT):
+        time.sleep(POLL_INTERVAL)
+        value = cache.get(key, _missing)
+        if value is not _missing:
+            return value
+        if time.monotonic() >= deadline:
+            # The holder is stuck or gone; don't let this request hang with it.
+            return compute()
+
+    try:
+        value = compute()
+        cache.set(key, value)
+        return value
+    finally:
+        cache.delete(lock)
+
+
+async def aget_or_compute(key, compute):
+    """
+    Async counterpart of get_or_compute() for the async views; `compute` is a coroutine function.
+    """
+    cache = caches[API_CACHE]
+    value = await cache.aget(key, _missing)
+    if value is not _missing:
+        return value
+
+    lock = f'{key}:lock'
+    deadline = time.monotonic() + settings.API_CACHE_LOCK_TIMEOUT
+    while not await cache.aadd(lock, 1, settings.API_CACHE_LOCK_TIMEOUT):
+        await asyncio.sleep(POLL_INTERVAL)
+        value = await cache.aget(key, _missing)
+        if value is not _missing:
+            return value
+        if time.monotonic() >= deadline:
+            return await compute()
+
+    try:
+        value = await compute()
+        await cache.aset(key, value)
+        return value
+    finally:
+        await cache.adelete(lock)
@@ -0,0 +1,48 @@
+"""
+Database connection pool metrics.
+
+With DB_POOL on (the default), every worker process keeps one psycopg pool
+per database alias (see settings.DATABASES). A request checks a
+connection out on its first query and returns it when the request
+finishes. Before handing a connection out, the pool checks that it is
+still alive, so a restarted or failed-over server costs one reconnect
+rather than an error. The pool does the check itself, with the `check`
+callback (ConnectionPool.check_connection) that Django gives it when
+CONN_HEALTH_CHECKS is set; Django's per-request check skips pooled
+connections.
+
+Pools live in the worker, so pool_stats() describes only the process it
+runs in.
+"""
+from django.db import connections
+
+
+def pool_stats():
+    """
+    Counters of each pooled database alias in this process. Totals are since the pool was opened.
+    """
+    stats = {}
+    for alias in connections:
+        pool = getattr(connections[alias], 'pool', None)
+        if pool is None:
+            continue
+        raw = pool.get_stats()
+        size = raw.get('pool_size', 0)
+        idle = raw.get('pool_available', 0)
+        stats[alias] = {
+            'min_size': pool.min_size,
+            'max_size': pool.max_size,
+            'size': size,
+            'in_use': size - idle,
+            'idle': idle,
+            'waiting': raw.get('requests_waiting', 0),
+            'checkouts': raw.get('requests_num', 0),
+            'checkouts_queued': raw.get('requests_queued', 0),
+            'wait_ms_total': raw.get('requests_wait_ms', 0),
+            'checkout_timeouts': raw.get('requests_errors', 0),
+            'usage_ms_total': raw.get('usage_ms', 0),
+            'connections_opened': raw.get('connections_num', 0),
+            'connections_lost': raw.get('connections_lost', 0),
+            'returned_broken': raw.get('returns_bad', 0),
+        }
+    return stats
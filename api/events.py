@@ -0,0 +1,190 @@
+"""
+Slot availability events.
+
+Bookings and cancellations publish the slots they change on the
+'slot_changes' channel with PostgreSQL NOTIFY, inside their transaction:
+Postgres delivers the notification if and only if the change commits.
+
+Under ASGI each worker process keeps a single LISTEN connection (the `hub`)
+and fans the notifications out to its Server-Sent Events subscribers (see
+async_views.SlotEventStreamView). An idle subscriber costs an asyncio.Queue
+and an open socket, not a thread or a database connection, so one worker
+can hold thousands of them.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+
+import psycopg
+from django.db import connection, connections
+
+logger = logging.getLogger('api.events')
+
+CHANNEL = 'slot_changes'
+
+
+def publish_slot_changes(changes):
+    """
+    NOTIFY listeners about changed slots, as part of the current transaction.
+
+    `changes` yields (slot id, doctor id, date, start time, is_available),
+    where the slot id is what the schedule list shows: a Schedule primary key
+    or a "<grid id>:<index>" slot reference. All changes go out in one statement.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    payloads = [
+        # str() rather than isoformat(): instances created from strings keep them until reloaded.
+        json.dumps({'id': slot_id, 'doctor': doctor_id, 'date': str(day), 'start_time': str(start_time), 'is_available': is_available})
+        for slot_id, doctor_id, day, start_time, is_available in changes
+    ]
+    if not payloads:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload', [CHANNEL, payloads])
+
+
+class Subscription:
+    """
+    One subscriber's bounded queue of events for a doctor, optionally a single date.
+
+    A subscriber that falls more than `max_pending` events behind loses them
+    and gets a single 'resync' event instead, telling it to reload the list.
+    """
+    RESYNC = ('resync', '{}')
+
+    def __init__(self, doctor_id, day=None, max_pending=100):
+        self.doctor_id = doctor_id
+        self.day = day
+        self.queue = asyncio.Queue(maxsize=max_pending)
+
+    def matches(self, event):
+        return self.day is None or event['date'] == self.day
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(self.RESYNC)
+
+    async def get(self):
+        """
+        The next (event type, JSON data) pair.
+        """
+        return await self.queue.get()
+
+
+class SlotEventHub:
+    """
+    The per-process LISTEN connection and its subscribers.
+
+    The connection is opened on the first subscription and read by a task
+    on the event loop, so waiting for notifications costs no thread.
+    If it breaks, every subscriber is told to resync and the next
+    subscription (or the next reconnect attempt) opens a new one.
+    """
+    reconnect_delay = 1.0
+
+    def __init__(self, channel=CHANNEL):
+        self.channel = channel
+        self.subscribers = defaultdict(set)
+        self.connection = None
+        self.loop = None
+        self._connecting = None
+        self._reader = None
+
+    @property
+    def subscriber_count(self):
+        return sum(len(subscriptions) for subscriptions in self.subscribers.values())
+
+    async def subscribe(self, doctor_id, day=None):
+        subscription = Subscription(doctor_id, day.isoformat() if day else None)
+        self.subscribers[doctor_id].add(subscription)
+        await self.listen()
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscribers.get(subscription.doctor_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscribers[subscription.doctor_id]
+
+    def dispatch(self, payload):
+        """
+        Hand one notification payload to the subscribers of its doctor (and date).
+        """
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning('Ignoring malformed %s notification: %r', self.channel, payload)
+            return
+        for subscription in tuple(self.subscribers.get(event.get('doctor'), ())):
+            if subscription.matches(event):
+                subscription.put(('slot', payload))
+
+    def resync_all(self):
+        for subscriptions in self.subscribers.values():
+            for subscription in subscriptions:
+                subscription.put(Subscription.RESYNC)
+
+    async def listen(self):
+        loop = asyncio.get_running_loop()
+        if self.connection is not None and self.loop is loop:
+            return
+        if self.loop is not loop:
+            # A new event loop (e.g. a new test); the old reader is gone with the old loop.
+            self.close()
+            self.loop = loop
+        if connections['default'].vendor != 'postgresql':
+            return
+        if self._connecting is None:
+            self._connecting = loop.create_task(self._connect())
+        try:
+            await asyncio.shield(self._connecting)
+        except Exception:
+            logger.exception('Could not LISTEN on %s; retrying in %ss', self.channel, self.reconnect_delay)
+            loop.call_later(self.reconnect_delay, self._reconnect)
+
+    async def _connect(self):
+        try:
+            # A dedicated connection outside Django's pool: it stays open for the life of the process.
+            params = connections['default'].get_connection_params()
+            params.pop('cursor_factory', None)  # Django's cursor class is sync-only
+            self.connection = await psycopg.AsyncConnection.connect(autocommit=True, **params)
+            await self.connection.execute(f'LISTEN {self.channel}')
+            self._reader = self.loop.create_task(self._read(self.connection))
+        finally:
+            self._connecting = None
+
+    async def _read(self, listening):
+        try:
+            async for notify in listening.notifies():
+                self.dispatch(notify.payload)
+        except psycopg.Error:
+            if listening is not self.connection:
+                return  # closed on purpose
+            logger.exception('Lost the %s LISTEN connection', self.channel)
+            self.close()
+            self.resync_all()
+            self.loop.call_later(self.reconnect_delay, self._reconnect)
+
+    def _reconnect(self):
+        if self.subscribers and self.connection is None and self._connecting is None and self.loop.is_running():
+            self.loop.create_task(self.listen())
+
+    def close(self):
+        if self.connection is None:
+            return
+        listening, self.connection = self.connection, None
+        if self._reader is not None and self.loop is not None and not self.loop.is_closed():
+            self._reader.cancel()
+        self._reader = None
+        # Closing only shuts the socket; it needs no round trip, so it is safe from any loop.
+        listening.pgconn.finish()
+
+
+hub = SlotEventHub()
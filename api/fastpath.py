@@ -0,0 +1,178 @@
+"""
+Fast read path for the list endpoints.
+
+A ModelSerializer builds a model instance per row and calls every field's
+get_attribute()/to_representation() on it, which dominates CPU time on
+long schedule lists. RowSerializer derives a values_list() query from the
+same serializer and turns each row tuple straight into the dict the
+serializer would have produced. FastJSONRenderer (and `dumps` for the async
+views) then encodes it with orjson when it is installed.
+
+Both produce byte-for-byte the output of the regular serializer and
+JSONRenderer; api/tests.py checks this for every endpoint that uses them.
+"""
+import json
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import ISO_8601, api_settings
+from rest_framework.utils import encoders
+
+from .instrumentation import timed_section
+
+try:
+    import orjson
+except ImportError:  # optional: fall back to the standard library encoder
+    orjson = None
+
+# Representations that equal the database value for these field types.
+IDENTITY_FIELDS = (
+    serializers.IntegerField, serializers.CharField, serializers.BooleanField, serializers.PrimaryKeyRelatedField
+)
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _converter(field):
+    """
+    The function turning a database value into `field`'s representation, or None for identity.
+    """
+    if isinstance(field, IDENTITY_FIELDS) and not isinstance(field, serializers.ChoiceField):
+        return None
+    if isinstance(field, serializers.DateField):
+        if getattr(field, 'format', api_settings.DATE_FORMAT).lower() == ISO_8601:
+            return _isoformat
+    if isinstance(field, serializers.TimeField):
+        if getattr(field, 'format', api_settings.TIME_FORMAT).lower() == ISO_8601:
+            return _isoformat
+    # Anything else (timezone-aware datetimes, choices, ...) goes through the field itself.
+    return field.to_representation
+
+
+class RowSerializer:
+    """
+    Renders values_list() rows exactly like `serializer_class` renders model instances.
+
+    Plain model fields map to one column each. Nested ModelSerializers on a
+    non-null foreign key (e.g. the schedule and doctor of an expanded
+    appointment) map to the related columns, so they are read with the same
+    single JOINed query. Anything else (dotted sources, method fields, lists)
+    raises ImproperlyConfigured when the plan is built.
+    """
+
+    def __init__(self, serializer_class):
+        self.sources = []
+        self.plan = self._build_plan(serializer_class(), prefix='')
+        self.nested = any(isinstance(step, list) for _, step in self.plan)
+        self.names = [name for name, _ in self.plan]
+        self.converters = [step for _, step in self.plan]
+
+    def _build_plan(self, serializer, prefix):
+        """
+        [(field name, converter or nested plan), ...] in column order; appends
+        the columns to `self.sources` as it goes.
+        """
+        plan = []
+        model = serializer.Meta.model
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if (
+                isinstance(field, serializers.ModelSerializer) and field.source != '*' and '.' not in field.source
+                and not model._meta.get_field(field.source).null
+            ):
+                plan.append((field.field_name, self._build_plan(field, f'{prefix}{field.source}__')))
+                continue
+            if (
+                field.source == '*' or '.' in field.source
+                or isinstance(field, (serializers.BaseSerializer, serializers.SerializerMethodField))
+                or getattr(field, 'pk_field', None) is not None
+            ):
+                raise ImproperlyConfigured(
+                    f'{type(serializer).__name__}.{field.field_name} cannot be read with values_list().'
+                )
+            self.sources.append(prefix + field.source)
+            plan.append((field.field_name, _converter(field)))
+        return plan
+
+    def values_list(self, queryset):
+        # Named rows, so the keyset paginators can read their cursor fields off them.
+        return queryset.values_list(*self.sources, named=True)
+
+    def to_representation(self, rows):
+        with timed_section('serialize'):
+            if self.nested:
+                return [_render(self.plan, iter(row)) for row in rows]
+            names = self.names
+            converters = self.converters
+            return [
+                dict(zip(names, [
+                    value if convert is None or value is None else convert(value)
+                    for convert, value in zip(converters, row)
+                ]))
+                for row in rows
+            ]
+
+
+def _render(plan, values):
+    data = {}
+    for name, step in plan:
+        if isinstance(step, list):
+            data[name] = _render(step, values)
+        else:
+            value = next(values)
+            data[name] = value if step is None or value is None else step(value)
+    return data
+
+
+@lru_cache(maxsize=None)
+def row_serializer(serializer_class):
+    return RowSerializer(serializer_class)
+
+
+_encoder = encoders.JSONEncoder()
+
+
+def dumps(data):
+    """
+    Compact UTF-8 JSON, identical to DRF's JSONRenderer output for the same data.
+
+    orjson writes floats in its own shortest form (e.g. 1e16 rather than
+    1e+16); the payloads rendered here carry no floats.
+    """
+    if orjson is not None:
+        try:
+            content = orjson.dumps(data, default=_encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits: let the standard encoder have a go
+        else:
+            # Same JavaScript-safe escaping as JSONRenderer.
+            return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    content = json.dumps(data, cls=encoders.JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+    return content.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer using `dumps` for the default compact, UTF-8 output.
+    Indented output (e.g. `Accept: application/json; indent=4`) and non-default
+    JSON settings go through the regular renderer.
+
+    STRICT_JSON only matters for non-finite floats, which JSONRenderer refuses
+    and orjson writes as null. The list payloads carry no floats, so it does
+    not send them down the slow path.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        with timed_section('render'):
+            return dumps(data)
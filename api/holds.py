@@ -0,0 +1,163 @@
+"""
+Temporary holds on slots.
+
+Booking is a single POST, so two patients filling in the booking form can
+both see a slot as free, and one of them loses at submit. A patient can
+instead hold the slot when the form opens (POST /api/holds/). The hold
+claims the slot exactly like a booking does (see api.booking.claim_schedule),
+so it drops out of the schedule list and nobody else can book or hold it.
+Confirming the hold (POST /api/holds/<pk>/confirm/) turns it into an
+Appointment without racing anyone. Deleting it gives the slot back.
+
+A patient holds at most SLOT_HOLD_MAX_PER_PATIENT slots at a time, so
+nobody can take a doctor's whole schedule off the list by holding it.
+
+Holds are not timed one by one. Every round of `manage.py run_jobs`
+calls expire_holds(), which releases all holds past their `expires_at` in
+batches. Each batch deletes the oldest expired holds in one statement,
+taking them off the expires_at index with FOR UPDATE SKIP LOCKED. A hold
+that has expired but not yet been swept can no longer be confirmed.
+
+A slot given back, by the sweep or by its holder, goes to the waitlist
+first, exactly like a cancelled booking (see api.waitlist). Only the slots
+nobody waits for return to the schedule list.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .booking import claim_schedule
+from .events import publish_slot_changes
+from .jobs import enqueue
+from .models import Appointment, Patient, Schedule, SlotHold
+from .slotgrid import grid_storage_enabled, release_slot
+from .versioning import bump_versions_on_commit
+from .waitlist import assign_freed_schedules
+
+RELEASE_EXPIRED_SQL = f"""
+WITH expired AS (
+    SELECT id FROM {SlotHold._meta.db_table}
+    WHERE expires_at <= %(now)s
+    ORDER BY expires_at
+    LIMIT %(limit)s
+    FOR UPDATE SKIP LOCKED
+), released AS (
+    DELETE FROM {SlotHold._meta.db_table} WHERE id = ANY(ARRAY(SELECT id FROM expired)) RETURNING schedule_id, patient_id
+)
+SELECT schedule.id, schedule.doctor_id, schedule.date, schedule.start_time, released.patient_id
+FROM released JOIN {Schedule._meta.db_table} schedule ON schedule.id = released.schedule_id
+"""
+
+
+class HoldExpired(APIException):
+    """
+    Raised when a hold is confirmed after its expiry.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This hold has expired.'
+    default_code = 'hold_expired'
+
+
+class HoldLimitReached(APIException):
+    """
+    Raised when a patient who already holds SLOT_HOLD_MAX_PER_PATIENT slots asks for another.
+    """
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'You are already holding as many slots as allowed.'
+    default_code = 'hold_limit_reached'
+
+
+def hold_schedule(patient, schedule):
+    """
+    Claim `schedule` (a Schedule or GridSlot) for `patient` for SLOT_HOLD_SECONDS.
+    Raises SlotUnavailable if it is booked or held already, and
+    HoldLimitReached if the patient holds SLOT_HOLD_MAX_PER_PATIENT slots.
+    """
+    with transaction.atomic():
+        # Locking the patient makes concurrent holds by one patient count one after the other.
+        list(Patient.objects.select_for_update().filter(pk=patient.pk).values_list('pk', flat=True))
+        now = timezone.now()
+        if SlotHold.objects.filter(patient=patient, expires_at__gt=now).count() >= settings.SLOT_HOLD_MAX_PER_PATIENT:
+            raise HoldLimitReached()
+        slot_id, schedule = claim_schedule(schedule)
+        hold = SlotHold.objects.create(
+            patient=patient, schedule=schedule, expires_at=now + timedelta(seconds=settings.SLOT_HOLD_SECONDS)
+        )
+        publish_slot_changes([(slot_id, schedule.doctor_id, schedule.date, schedule.start_time, False)])
+        # Queryset update() sends no signals.
+        bump_versions_on_commit([schedule.doctor_id])
+    return hold
+
+
+def confirm_hold(hold):
+    """
+    Book the held slot for the hold's patient. The slot was claimed when the
+    hold was made, so this only fails once the hold has expired.
+    """
+    with transaction.atomic():
+        # The conditional DELETE races the sweeper on the hold row; only one of them gets it.
+        confirmed, _ = SlotHold.objects.filter(pk=hold.pk, expires_at__gt=timezone.now()).delete()
+        if not confirmed:
+            raise HoldExpired()
+        appointment = Appointment.objects.create(patient=hold.patient, schedule=hold.schedule)
+        enqueue('send_booking_confirmation', appointment_id=appointment.pk)
+    return appointment
+
+
+def release_hold(hold):
+    """
+    Give up a hold before it expires. Returns False if it was already confirmed or swept.
+    """
+    with transaction.atomic():
+        released, _ = SlotHold.objects.filter(pk=hold.pk).delete()
+        if not released:
+            return False
+        schedule = hold.schedule
+        give_back([(schedule.pk, schedule.doctor_id, schedule.date, schedule.start_time, hold.patient_id)])
+    return True
+
+
+def expire_holds(limit=None, now=None):
+    """
+    Release every hold that expired by `now`, `limit` holds per transaction.
+    Returns the number released.
+    """
+    limit = limit or settings.SLOT_HOLD_SWEEP_BATCH
+    now = now or timezone.now()
+    total = 0
+    while True:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(RELEASE_EXPIRED_SQL, {'now': now, 'limit': limit})
+                rows = cursor.fetchall()
+            give_back(rows)
+        total += len(rows)
+        if len(rows) < limit:
+            return total
+
+
+def give_back(rows):
+    """
+    Hand the schedules of released holds, as (id, doctor id, date, start
+    time, holder id), to the waitlist, and put the rest back on the list.
+    Must run inside the releasing transaction.
+    """
+    if not rows:
+        return
+    freed = assign_freed_schedules(
+        [Schedule(pk=pk, doctor_id=doctor_id, date=day, start_time=start_time, is_available=False) for pk, doctor_id, day, start_time, _ in rows],
+        released_by={pk: holder_id for pk, _, _, _, holder_id in rows},
+    )
+    if freed:
+        Schedule.objects.filter(pk__in=[schedule.pk for schedule in freed]).update(is_available=True)
+        publish_slot_changes([
+            # In grid mode the list shows the slot reference, unless the schedule was not made from a grid.
+            ((grid_storage_enabled() and release_slot(schedule)) or schedule.pk, schedule.doctor_id, schedule.date, schedule.start_time, True)
+            for schedule in freed
+        ])
+    # Queryset update() and the waitlist's bulk_create() send no signals.
+    bump_versions_on_commit(doctor_id for _, doctor_id, _, _, _ in rows)
@@ -0,0 +1,126 @@
+"""
+Idempotency-Key support for booking and cancelling.
+
+Mobile clients on flaky networks retry POST /api/appointments/ and PATCH
+/api/appointments/<pk>/cancel/. A retry sent with the same `Idempotency-Key`
+header gets the first attempt's response back from IdempotencyKey, read with
+one lookup on the (patient, key) unique index. It never runs the view again,
+so it can't fail with "not available" on the slot it booked itself.
+
+The first request inserts its key in the same transaction as the view's
+writes and stores the response before committing. A concurrent duplicate's
+insert blocks on the unique index until that commit, so the duplicate waits
+for the first request and replays its response instead of racing it. If the
+first request fails with a server error, its row rolls back with the rest
+and the waiting duplicate runs the request itself.
+
+Responses below 500 are stored, refusals included: a retry sees what the
+first attempt saw. A key reused for a different request is refused with
+422. Keys expire after IDEMPOTENCY_KEY_TTL; `manage.py
+purge_idempotency_keys` deletes expired ones.
+"""
+import functools
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+CLAIM_SQL = f"""
+    INSERT INTO {IdempotencyKey._meta.db_table} (patient_id, key, fingerprint, expires_at)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (patient_id, key) DO NOTHING
+    RETURNING id
+"""
+
+
+class IdempotencyKeyReused(APIException):
+    """
+    Raised when a key comes back with a different method, path or body.
+    """
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'This Idempotency-Key was already used for a different request.'
+    default_code = 'idempotency_key_reused'
+
+
+def request_fingerprint(request):
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.get_full_path().encode(), request.body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def idempotent(handler):
+    """
+    Decorates a DRF view method so that requests carrying an Idempotency-Key
+    run at most once per patient and key.
+    """
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return handler(view, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise ValidationError({HEADER: [f'Must be between 1 and {MAX_KEY_LENGTH} characters.']})
+
+        fingerprint = request_fingerprint(request)
+        stored = lookup(request.user, key)
+        if stored is None:
+            with transaction.atomic():
+                stored = claim(request.user, key, fingerprint)
+                if stored is None:
+                    return run(view, handler, request, key, *args, **kwargs)
+        return replay(stored, fingerprint)
+    return wrapper
+
+
+def lookup(patient, key):
+    return IdempotencyKey.objects.filter(patient=patient, key=key, expires_at__gt=timezone.now()).first()
+
+
+def claim(patient, key, fingerprint):
+    """
+    Insert the key for this request and return None, or return the row of a
+    request with the same key that committed while this one waited.
+    """
+    now = timezone.now()
+    # An expired key may be reused for a new request.
+    IdempotencyKey.objects.filter(patient=patient, key=key, expires_at__lte=now).delete()
+    with connection.cursor() as cursor:
+        cursor.execute(CLAIM_SQL, [patient.pk, key, fingerprint, now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)])
+        if cursor.fetchone() is not None:
+            return None
+    return IdempotencyKey.objects.get(patient=patient, key=key)
+
+
+def run(view, handler, request, key, *args, **kwargs):
+    try:
+        response = handler(view, request, *args, **kwargs)
+    except Exception as exc:
+        # Turns API errors into their responses, so they are stored too; anything else propagates and rolls back.
+        response = view.handle_exception(exc)
+    stored = IdempotencyKey.objects.filter(patient=request.user, key=key)
+    if response.status_code >= 500:
+        stored.delete()
+    else:
+        stored.update(status_code=response.status_code, response=response.data)
+    return response
+
+
+def replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        raise IdempotencyKeyReused()
+    response = Response(stored.response, status=stored.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
@@ -0,0 +1,142 @@
+"""
+Per-request timing: total time, database time and query count, and time spent
+in named sections such as serialization.
+
+Numbers are collected in a context variable, so they follow a request into
+sync_to_async threads under ASGI as well as through plain WSGI requests.
+PerformanceMiddleware reports them as a Server-Timing header and a
+structured log line.
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+logger = logging.getLogger('api.performance')
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.sections = {}
+
+    def add_section(self, name, elapsed):
+        self.sections[name] = self.sections.get(name, 0.0) + elapsed
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+
+def current_metrics():
+    return _current.get()
+
+
+@contextmanager
+def timed_section(name):
+    """
+    Attribute the time spent in the block to `name` for the current request, if any.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_section(name, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    connection_created receiver that makes every database connection report into the current request.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class PerformanceMiddleware:
+    """
+    Adds a Server-Timing header to every response and logs one JSON line per
+    request, at WARNING when the request ran more than PERFORMANCE_QUERY_BUDGET
+    queries so N+1 regressions stand out.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.report(request, response, metrics)
+
+    def report(self, request, response, metrics):
+        total_ms = metrics.total_time * 1000
+        db_ms = metrics.db_time * 1000
+        budget = settings.PERFORMANCE_QUERY_BUDGET
+
+        if settings.PERFORMANCE_SERVER_TIMING:
+            timings = [
+                f'total;dur={total_ms:.1f}',
+                f'db;dur={db_ms:.1f};desc="{metrics.queries} queries"',
+            ]
+            timings.extend(f'{name};dur={elapsed * 1000:.1f}' for name, elapsed in metrics.sections.items())
+            response['Server-Timing'] = ', '.join(timings)
+
+        match = getattr(request, 'resolver_match', None)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(db_ms, 2),
+            'queries': metrics.queries,
+            **{f'{name}_ms': round(elapsed * 1000, 2) for name, elapsed in metrics.sections.items()},
+        }
+        if metrics.queries > budget:
+            record['query_budget'] = budget
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
+        return response
@@ -0,0 +1,152 @@
+"""
+Background jobs stored in PostgreSQL.
+
+Side effects of a booking or cancellation (emails, reminders, audit
+records, ...) are written as Job rows in the same transaction as the
+booking itself, so they happen if and only if it commits, and run later in
+`manage.py run_jobs` instead of in the request. No broker is needed.
+
+Workers claim due jobs in batches with SELECT ... FOR UPDATE SKIP LOCKED:
+any number of them can poll the same queue, each batch goes to exactly one
+worker, and nobody waits on another worker's locks. A failed job is retried
+with exponential backoff until it runs out of attempts and is kept as
+'failed'; a successful one is deleted. Jobs left 'running' by a worker
+that died are put back in the queue after JOB_LOCK_TIMEOUT seconds, or
+marked as 'failed' if that was their last attempt.
+
+Handlers are plain functions taking the payload as keyword arguments:
+
+    @job('send_booking_confirmation')
+    def send_booking_confirmation(appointment_id):
+        ...
+
+    enqueue('send_booking_confirmation', appointment_id=appointment.pk)
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger('api.jobs')
+
+DEFAULT_QUEUE = 'default'
+
+handlers = {}
+
+
+def job(name):
+    """
+    Register the decorated function as the handler for jobs called `name`.
+    """
+    def register(func):
+        handlers[name] = func
+        return func
+    return register
+
+
+def enqueue(name, queue=DEFAULT_QUEUE, delay=None, **payload):
+    """
+    Queue a job, due now or after `delay` (a timedelta). Call it inside the
+    transaction of the write that causes it.
+    """
+    return enqueue_many(name, [payload], queue=queue, delay=delay)[0]
+
+
+def enqueue_many(name, payloads, queue=DEFAULT_QUEUE, delay=None):
+    """
+    Queue one job per payload with a single INSERT.
+    """
+    if name not in handlers:
+        raise KeyError(f'No job handler registered for "{name}".')
+    run_at = timezone.now() + (delay or timedelta())
+    return Job.objects.bulk_create(Job(queue=queue, name=name, payload=payload, run_at=run_at) for payload in payloads)
+
+
+def retry_delay(attempts):
+    """
+    Exponential backoff: JOB_RETRY_BACKOFF seconds after the first failure, doubling up to JOB_RETRY_BACKOFF_MAX.
+    """
+    return timedelta(seconds=min(settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1), settings.JOB_RETRY_BACKOFF_MAX))
+
+
+def claim_jobs(worker, queue=DEFAULT_QUEUE, limit=20):
+    """
+    Lock up to `limit` due jobs of `queue`, oldest first, skipping jobs other
+    workers hold, and mark them as running for `worker`. One SELECT and one
+    UPDATE however many jobs are claimed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status='queued', queue=queue, run_at__lte=now)
+            .order_by('run_at', 'id')[:limit]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[claimed.pk for claimed in jobs]).update(
+                status='running', locked_at=now, locked_by=worker, attempts=F('attempts') + 1
+            )
+    for claimed in jobs:
+        claimed.status = 'running'
+        claimed.locked_at = now
+        claimed.locked_by = worker
+        claimed.attempts += 1
+    return jobs
+
+
+def requeue_stale_jobs():
+    """
+    Put jobs back in the queue whose worker has held them longer than
+    JOB_LOCK_TIMEOUT seconds. Jobs that have used up their attempts are
+    marked as failed instead, so a job that kills its worker every time is
+    not retried forever. Returns the number requeued.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+    stale = Job.objects.filter(status='running', locked_at__lt=cutoff)
+    with transaction.atomic():
+        failed = stale.filter(attempts__gte=F('max_attempts')).update(
+            status='failed', locked_at=None, locked_by='', last_error='Worker stopped responding on the last attempt.'
+        )
+        if failed:
+            logger.error('%s stale jobs were out of attempts and marked as failed', failed)
+        return stale.update(status='queued', locked_at=None, locked_by='')
+
+
+def run_jobs(jobs):
+    """
+    Run claimed jobs, each in its own transaction, then record the outcomes
+    in bulk: finished jobs are deleted, failed ones rescheduled with backoff
+    or, out of attempts, marked as failed. Returns (succeeded, failed).
+    """
+    done = []
+    retried = []
+    for claimed in jobs:
+        try:
+            handler = handlers[claimed.name]
+            with transaction.atomic():
+                handler(**claimed.payload)
+        except Exception:
+            logger.exception('Job %s (%s) failed on attempt %s', claimed.pk, claimed.name, claimed.attempts)
+            claimed.last_error = traceback.format_exc()
+            claimed.locked_at = None
+            claimed.locked_by = ''
+            if claimed.attempts >= claimed.max_attempts:
+                claimed.status = 'failed'
+            else:
+                claimed.status = 'queued'
+                claimed.run_at = timezone.now() + retry_delay(claimed.attempts)
+            retried.append(claimed)
+        else:
+            done.append(claimed.pk)
+
+    if done:
+        Job.objects.filter(pk__in=done).delete()
+    if retried:
+        Job.objects.bulk_update(retried, ['status', 'run_at', 'locked_at', 'locked_by', 'last_error'])
+    return len(done), len(retried)
@@ -0,0 +1,60 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError
+from django.utils import timezone
+from api.archive import archive_schedules, delete_slot_grids
+
+
+class Command(BaseCommand):
+    help = 'Moves schedules older than ARCHIVE_AFTER_DAYS and their appointments to the archive, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Archive slots older than this many days. Defaults to ARCHIVE_AFTER_DAYS.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Schedules moved per transaction.')
+        parser.add_argument('--pause', type=float, default=0.0, help='Seconds to sleep between batches, e.g. to let replicas catch up.')
+        parser.add_argument('--max-batches', type=int, default=None, help='Stop after this many batches per table.')
+
+    def handle(self, *args, **options):
+        days = settings.ARCHIVE_AFTER_DAYS if options['days'] is None else options['days']
+        if days < 1 or options['batch_size'] <= 0:
+            raise CommandError('--days and --batch-size must be positive.')
+        cutoff = timezone.localdate() - timedelta(days=days)
+        self.options = options
+
+        schedules = appointments = 0
+        for moved_schedules, moved_appointments in self.batches(archive_schedules, cutoff, (0, 0)):
+            schedules += moved_schedules
+            appointments += moved_appointments
+        grids = sum(self.batches(delete_slot_grids, cutoff, 0))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {appointments} appointments, deleted {schedules} schedules and {grids} slot grids dated before {cutoff}.'
+        ))
+
+    def batches(self, run_batch, cutoff, empty):
+        """
+        Run `run_batch` until it finds nothing left. A batch that timed out on a
+        lock held by a live request is retried after a pause.
+        """
+        count = 0
+        retries = 0
+        while self.options['max_batches'] is None or count < self.options['max_batches']:
+            try:
+                result = run_batch(cutoff, self.options['batch_size'])
+            except OperationalError as exc:
+                retries += 1
+                if retries > 5:
+                    raise CommandError(f'Giving up after repeated lock timeouts: {exc}')
+                self.stderr.write(f'Batch skipped ({exc}); retrying.')
+                time.sleep(max(self.options['pause'], 1.0))
+                continue
+            if result == empty:
+                break
+            count += 1
+            retries = 0
+            yield result
+            if self.options['pause']:
+                time.sleep(self.options['pause'])
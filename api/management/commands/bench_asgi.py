@@ -0,0 +1,144 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import date, time as dt_time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from api.benchmarking import EndpointRecorder, default_output_path, run_metadata, write_report
+from api.models import Doctor, Schedule
+
+BENCH_DOCTOR_NAME = 'ASGI Bench Doctor'
+
+SERVERS = {
+    'wsgi': ['med_appointment.wsgi:application'],
+    'asgi': ['med_appointment.asgi:application', '--worker-class', 'uvicorn_worker.UvicornWorker'],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def slow_get(port, path, delay):
+    """
+    GET `path` like a client on a slow link: the headers arrive in two parts, `delay` seconds apart.
+    Returns the HTTP status code, or 0 if the connection failed.
+    """
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return 0
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: bench.local\r\n'.encode('ascii'))
+        await writer.drain()
+        await asyncio.sleep(delay)
+        writer.write(b'Accept: application/json\r\nConnection: close\r\n\r\n')
+        await writer.drain()
+        response = await reader.read()
+        return int(response.split(b' ', 2)[1]) if response else 0
+    except (OSError, ValueError, IndexError):
+        return 0
+    finally:
+        writer.close()
+
+
+class Command(BaseCommand):
+    help = 'Compares the WSGI and ASGI deployments at equal worker counts under many concurrent slow clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn workers for both deployments.')
+        parser.add_argument('--clients', type=int, default=100, help='Concurrent slow clients.')
+        parser.add_argument('--requests', type=int, default=5, help='Requests each client sends.')
+        parser.add_argument('--client-delay', type=float, default=0.2, help='Seconds each client stalls mid-request.')
+        parser.add_argument('--modes', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+        parser.add_argument('--output', default=None, help='Where to write the JSON report. Defaults to bench-results/asgi-<commit>.json.')
+
+    def handle(self, *args, **options):
+        metadata = run_metadata(options)
+        doctor = self._setup()
+        paths = [
+            '/api/doctors/',
+            f'/api/doctors/{doctor.pk}/',
+            f'/api/schedules/?doctor_id={doctor.pk}',
+        ]
+
+        results = {}
+        try:
+            for mode in options['modes']:
+                results[mode] = self._run_mode(mode, paths, options)
+        finally:
+            self._cleanup()
+
+        report = {'benchmark': 'asgi', **metadata, 'modes': results}
+        path = write_report(options['output'] or default_output_path('asgi', metadata), report)
+
+        for mode, result in results.items():
+            self.stdout.write(f'{mode}: {result["requests"]} requests in {result["wall_time_s"]}s ({result["throughput_rps"]} req/s)')
+            for label, stats in result['endpoints'].items():
+                self.stdout.write(
+                    f'  {label:<16} p50={stats["p50_ms"]:>9}ms  p95={stats["p95_ms"]:>9}ms  '
+                    f'p99={stats["p99_ms"]:>9}ms  statuses={stats["statuses"]}'
+                )
+        self.stdout.write(self.style.SUCCESS(f'Report written to {path}'))
+
+    def _run_mode(self, mode, paths, options):
+        port = free_port()
+        command = [
+            sys.executable, '-m', 'gunicorn', *SERVERS[mode],
+            '--workers', str(options['workers']),
+            '--bind', f'127.0.0.1:{port}',
+            '--log-level', 'warning',
+        ]
+        env = {**os.environ, 'PERFORMANCE_LOG_LEVEL': 'WARNING'}
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            self._wait_until_ready(port, server)
+            return asyncio.run(self._drive(port, paths, options))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    def _wait_until_ready(self, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Server exited with code {server.returncode} before becoming ready.')
+            if asyncio.run(slow_get(port, '/api/doctors/', 0)) == 200:
+                return
+            time.sleep(0.2)
+        raise CommandError('Server did not become ready in time.')
+
+    async def _drive(self, port, paths, options):
+        recorder = EndpointRecorder()
+        labels = ['doctor-list', 'doctor-detail', 'schedule-list']
+
+        async def client(client_index):
+            for request_index in range(options['requests']):
+                which = (client_index + request_index) % len(paths)
+                started = time.perf_counter()
+                status_code = await slow_get(port, paths[which], options['client_delay'])
+                recorder.record(labels[which], time.perf_counter() - started, status_code)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(options['clients'])))
+        return recorder.report(time.perf_counter() - started)
+
+    def _setup(self):
+        self._cleanup()
+        doctor = Doctor.objects.create(name=BENCH_DOCTOR_NAME, specialty='Benchmarking', department='QA')
+        first_day = date.today() + timedelta(days=1)
+        Schedule.objects.bulk_create(
+            Schedule(doctor=doctor, date=first_day + timedelta(days=day), start_time=dt_time(hour), end_time=dt_time(hour, 30))
+            for day in range(14)
+            for hour in range(8, 18)
+        )
+        return doctor
+
+    def _cleanup(self):
+        Doctor.objects.filter(name=BENCH_DOCTOR_NAME).delete()
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import Counter
+from datetime import date, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from rest_framework.authtoken.models import Token
+from api.benchmarking import summarize_latencies
+from api.models import Patient, Doctor, Schedule, Appointment
+
+BENCH_DOCTOR_NAME = 'Contention Bench Doctor'
+BENCH_EMAIL_DOMAIN = 'contention.bench'
+
+
+class Command(BaseCommand):
+    help = 'Fires N parallel bookers at a single schedule and reports how the race was settled'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookers', type=int, default=50, help='Number of concurrent bookers per slot.')
+        parser.add_argument('--rounds', type=int, default=5, help='Number of slots to fight over.')
+
+    def handle(self, *args, **options):
+        bookers = options['bookers']
+        rounds = options['rounds']
+
+        doctor, tokens = self._setup(bookers)
+        try:
+            statuses = Counter()
+            latencies = []
+            oversold = 0
+
+            for round_number in range(rounds):
+                schedule = Schedule.objects.create(
+                    doctor=doctor,
+                    date=date.today() + timedelta(days=1),
+                    start_time=dt_time(8 + round_number // 60, round_number % 60),
+                    end_time=dt_time(23, 59),
+                    is_available=True
+                )
+                round_statuses, round_latencies = self._race(schedule, tokens)
+                statuses.update(round_statuses)
+                latencies.extend(round_latencies)
+
+                booked = Appointment.objects.filter(schedule=schedule, status='booked').count()
+                if booked != 1:
+                    oversold += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'Round {round_number + 1}: {booked} booked appointments for one schedule.'
+                    ))
+
+            summary = summarize_latencies(latencies)
+            self.stdout.write(f'Bookers per slot: {bookers}, rounds: {rounds}, requests: {summary["count"]}')
+            for code, count in sorted(statuses.items()):
+                self.stdout.write(f'  HTTP {code}: {count}')
+            self.stdout.write(
+                f'Latency ms  p50={summary["p50_ms"]}  p95={summary["p95_ms"]}  '
+                f'p99={summary["p99_ms"]}  max={summary["max_ms"]}'
+            )
+
+            if oversold or statuses[201] != rounds or statuses[500]:
+                self.stdout.write(self.style.ERROR('Booking race was NOT settled cleanly.'))
+            else:
+                self.stdout.write(self.style.SUCCESS('Every slot was booked exactly once; losers got clean responses.'))
+        finally:
+            self._cleanup()
+
+    def _setup(self, bookers):
+        self._cleanup()
+        doctor = Doctor.objects.create(name=BENCH_DOCTOR_NAME, specialty='Benchmarking', department='QA')
+        tokens = []
+        for i in range(bookers):
+            patient = Patient(email=f'booker{i}@{BENCH_EMAIL_DOMAIN}')
+            patient.set_unusable_password()
+            patient.save()
+            tokens.append(Token.objects.create(user=patient).key)
+        return doctor, tokens
+
+    def _cleanup(self):
+        Doctor.objects.filter(name=BENCH_DOCTOR_NAME).delete()
+        Patient.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').delete()
+
+    def _race(self, schedule, tokens):
+        barrier = threading.Barrier(len(tokens))
+        lock = threading.Lock()
+        statuses = Counter()
+        latencies = []
+
+        def book(token):
+            client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Token {token}')
+            try:
+                barrier.wait()
+                started = time.perf_counter()
+                response = client.post(
+                    '/api/appointments/', {'schedule': schedule.pk}, content_type='application/json'
+                )
+                elapsed = time.perf_counter() - started
+                with lock:
+                    statuses[response.status_code] += 1
+                    latencies.append(elapsed)
+            finally:
+                # Each thread opened its own connection; don't leak it.
+                connection.close()
+
+        threads = [threading.Thread(target=book, args=(token,)) for token in tokens]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses, latencies
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+from api.benchmarking import EndpointRecorder, default_output_path, run_metadata, write_report
+from api.models import Doctor, Patient
+from .bench_asgi import SERVERS, free_port, slow_get
+from .bench_slot_events import http_request
+
+BENCH_DOCTOR_NAME = 'Pool Bench Doctor'
+BENCH_EMAIL = 'pool-bench@example.com'
+
+
+class Command(BaseCommand):
+    help = 'Measures per-request latency of the doctor detail endpoint with and without connection pooling, under WSGI and ASGI'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='gunicorn workers per server.')
+        parser.add_argument('--clients', type=int, default=8, help='Concurrent clients.')
+        parser.add_argument('--requests', type=int, default=200, help='Requests each client sends.')
+        parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['wsgi', 'asgi'])
+        parser.add_argument('--output', default=None, help='Where to write the JSON report. Defaults to bench-results/db-pool-<commit>.json.')
+
+    def handle(self, *args, **options):
+        metadata = run_metadata(options)
+        doctor, token = self._setup()
+        path = f'/api/doctors/{doctor.pk}/'
+
+        results = {}
+        try:
+            for server in options['servers']:
+                for pooled in (False, True):
+                    mode = f'{server}-{"pool" if pooled else "no-pool"}'
+                    results[mode] = self._run_mode(server, pooled, path, token, options)
+        finally:
+            self._cleanup()
+
+        report = {'benchmark': 'db-pool', **metadata, 'modes': results}
+        output = write_report(options['output'] or default_output_path('db-pool', metadata), report)
+
+        for mode, result in results.items():
+            stats = result['endpoints']['doctor-detail']
+            line = (
+                f'{mode:<14} {result["throughput_rps"]:>8} req/s  p50={stats["p50_ms"]:>8}ms  '
+                f'p95={stats["p95_ms"]:>8}ms  p99={stats["p99_ms"]:>8}ms  statuses={stats["statuses"]}'
+            )
+            pool = result.get('pool')
+            if pool:
+                line += f'  pool: {pool["connections_opened"]} connections for {pool["checkouts"]} checkouts, {pool["wait_ms_total"]}ms waited'
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(f'Report written to {output}'))
+
+    def _run_mode(self, server_type, pooled, path, token, options):
+        port = free_port()
+        command = [
+            sys.executable, '-m', 'gunicorn', *SERVERS[server_type],
+            '--workers', str(options['workers']),
+            '--bind', f'127.0.0.1:{port}',
+            '--log-level', 'warning',
+        ]
+        env = {**os.environ, 'PERFORMANCE_LOG_LEVEL': 'WARNING', 'DB_POOL': 'true' if pooled else 'false'}
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        try:
+            self._wait_until_ready(port, server, path)
+            result = asyncio.run(self._drive(port, path, options))
+            if pooled:
+                # With one worker this is the whole server's pool; otherwise whichever worker answers.
+                status_code, _, body = asyncio.run(http_request(port, 'GET', '/api/metrics/db-pool/', {'Authorization': f'Token {token}'}))
+                if status_code == 200:
+                    result['pool'] = json.loads(body)['pools'].get('default')
+            return result
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    def _wait_until_ready(self, port, server, path, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Server exited with code {server.returncode} before becoming ready.')
+            if asyncio.run(slow_get(port, path, 0)) == 200:
+                return
+            time.sleep(0.2)
+        raise CommandError('Server did not become ready in time.')
+
+    async def _drive(self, port, path, options):
+        recorder = EndpointRecorder()
+
+        async def client():
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                status_code = await slow_get(port, path, 0)
+                recorder.record('doctor-detail', time.perf_counter() - started, status_code)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['clients'])))
+        return recorder.report(time.perf_counter() - started)
+
+    def _setup(self):
+        self._cleanup()
+        doctor = Doctor.objects.create(name=BENCH_DOCTOR_NAME, specialty='Benchmarking', department='QA')
+        staff = Patient.objects.create(email=BENCH_EMAIL, is_staff=True)
+        return doctor, Token.objects.create(user=staff).key
+
+    def _cleanup(self):
+        Doctor.objects.filter(name=BENCH_DOCTOR_NAME).delete()
+        Patient.objects.filter(email=BENCH_EMAIL).delete()
@@ -0,0 +1,64 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from api.benchmarking import default_output_path, run_metadata, summarize_latencies, write_report
+from api.models import Doctor
+from api.search import search_doctors
+
+BENCH_DEPARTMENT = 'Search Bench'
+FIRST_NAMES = ['Emily', 'Ben', 'Carla', 'Gregory', 'Alan', 'Ellie', 'Ming', 'Yi-Ting', 'Hao', 'Sofia', 'Omar', 'Priya']
+LAST_NAMES = ['Carter', 'Adams', 'Cardenas', 'House', 'Grant', 'Sattler', 'Chen', 'Lin', 'Wang', 'Rossi', 'Haddad', 'Iyer']
+SPECIALTIES = ['Cardiology', 'Neurology', 'Orthopedics', 'Dermatology', 'Pediatrics', 'Oncology', 'Psychiatry', 'Radiology']
+QUERIES = ['card', 'neuro', 'cardiolgy', 'pediatr', 'Carter', 'Yi-Ting Lin', 'dermatolgy', 'onco', 'Sattler', 'radi']
+
+
+class Command(BaseCommand):
+    help = 'Seeds a large doctor roster and measures /api/doctors/search/ query latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=100000, help='Roster size to seed.')
+        parser.add_argument('--repeat', type=int, default=20, help='Times each query is run.')
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--output', default=None, help='Where to write the JSON report. Defaults to bench-results/doctor-search-<commit>.json.')
+
+    def handle(self, *args, **options):
+        metadata = run_metadata(options)
+        self._cleanup()
+        rng = random.Random(42)
+        Doctor.objects.bulk_create(
+            (
+                Doctor(
+                    name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}',
+                    specialty=rng.choice(SPECIALTIES),
+                    department=BENCH_DEPARTMENT,
+                )
+                for i in range(options['doctors'])
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE api_doctor')
+
+        try:
+            queries = {}
+            for query in QUERIES:
+                queryset = search_doctors(Doctor.objects.all(), query)
+                latencies = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    list(queryset[:options['page_size'] + 1])
+                    latencies.append(time.perf_counter() - started)
+                queries[query] = summarize_latencies(latencies)
+        finally:
+            self._cleanup()
+
+        report = {'benchmark': 'doctor-search', **metadata, 'queries': queries}
+        path = write_report(options['output'] or default_output_path('doctor-search', metadata), report)
+        for query, stats in queries.items():
+            self.stdout.write(f'{query:<12} p50={stats["p50_ms"]:>9}ms  p95={stats["p95_ms"]:>9}ms  p99={stats["p99_ms"]:>9}ms')
+        self.stdout.write(self.style.SUCCESS(f'Report written to {path}'))
+
+    def _cleanup(self):
+        Doctor.objects.filter(department=BENCH_DEPARTMENT).delete()
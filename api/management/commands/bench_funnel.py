@@ -0,0 +1,124 @@
+import threading
+import time
+from datetime import date, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from api.benchmarking import EndpointRecorder, WSGIClient, default_output_path, run_metadata, timed, write_report
+from api.models import Patient, Doctor, Schedule
+
+BENCH_DOCTOR_NAME = 'Funnel Bench Doctor'
+BENCH_EMAIL_DOMAIN = 'funnel.bench'
+BENCH_PASSWORD = 'FunnelBench!2345'
+
+
+class Command(BaseCommand):
+    help = 'Replays the register -> login -> browse -> book -> cancel funnel against the WSGI app and reports per-endpoint latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users.')
+        parser.add_argument('--iterations', type=int, default=5, help='Funnels each virtual user runs.')
+        parser.add_argument('--output', default=None, help='Where to write the JSON report. Defaults to bench-results/funnel-<commit>.json.')
+
+    def handle(self, *args, **options):
+        users = options['users']
+        iterations = options['iterations']
+        metadata = run_metadata(options)
+
+        doctor = self._setup(slots=users * iterations * 2)
+        application = get_wsgi_application()
+        recorder = EndpointRecorder()
+        failures = []
+
+        def virtual_user(user_index):
+            try:
+                for iteration in range(iterations):
+                    error = self._funnel(application, recorder, doctor, user_index, iteration)
+                    if error:
+                        failures.append(error)
+            finally:
+                connection.close()
+
+        try:
+            threads = [threading.Thread(target=virtual_user, args=(i,)) for i in range(users)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall_time = time.perf_counter() - started
+        finally:
+            self._cleanup()
+
+        report = {'benchmark': 'funnel', **metadata, **recorder.report(wall_time), 'failed_funnels': len(failures)}
+        path = write_report(options['output'] or default_output_path('funnel', metadata), report)
+
+        self.stdout.write(f'{report["requests"]} requests in {report["wall_time_s"]}s ({report["throughput_rps"]} req/s)')
+        for label, stats in report['endpoints'].items():
+            self.stdout.write(
+                f'  {label:<14} p50={stats["p50_ms"]:>8}ms  p95={stats["p95_ms"]:>8}ms  p99={stats["p99_ms"]:>8}ms  '
+                f'queries/req={stats["queries_per_request"]}  statuses={stats["statuses"]}'
+            )
+        for error in failures[:5]:
+            self.stdout.write(self.style.WARNING(error))
+        self.stdout.write(self.style.SUCCESS(f'Report written to {path}'))
+
+    def _funnel(self, application, recorder, doctor, user_index, iteration):
+        """
+        Runs one funnel. Returns an error message if a step did not succeed.
+        """
+        email = f'user{user_index}-{iteration}@{BENCH_EMAIL_DOMAIN}'
+        client = WSGIClient(application)
+
+        status_code, _ = timed(recorder, 'register', client, 'POST', '/api/register/', {
+            'email': email, 'password': BENCH_PASSWORD, 'first_name': 'Bench'
+        })
+        if status_code != 201:
+            return f'{email}: register returned {status_code}'
+
+        status_code, payload = timed(recorder, 'login', client, 'POST', '/api/login/', {
+            'email': email, 'password': BENCH_PASSWORD
+        })
+        if status_code != 200:
+            return f'{email}: login returned {status_code}'
+        client.token = payload['token']
+
+        timed(recorder, 'doctor-list', client, 'GET', '/api/doctors/')
+        status_code, payload = timed(recorder, 'schedule-list', client, 'GET', f'/api/schedules/?doctor_id={doctor.pk}')
+        if status_code != 200 or not payload['results']:
+            return f'{email}: no schedules to book ({status_code})'
+
+        # Spread users over the page like real visitors, retrying on the next slot when beaten to one.
+        slots = payload['results']
+        for attempt in range(3):
+            slot = slots[(user_index + attempt) % len(slots)]
+            status_code, appointment = timed(recorder, 'book', client, 'POST', '/api/appointments/', {'schedule': slot['id']})
+            if status_code == 201:
+                break
+        else:
+            return f'{email}: could not book after 3 attempts ({status_code})'
+
+        status_code, _ = timed(recorder, 'cancel', client, 'PATCH', f'/api/appointments/{appointment["id"]}/cancel/')
+        if status_code != 204:
+            return f'{email}: cancel returned {status_code}'
+        return None
+
+    def _setup(self, slots):
+        self._cleanup()
+        doctor = Doctor.objects.create(name=BENCH_DOCTOR_NAME, specialty='Benchmarking', department='QA')
+        first_day = date.today() + timedelta(days=1)
+        Schedule.objects.bulk_create(
+            Schedule(
+                doctor=doctor,
+                date=first_day + timedelta(days=i // 48),
+                start_time=dt_time((i % 48) // 2, (i % 2) * 30),
+                end_time=dt_time((i % 48) // 2, (i % 2) * 30 + 29),
+            )
+            for i in range(slots)
+        )
+        return doctor
+
+    def _cleanup(self):
+        Doctor.objects.filter(name=BENCH_DOCTOR_NAME).delete()
+        Patient.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').delete()
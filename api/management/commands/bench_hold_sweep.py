@@ -0,0 +1,101 @@
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from api.benchmarking import default_output_path, run_metadata, write_report
+from api.holds import expire_holds
+from api.models import Doctor, Patient, Schedule, SlotHold
+
+BENCH_DEPARTMENT = 'Hold Bench'
+BENCH_EMAIL = 'hold-bench@example.com'
+
+
+class Command(BaseCommand):
+    help = 'Seeds expired slot holds among live ones and measures how fast the expiry sweep releases them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--holds', type=int, default=50000, help='Expired holds to release.')
+        parser.add_argument('--live', type=int, default=50000, help='Unexpired holds the sweep must leave alone.')
+        parser.add_argument('--batch-sizes', type=int, nargs='+', default=[500, 5000], help='Holds per sweep transaction.')
+        parser.add_argument('--output', default=None, help='Where to write the JSON report. Defaults to bench-results/hold-sweep-<commit>.json.')
+
+    def handle(self, *args, **options):
+        metadata = run_metadata(options)
+        self._cleanup()
+        results = {}
+        try:
+            patient = Patient.objects.create(email=BENCH_EMAIL)
+            schedules = self._seed_schedules(options['holds'] + options['live'])
+            for batch_size in options['batch_sizes']:
+                self._seed_holds(patient, schedules, options['holds'])
+                started = time.perf_counter()
+                released = expire_holds(limit=batch_size)
+                elapsed = time.perf_counter() - started
+                results[str(batch_size)] = {
+                    'released': released,
+                    'seconds': round(elapsed, 3),
+                    'holds_per_second': round(released / elapsed, 1) if elapsed else None,
+                    'remaining': SlotHold.objects.filter(patient=patient).count(),
+                }
+        finally:
+            self._cleanup()
+
+        report = {'benchmark': 'hold-sweep', **metadata, 'batch_sizes': results}
+        path = write_report(options['output'] or default_output_path('hold-sweep', metadata), report)
+        for batch_size, result in results.items():
+            self.stdout.write(
+                f'batch {batch_size:>6}: released {result["released"]} in {result["seconds"]}s '
+                f'({result["holds_per_second"]} holds/s), {result["remaining"]} live holds left'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Report written to {path}'))
+
+    def _seed_schedules(self, count):
+        doctors = Doctor.objects.bulk_create(
+            Doctor(name=f'Hold Bench {i}', specialty='Benchmarking', department=BENCH_DEPARTMENT) for i in range(count // 1000 + 1)
+        )
+        start = datetime.combine(date(2099, 1, 1), datetime.min.time())
+        return Schedule.objects.bulk_create(
+            (
+                Schedule(
+                    doctor=doctors[i // 1000],
+                    date=(start + timedelta(days=i % 1000 // 20)).date(),
+                    start_time=(start + timedelta(minutes=15 * (i % 20))).time(),
+                    end_time=(start + timedelta(minutes=15 * (i % 20 + 1))).time(),
+                    is_available=False,
+                )
+                for i in range(count)
+            ),
+            batch_size=5000,
+        )
+
+    def _seed_holds(self, patient, schedules, expired):
+        # Held slots are claimed, as hold_schedule() leaves them.
+        SlotHold.objects.filter(patient=patient).delete()
+        Schedule.objects.filter(pk__in=[schedule.pk for schedule in schedules]).update(is_available=False)
+        now = timezone.now()
+        SlotHold.objects.bulk_create(
+            (
+                SlotHold(
+                    patient=patient,
+                    schedule=schedule,
+                    expires_at=now - timedelta(seconds=1) if i < expired else now + timedelta(minutes=5),
+                )
+                for i, schedule in enumerate(schedules)
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {SlotHold._meta.db_table}')
+
+    def _cleanup(self):
+        SlotHold.objects.filter(patient__email=BENCH_EMAIL).delete()
+        # One statement: deleting the schedules through the ORM would send a signal, and bump the version counters, per row.
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {Schedule._meta.db_table} WHERE doctor_id IN (SELECT id FROM {Doctor._meta.db_table} WHERE department = %s)',
+                [BENCH_DEPARTMENT],
+            )
+        Patient.objects.filter(email=BENCH_EMAIL).delete()
+        Doctor.objects.filter(department=BENCH_DEPARTMENT).delete()
@@ -0,0 +1,99 @@
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from api.benchmarking import default_output_path, run_metadata, write_report
+from api.fastpath import FastJSONRenderer, row_serializer
+from api.models import Appointment, Doctor, Patient, Schedule
+from api.serializers import AppointmentSerializer, DoctorSerializer, ScheduleSerializer
+
+BENCH_DEPARTMENT = 'Serialization Bench'
+BENCH_EMAIL = 'serialization@serialization.bench'
+
+
+class Command(BaseCommand):
+    help = 'Measures rows/sec of the ModelSerializer + JSONRenderer path against the values_list() fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement; the best one is reported.')
+        parser.add_argument('--output', default=None, help='Where to write the JSON report. Defaults to bench-results/serialization-<commit>.json.')
+
+    def handle(self, *args, **options):
+        metadata = run_metadata(options)
+        results = {}
+        # The seeded rows are rolled back afterwards; deleting them would send
+        # a version-bump signal per row.
+        with transaction.atomic():
+            datasets = self._setup(max(options['sizes']))
+            for name, (serializer_class, queryset) in datasets.items():
+                results[name] = [self._measure(serializer_class, queryset, size, options['repeat']) for size in options['sizes']]
+            transaction.set_rollback(True)
+
+        report = {'benchmark': 'serialization', **metadata, 'datasets': results}
+        path = write_report(options['output'] or default_output_path('serialization', metadata), report)
+        for name, measurements in results.items():
+            for result in measurements:
+                self.stdout.write(
+                    f'{name:<12} {result["rows"]:>7} rows  serializer={result["serializer_rows_per_s"]:>10} rows/s  '
+                    f'fast={result["fast_rows_per_s"]:>10} rows/s  x{result["speedup"]}'
+                )
+        self.stdout.write(self.style.SUCCESS(f'Report written to {path}'))
+
+    def _measure(self, serializer_class, queryset, size, repeat):
+        renderer = JSONRenderer()
+        fast_renderer = FastJSONRenderer()
+        rows = row_serializer(serializer_class)
+
+        def serializer_path():
+            return renderer.render(serializer_class(list(queryset[:size]), many=True).data)
+
+        def fast_path():
+            return fast_renderer.render(rows.to_representation(rows.values_list(queryset)[:size]))
+
+        if serializer_path() != fast_path():
+            raise CommandError(f'{serializer_class.__name__}: fast path output differs at {size} rows.')
+        before = self._best_of(serializer_path, repeat)
+        after = self._best_of(fast_path, repeat)
+        return {
+            'rows': size,
+            'serializer_s': round(before, 4),
+            'fast_s': round(after, 4),
+            'serializer_rows_per_s': round(size / before),
+            'fast_rows_per_s': round(size / after),
+            'speedup': round(before / after, 2),
+        }
+
+    def _best_of(self, fn, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    def _setup(self, rows):
+        doctors = Doctor.objects.bulk_create(
+            (Doctor(name=f'Dr. Serial {i}', specialty='Benchmarking', department=BENCH_DEPARTMENT) for i in range(rows)),
+            batch_size=5000,
+        )
+        first_day = date.today() + timedelta(days=1)
+        slot = datetime.combine(first_day, datetime.min.time())
+        schedules = []
+        for i in range(rows):
+            start = slot + timedelta(minutes=5 * i)
+            schedules.append(Schedule(
+                doctor=doctors[0], date=start.date(), start_time=start.time(),
+                end_time=(start + timedelta(minutes=5)).time(), is_available=False,
+            ))
+        schedules = Schedule.objects.bulk_create(schedules, batch_size=5000)
+        patient = Patient.objects.create(email=BENCH_EMAIL)
+        Appointment.objects.bulk_create((Appointment(patient=patient, schedule=schedule) for schedule in schedules), batch_size=5000)
+
+        return {
+            'doctors': (DoctorSerializer, Doctor.objects.filter(department=BENCH_DEPARTMENT).order_by('id')),
+            'schedules': (ScheduleSerializer, Schedule.objects.filter(doctor=doctors[0]).order_by('date', 'start_time', 'id')),
+            'appointments': (AppointmentSerializer, Appointment.objects.filter(patient=patient).order_by('-created_at', '-id')),
+        }
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import date, time as dt_time, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+from api.benchmarking import default_output_path, run_metadata, summarize_latencies, write_report
+from api.models import Doctor, Patient, Schedule
+from .bench_asgi import SERVERS, free_port, slow_get
+
+BENCH_DOCTOR_NAME = 'Slot Events Bench Doctor'
+BENCH_EMAIL = 'slot-events-bench@example.com'
+
+
+async def http_request(port, method, path, headers=None, body=None):
+    """
+    One HTTP/1.1 request on its own connection. Returns (status, headers, body bytes), status 0 on failure.
+    """
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return 0, {}, b''
+    payload = json.dumps(body).encode() if body is not None else b''
+    lines = [f'{method} {path} HTTP/1.1', 'Host: bench.local', 'Connection: close', f'Content-Length: {len(payload)}']
+    if body is not None:
+        lines.append('Content-Type: application/json')
+    lines.extend(f'{name}: {value}' for name, value in (headers or {}).items())
+    try:
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('ascii') + payload)
+        await writer.drain()
+        response = await reader.read()
+        head, _, content = response.partition(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        response_headers = dict(line.lower().split(': ', 1) for line in header_lines if ': ' in line)
+        return int(status_line.split(' ', 2)[1]), response_headers, content
+    except (OSError, ValueError, IndexError):
+        return 0, {}, b''
+    finally:
+        writer.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares clients polling the schedule list (with ETags) against clients subscribed to the slot '
+        'event stream, on an ASGI server, while a patient books and cancels slots'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200, help='Watching clients per mode.')
+        parser.add_argument('--slots', type=int, default=20, help='Slots booked and then cancelled, one change at a time.')
+        parser.add_argument('--change-interval', type=float, default=0.5, help='Seconds between two changes.')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between two polls of one client.')
+        parser.add_argument('--workers', type=int, default=1, help='gunicorn workers of the ASGI server.')
+        parser.add_argument('--modes', nargs='+', choices=['poll', 'sse'], default=['poll', 'sse'])
+        parser.add_argument('--output', default=None, help='Where to write the JSON report. Defaults to bench-results/slot-events-<commit>.json.')
+
+    def handle(self, *args, **options):
+        if options['clients'] <= 0 or not 0 < options['slots'] <= 90:
+            raise CommandError('--clients must be positive and --slots between 1 and 90.')
+        metadata = run_metadata(options)
+        doctor, day, token = self._setup(options['slots'])
+        self.list_path = f'/api/schedules/?doctor_id={doctor.pk}&date={day}&paginate=false'
+        self.events_path = f'/api/schedules/events/?doctor_id={doctor.pk}&date={day}'
+        self.schedule_ids = list(Schedule.objects.filter(doctor=doctor).order_by('start_time').values_list('pk', flat=True))
+        self.token = token
+
+        port = free_port()
+        command = [
+            sys.executable, '-m', 'gunicorn', *SERVERS['asgi'],
+            '--workers', str(options['workers']),
+            '--bind', f'127.0.0.1:{port}',
+            '--log-level', 'warning',
+        ]
+        env = {**os.environ, 'PERFORMANCE_LOG_LEVEL': 'WARNING'}
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        results = {}
+        try:
+            self._wait_until_ready(port, server)
+            for mode in options['modes']:
+                results[mode] = asyncio.run(self._run_mode(mode, port, options))
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            self._cleanup()
+
+        report = {'benchmark': 'slot-events', **metadata, 'modes': results}
+        path = write_report(options['output'] or default_output_path('slot-events', metadata), report)
+
+        for mode, result in results.items():
+            latency = result['change_latency']
+            self.stdout.write(
+                f'{mode}: {result["requests"]} requests, {result["bytes_received"]} bytes, '
+                f'{result["not_modified"]} not modified, {result["missed_changes"]} changes never seen; '
+                f'change latency p50={latency.get("p50_ms")}ms p95={latency.get("p95_ms")}ms max={latency.get("max_ms")}ms'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Report written to {path}'))
+
+    def _wait_until_ready(self, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Server exited with code {server.returncode} before becoming ready.')
+            if asyncio.run(slow_get(port, '/api/doctors/', 0)) == 200:
+                return
+            time.sleep(0.2)
+        raise CommandError('Server did not become ready in time.')
+
+    async def _run_mode(self, mode, port, options):
+        """
+        Start the watchers, make the changes, give the watchers one poll interval to catch up, and
+        measure for every (client, change) how long after the change request started it was seen.
+        """
+        changes = {}  # (slot id, is_available) -> when the request making the change was sent
+        seen = [{} for _ in range(options['clients'])]
+        stats = {'requests': 0, 'bytes_received': 0, 'not_modified': 0, 'errors': 0}
+        stop = asyncio.Event()
+        watcher = self._poll if mode == 'poll' else self._subscribe
+        ready = [asyncio.Event() for _ in range(options['clients'])]
+        watchers = [asyncio.create_task(watcher(port, seen[i], stats, stop, ready[i], options)) for i in range(options['clients'])]
+        await asyncio.gather(*(event.wait() for event in ready))
+
+        started = time.perf_counter()
+        await self._make_changes(port, changes, options)
+        await asyncio.sleep(options['poll_interval'] + 1)
+        stop.set()
+        await asyncio.gather(*watchers, return_exceptions=True)
+        elapsed = time.perf_counter() - started
+
+        latencies = []
+        missed = 0
+        for client_seen in seen:
+            for change, changed_at in changes.items():
+                if change in client_seen:
+                    latencies.append(max(0.0, client_seen[change] - changed_at))
+                else:
+                    missed += 1
+        return {
+            'clients': options['clients'],
+            'changes': len(changes),
+            'wall_time_s': round(elapsed, 3),
+            **stats,
+            'requests_per_s': round(stats['requests'] / elapsed, 2),
+            'missed_changes': missed,
+            'change_latency': summarize_latencies(latencies),
+        }
+
+    async def _make_changes(self, port, changes, options):
+        headers = {'Authorization': f'Token {self.token}'}
+        appointments = []
+        for schedule_id in self.schedule_ids:
+            changes[(schedule_id, False)] = time.perf_counter()
+            status_code, _, body = await http_request(port, 'POST', '/api/appointments/', headers, {'schedule': schedule_id})
+            if status_code != 201:
+                raise CommandError(f'Booking schedule {schedule_id} failed with status {status_code}.')
+            appointments.append((schedule_id, json.loads(body)['id']))
+            await asyncio.sleep(options['change_interval'])
+        for schedule_id, appointment_id in appointments:
+            changes[(schedule_id, True)] = time.perf_counter()
+            status_code, _, _ = await http_request(port, 'PATCH', f'/api/appointments/{appointment_id}/cancel/', headers, {})
+            if status_code not in (200, 204):
+                raise CommandError(f'Cancelling appointment {appointment_id} failed with status {status_code}.')
+            await asyncio.sleep(options['change_interval'])
+
+    async def _poll(self, port, seen, stats, stop, ready, options):
+        etag = None
+        known = None
+        # Spread the clients over the interval, as real ones would be.
+        await asyncio.sleep(random.uniform(0, options['poll_interval']))
+        while not stop.is_set():
+            status_code, headers, body = await http_request(port, 'GET', self.list_path, {'If-None-Match': etag} if etag else {})
+            now = time.perf_counter()
+            stats['requests'] += 1
+            stats['bytes_received'] += len(body)
+            if status_code == 304:
+                stats['not_modified'] += 1
+            elif status_code == 200:
+                etag = headers.get('etag')
+                current = {slot['id']: slot['is_available'] for slot in json.loads(body)}
+                if known is not None:
+                    for slot_id, is_available in current.items():
+                        if known.get(slot_id) != is_available:
+                            seen.setdefault((slot_id, is_available), now)
+                known = current
+            else:
+                stats['errors'] += 1
+            ready.set()
+            try:
+                await asyncio.wait_for(stop.wait(), options['poll_interval'])
+            except asyncio.TimeoutError:
+                pass
+
+    async def _subscribe(self, port, seen, stats, stop, ready, options):
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            stats['errors'] += 1
+            ready.set()
+            return
+        stats['requests'] += 1
+        writer.write(f'GET {self.events_path} HTTP/1.1\r\nHost: bench.local\r\nAccept: text/event-stream\r\n\r\n'.encode('ascii'))
+        try:
+            await writer.drain()
+            stop_waiting = asyncio.create_task(stop.wait())
+            while True:
+                read_line = asyncio.create_task(reader.readline())
+                done, _ = await asyncio.wait({read_line, stop_waiting}, return_when=asyncio.FIRST_COMPLETED)
+                if read_line not in done:
+                    read_line.cancel()
+                    break
+                line = read_line.result()
+                if not line:
+                    break
+                stats['bytes_received'] += len(line)
+                if line.startswith(b'retry:'):
+                    # The server subscribed before sending the first event.
+                    ready.set()
+                elif line.startswith(b'data: {"id"'):
+                    event = json.loads(line[len(b'data: '):])
+                    seen.setdefault((event['id'], event['is_available']), time.perf_counter())
+        except OSError:
+            stats['errors'] += 1
+        finally:
+            ready.set()
+            writer.close()
+
+    def _setup(self, slots):
+        self._cleanup()
+        doctor = Doctor.objects.create(name=BENCH_DOCTOR_NAME, specialty='Benchmarking', department='QA')
+        day = date.today() + timedelta(days=1)
+        Schedule.objects.bulk_create(
+            Schedule(doctor=doctor, date=day, start_time=dt_time(8 + minutes // 60, minutes % 60), end_time=dt_time(8 + minutes // 60, minutes % 60 + 5))
+            for minutes in range(0, slots * 10, 10)
+        )
+        patient = Patient.objects.create(email=BENCH_EMAIL)
+        return doctor, day, Token.objects.create(user=patient).key
+
+    def _cleanup(self):
+        Doctor.objects.filter(name=BENCH_DOCTOR_NAME).delete()
+        Patient.objects.filter(email=BENCH_EMAIL).delete()
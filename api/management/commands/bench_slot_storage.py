@@ -0,0 +1,108 @@
+import random
+import time
+from datetime import date, time as dt_time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from api.benchmarking import EndpointRecorder, WSGIClient, default_output_path, run_metadata, timed, write_report
+from api.models import Doctor, Patient, Schedule, ScheduleTemplate, SlotGrid
+from api.scheduling import materialize_templates
+
+BENCH_DOCTOR_NAME = 'Slot Storage Bench Doctor'
+BENCH_EMAIL = 'slot-storage@storage.bench'
+MODES = {'rows': Schedule, 'grid': SlotGrid}
+
+
+class Command(BaseCommand):
+    help = 'Compares row-per-slot and bitmap grid schedule storage: table size, list latency and booking latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=100)
+        parser.add_argument('--days', type=int, default=90, help='Days of horizon to generate.')
+        parser.add_argument('--slot-minutes', type=int, default=5)
+        parser.add_argument('--requests', type=int, default=200, help='List and booking requests per mode.')
+        parser.add_argument('--modes', nargs='+', choices=sorted(MODES), default=['rows', 'grid'])
+        parser.add_argument('--output', default=None, help='Where to write the JSON report. Defaults to bench-results/slot-storage-<commit>.json.')
+
+    def handle(self, *args, **options):
+        metadata = run_metadata(options)
+        results = {}
+        for mode in options['modes']:
+            with override_settings(SCHEDULE_STORAGE=mode):
+                try:
+                    results[mode] = self._run_mode(mode, options)
+                finally:
+                    self._cleanup()
+
+        report = {'benchmark': 'slot-storage', **metadata, 'modes': results}
+        path = write_report(options['output'] or default_output_path('slot-storage', metadata), report)
+
+        for mode, result in results.items():
+            self.stdout.write(
+                f'{mode}: {result["slots"]} slots in {result["rows"]} rows, {result["table_bytes"]} bytes '
+                f'(generated in {result["generate_s"]}s)'
+            )
+            for label, stats in result['endpoints'].items():
+                self.stdout.write(
+                    f'  {label:<18} p50={stats["p50_ms"]:>8}ms  p95={stats["p95_ms"]:>8}ms  p99={stats["p99_ms"]:>8}ms  '
+                    f'queries/req={stats["queries_per_request"]}  statuses={stats["statuses"]}'
+                )
+        self.stdout.write(self.style.SUCCESS(f'Report written to {path}'))
+
+    def _run_mode(self, mode, options):
+        model = MODES[mode]
+        self._cleanup()
+        size_before = self._table_bytes(model)
+
+        first_day = date.today() + timedelta(days=1)
+        doctors = Doctor.objects.bulk_create(
+            Doctor(name=BENCH_DOCTOR_NAME, specialty='Benchmarking', department='QA') for _ in range(options['doctors'])
+        )
+        templates = [
+            ScheduleTemplate(
+                doctor=doctor, weekdays=list(range(7)), start_time=dt_time(9), end_time=dt_time(17),
+                slot_minutes=options['slot_minutes'], valid_from=first_day,
+            )
+            for doctor in doctors
+        ]
+        started = time.perf_counter()
+        slots = materialize_templates(templates, first_day, weeks=(options['days'] + 6) // 7, batch_size=5000)
+        generate_s = time.perf_counter() - started
+        rows = model.objects.filter(doctor__name=BENCH_DOCTOR_NAME).count()
+        size_after = self._table_bytes(model)
+
+        patient = Patient.objects.create(email=BENCH_EMAIL)
+        client = WSGIClient(get_wsgi_application(), Token.objects.create(user=patient).key)
+        recorder = EndpointRecorder()
+        rng = random.Random(13)
+
+        for _ in range(options['requests']):
+            doctor = rng.choice(doctors)
+            day = first_day + timedelta(days=rng.randrange(options['days']))
+            timed(recorder, 'list-doctor', client, 'GET', f'/api/schedules/?doctor_id={doctor.pk}')
+            status_code, payload = timed(recorder, 'list-doctor-date', client, 'GET', f'/api/schedules/?doctor_id={doctor.pk}&date={day}')
+            free = [slot['id'] for slot in (payload or {}).get('results', []) if slot['is_available']]
+            if free:
+                timed(recorder, 'book', client, 'POST', '/api/appointments/', {'schedule': rng.choice(free)})
+
+        return {
+            'slots': slots,
+            'rows': rows,
+            'table_bytes': size_after - size_before if size_after is not None else None,
+            'generate_s': round(generate_s, 3),
+            **recorder.report(sum(sum(latencies) for latencies in recorder.latencies.values())),
+        }
+
+    def _table_bytes(self, model):
+        if connection.vendor != 'postgresql':
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_total_relation_size(%s)', [model._meta.db_table])
+            return cursor.fetchone()[0]
+
+    def _cleanup(self):
+        Doctor.objects.filter(name=BENCH_DOCTOR_NAME).delete()
+        Patient.objects.filter(email=BENCH_EMAIL).delete()
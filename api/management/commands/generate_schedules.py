@@ -0,0 +1,31 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from api.models import ScheduleTemplate
+from api.scheduling import materialize_templates
+
+
+class Command(BaseCommand):
+    help = 'Materializes schedule slots from active schedule templates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--weeks', type=int, default=4, help='Number of weeks to generate.')
+        parser.add_argument('--start', type=date.fromisoformat, default=None, help='First day to generate (YYYY-MM-DD). Defaults to today.')
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors', help='Only generate for this doctor ID. May be repeated.')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT statement.')
+
+    def handle(self, *args, **options):
+        if options['weeks'] <= 0:
+            raise CommandError('--weeks must be positive.')
+
+        templates = ScheduleTemplate.objects.filter(is_active=True).order_by('doctor_id', 'id')
+        if options['doctors']:
+            templates = templates.filter(doctor_id__in=options['doctors'])
+
+        start = options['start'] or date.today()
+        generated = materialize_templates(
+            templates.iterator(), start, options['weeks'], batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {generated} slots from {start} for {options["weeks"]} weeks (existing slots were left untouched).'
+        ))
@@ -0,0 +1,53 @@
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from api.holds import expire_holds
+from api.jobs import DEFAULT_QUEUE, claim_jobs, requeue_stale_jobs, run_jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (see api/jobs.py) and releases expired slot holds until stopped; start as many as needed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default=DEFAULT_QUEUE)
+        parser.add_argument('--batch-size', type=int, default=20, help='Jobs claimed per round trip.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is due instead of waiting for more.')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size must be positive.')
+
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        self.stopping = False
+        if not options['once']:
+            # Finish the batch in hand, then exit.
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+
+        succeeded = failed = 0
+        while not self.stopping:
+            if not options['once']:
+                # Between batches is this worker's request boundary: drop broken or expired connections.
+                close_old_connections()
+            requeue_stale_jobs()
+            # Every worker sweeps; SKIP LOCKED keeps them from releasing the same holds.
+            expire_holds()
+            jobs = claim_jobs(worker, queue=options['queue'], limit=options['batch_size'])
+            if not jobs:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+            done, retried = run_jobs(jobs)
+            succeeded += done
+            failed += retried
+
+        self.stdout.write(self.style.SUCCESS(f'{worker}: {succeeded} jobs succeeded, {failed} failed.'))
+
+    def stop(self, signum, frame):
+        self.stopping = True
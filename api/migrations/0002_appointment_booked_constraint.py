@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="appointment",
+            name="schedule",
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="appointments", to="api.schedule"),
+        ),
+        migrations.AddConstraint(
+            model_name="appointment",
+            constraint=models.UniqueConstraint(condition=models.Q(("status", "booked")), fields=("schedule",), name="unique_booked_appointment_per_schedule"),
+        ),
+    ]
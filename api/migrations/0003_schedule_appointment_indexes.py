@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_appointment_booked_constraint"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(fields=["patient", "-created_at", "-id"], name="appointment_patient_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="schedule",
+            index=models.Index(condition=models.Q(("is_available", True)), fields=["doctor", "date", "start_time", "id"], name="schedule_doctor_open_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="schedule",
+            index=models.Index(condition=models.Q(("is_available", True)), fields=["date", "start_time", "id"], name="schedule_open_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="schedule",
+            index=models.Index(fields=["date", "start_time", "id"], name="schedule_date_idx"),
+        ),
+    ]
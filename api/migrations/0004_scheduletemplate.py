@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:32
+
+import api.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0003_schedule_appointment_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduleTemplate",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("weekdays", models.JSONField(default=api.models.default_weekdays)),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                ("slot_minutes", models.PositiveSmallIntegerField(default=15)),
+                ("valid_from", models.DateField()),
+                ("valid_until", models.DateField(blank=True, null=True)),
+                ("is_active", models.BooleanField(default=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("doctor", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="schedule_templates", to="api.doctor")),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:44
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_scheduletemplate"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["name"], name="doctor_name_trgm", opclasses=["gin_trgm_ops"]),
+        ),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["specialty"], name="doctor_specialty_trgm", opclasses=["gin_trgm_ops"]),
+        ),
+        migrations.AddIndex(
+            model_name="doctor",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["department"], name="doctor_department_trgm", opclasses=["gin_trgm_ops"]),
+        ),
+    ]
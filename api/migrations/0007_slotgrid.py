@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_resourceversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlotGrid",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                ("slot_minutes", models.PositiveSmallIntegerField()),
+                ("slot_count", models.PositiveSmallIntegerField()),
+                ("available", models.BinaryField()),
+                ("free_slots", models.PositiveSmallIntegerField()),
+                ("doctor", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="slot_grids", to="api.doctor")),
+            ],
+            options={
+                "indexes": [models.Index(condition=models.Q(("free_slots__gt", 0)), fields=["doctor", "date", "start_time", "id"], name="slotgrid_doctor_open_idx"), models.Index(condition=models.Q(("free_slots__gt", 0)), fields=["date", "start_time", "id"], name="slotgrid_open_idx"), models.Index(fields=["date", "start_time", "id"], name="slotgrid_date_idx")],
+                "constraints": [models.UniqueConstraint(fields=("doctor", "date", "start_time"), name="unique_slot_grid")],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_slotgrid"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WaitlistEntry",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("status", models.CharField(choices=[("waiting", "Waiting"), ("assigned", "Assigned"), ("withdrawn", "Withdrawn")], default="waiting", max_length=10)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("appointment", models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="waitlist_entry", to="api.appointment")),
+                ("doctor", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="waitlist_entries", to="api.doctor")),
+                ("patient", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="waitlist_entries", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "indexes": [models.Index(condition=models.Q(("status", "waiting")), fields=["doctor", "date", "created_at", "id"], name="waitlist_queue_idx"), models.Index(fields=["patient", "-created_at", "-id"], name="waitlist_patient_idx")],
+                "constraints": [models.UniqueConstraint(condition=models.Q(("status", "waiting")), fields=("patient", "doctor", "date"), name="unique_waiting_entry")],
+            },
+        ),
+    ]
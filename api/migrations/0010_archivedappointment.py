@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedAppointment",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("date", models.DateField()),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                ("status", models.CharField(choices=[("booked", "Booked"), ("cancelled", "Cancelled"), ("completed", "Completed")], max_length=10)),
+                ("created_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                ("doctor", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="archived_appointments", to="api.doctor")),
+                ("patient", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="archived_appointments", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["patient", "-created_at", "-id"], name="archived_appt_patient_idx")],
+            },
+        ),
+    ]
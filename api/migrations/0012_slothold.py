@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0011_idempotencykey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlotHold",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("expires_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("patient", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="slot_holds", to=settings.AUTH_USER_MODEL)),
+                ("schedule", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name="hold", to="api.schedule")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["expires_at"], name="slothold_expires_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0012_slothold"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="scheduletemplate",
+            constraint=models.CheckConstraint(condition=models.Q(("slot_minutes__gt", 0)), name="schedule_template_slot_minutes_positive"),
+        ),
+        migrations.AddConstraint(
+            model_name="scheduletemplate",
+            constraint=models.CheckConstraint(condition=models.Q(("end_time__gt", models.F("start_time"))), name="schedule_template_ends_after_start"),
+        ),
+    ]
@@ -1,4 +1,7 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 class Patient(AbstractUser):
@@ -26,6 +29,14 @@ class Doctor(models.Model):
     department = models.CharField(max_length=100) # e.g., Internal Medicine
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Trigram indexes for api.search.search_doctors (requires the pg_trgm extension)
+        indexes = [
+            GinIndex(fields=['name'], name='doctor_name_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['specialty'], name='doctor_specialty_trgm', opclasses=['gin_trgm_ops']),
+            GinIndex(fields=['department'], name='doctor_department_trgm', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return f"Dr. {self.name} - {self.specialty}"
 
@@ -39,6 +50,21 @@ class Schedule(models.Model):
 
     class Meta:
         unique_together = ('doctor', 'date', 'start_time')
+        # Each index matches an ordering used by ScheduleListView's keyset pagination.
+        # The partial ones only hold open slots, which is all the default listing reads.
+        indexes = [
+            models.Index(
+                fields=['doctor', 'date', 'start_time', 'id'],
+                condition=models.Q(is_available=True),
+                name='schedule_doctor_open_idx',
+            ),
+            models.Index(
+                fields=['date', 'start_time', 'id'],
+                condition=models.Q(is_available=True),
+                name='schedule_open_idx',
+            ),
+            models.Index(fields=['date', 'start_time', 'id'], name='schedule_date_idx'),
+        ]
 
     def __str__(self):
         return f"Dr. {self.doctor.name} on {self.date} at {self.start_time}"
@@ -52,11 +78,273 @@ class Appointment(models.Model):
     )
 
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='appointments')
-    schedule = models.OneToOneField(Schedule, on_delete=models.CASCADE, related_name='appointment')
+    # A schedule keeps its cancelled appointments as history, so only one
+    # *booked* appointment per schedule is enforced (see Meta.constraints).
+    schedule = models.ForeignKey(Schedule, on_delete=models.CASCADE, related_name='appointments')
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='booked')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Serves a patient's appointment list in its paginated order.
+            models.Index(fields=['patient', '-created_at', '-id'], name='appointment_patient_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['schedule'],
+                condition=models.Q(status='booked'),
+                name='unique_booked_appointment_per_schedule',
+            ),
+        ]
+
     def __str__(self):
         return f"Appointment for {self.patient.email} with Dr. {self.schedule.doctor.name} on {self.schedule.date}"
 
 
+
+
+class ArchivedAppointment(models.Model):
+    """
+    An appointment whose slot lies more than ARCHIVE_AFTER_DAYS in the past,
+    moved out of Appointment together with its slot's details by
+    `manage.py archive_past_schedules` (see api/archive.py). Keeps the
+    original appointment id; patients read these at /api/appointments/history/.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='archived_appointments')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='archived_appointments')
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Same order as a patient's live appointment list.
+            models.Index(fields=['patient', '-created_at', '-id'], name='archived_appt_patient_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived appointment for {self.patient.email} with Dr. {self.doctor.name} on {self.date}"
+
+
+def default_weekdays():
+    # Monday to Friday, using date.weekday() numbering.
+    return [0, 1, 2, 3, 4]
+
+
+class ScheduleTemplate(models.Model):
+    """
+    A recurring weekly availability, e.g. Mon-Fri 09:00-12:00 in 15-minute slots.
+    Templates are turned into concrete Schedule rows by `api.scheduling.materialize_templates`.
+    """
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='schedule_templates')
+    weekdays = models.JSONField(default=default_weekdays) # 0 = Monday ... 6 = Sunday
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=15)
+    valid_from = models.DateField()
+    valid_until = models.DateField(blank=True, null=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Slot generation steps through the session slot_minutes at a time.
+        constraints = [
+            models.CheckConstraint(condition=models.Q(slot_minutes__gt=0), name='schedule_template_slot_minutes_positive'),
+            models.CheckConstraint(condition=models.Q(end_time__gt=models.F('start_time')), name='schedule_template_ends_after_start'),
+        ]
+
+    def __str__(self):
+        return f"Dr. {self.doctor.name}: {self.start_time}-{self.end_time} every {self.slot_minutes} min"
+
+    def clean(self):
+        weekdays = self.weekdays
+        if not isinstance(weekdays, list) or not all(type(day) is int and 0 <= day <= 6 for day in weekdays):
+            raise ValidationError({'weekdays': 'Must be a list of weekday numbers from 0 (Monday) to 6 (Sunday).'})
+
+
+class SlotGrid(models.Model):
+    """
+    One doctor session (e.g. a morning) stored as a grid of equal slots plus
+    an availability bitmask, instead of one Schedule row per slot. Used when
+    SCHEDULE_STORAGE = 'grid'; see api/slotgrid.py.
+
+    Bit i of `available` (least significant bit of the first byte first, as
+    Postgres' get_bit numbers them) is set while slot i is free. A Schedule
+    row is only created for a slot when it is booked, so appointments keep
+    pointing at Schedule.
+    """
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='slot_grids')
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField()
+    slot_count = models.PositiveSmallIntegerField()
+    available = models.BinaryField()
+    free_slots = models.PositiveSmallIntegerField() # number of bits set in `available`
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date', 'start_time'], name='unique_slot_grid'),
+        ]
+        # Same shapes as Schedule's indexes; "open" means at least one free slot.
+        indexes = [
+            models.Index(
+                fields=['doctor', 'date', 'start_time', 'id'],
+                condition=models.Q(free_slots__gt=0),
+                name='slotgrid_doctor_open_idx',
+            ),
+            models.Index(
+                fields=['date', 'start_time', 'id'],
+                condition=models.Q(free_slots__gt=0),
+                name='slotgrid_open_idx',
+            ),
+            models.Index(fields=['date', 'start_time', 'id'], name='slotgrid_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Dr. {self.doctor.name} on {self.date}: {self.slot_count} x {self.slot_minutes} min from {self.start_time}"
+
+
+class ResourceVersion(models.Model):
+    """
+    A change counter for the cached read endpoints (see api/versioning.py).
+    `key` is 'global', 'doctors' (the roster) or 'doctor:<id>'.
+    """
+    key = models.CharField(max_length=40, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
+class SlotHold(models.Model):
+    """
+    A slot set aside for a patient while they fill in the booking form. The
+    slot is claimed like a booking, so it is off the schedule list for
+    everyone, until the patient confirms it into an Appointment or it
+    expires (see api/holds.py).
+    """
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='slot_holds')
+    schedule = models.OneToOneField(Schedule, on_delete=models.CASCADE, related_name='hold')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The expiry sweep takes the oldest expired holds off the front of this index.
+            models.Index(fields=['expires_at'], name='slothold_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"Hold on schedule {self.schedule_id} for {self.patient_id} until {self.expires_at}"
+
+
+class IdempotencyKey(models.Model):
+    """
+    The outcome of a booking or cancellation sent with an `Idempotency-Key`
+    header, replayed to retries of the same request until `expires_at`
+    (see api/idempotency.py). Keys are scoped to the patient who sent them.
+    """
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64) # sha256 of method, path and body
+    status_code = models.PositiveSmallIntegerField(null=True) # None while the first request runs
+    response = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # Also the index a retry is answered from.
+            models.UniqueConstraint(fields=['patient', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} for {self.patient_id} ({self.status_code})"
+
+
+class WaitlistEntry(models.Model):
+    """
+    A patient waiting for any slot with a doctor on a given date. When a
+    booking for that doctor and date is cancelled, the slot goes straight to
+    the longest-waiting eligible patient (see api/waitlist.py) instead of
+    back on the schedule list.
+    """
+    STATUS_CHOICES = (
+        ('waiting', 'Waiting'),
+        ('assigned', 'Assigned'),
+        ('withdrawn', 'Withdrawn'),
+    )
+
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='waitlist_entries')
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='waitlist_entries')
+    date = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='waiting')
+    appointment = models.OneToOneField(
+        Appointment, on_delete=models.SET_NULL, blank=True, null=True, related_name='waitlist_entry'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The queue: first waiter for a doctor and date is the first entry of this index.
+            models.Index(
+                fields=['doctor', 'date', 'created_at', 'id'],
+                condition=models.Q(status='waiting'),
+                name='waitlist_queue_idx',
+            ),
+            models.Index(fields=['patient', '-created_at', '-id'], name='waitlist_patient_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['patient', 'doctor', 'date'],
+                condition=models.Q(status='waiting'),
+                name='unique_waiting_entry',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.patient.email} waiting for Dr. {self.doctor.name} on {self.date}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work, e.g. a confirmation email after a booking.
+    Enqueued in the same transaction as the write that caused it and run by
+    `manage.py run_jobs`; see api/jobs.py.
+    """
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('failed', 'Failed'),
+    )
+
+    queue = models.CharField(max_length=50, default='default')
+    name = models.CharField(max_length=100) # a handler registered with api.jobs.job
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_at = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Claim order: due jobs of a queue, oldest first.
+            models.Index(fields=['queue', 'run_at', 'id'], condition=models.Q(status='queued'), name='job_due_idx'),
+            # Finds jobs whose worker died mid-run.
+            models.Index(fields=['locked_at'], condition=models.Q(status='running'), name='job_running_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status}, attempt {self.attempts}/{self.max_attempts})"
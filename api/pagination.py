@@ -0,0 +1,219 @@
+import base64
+import binascii
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .slotgrid import iter_slots
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on a composite key, e.g. (date, start_time, id).
+
+    Unlike DRF's CursorPagination, which keeps only the first ordering field in
+    the cursor and skips ties with an OFFSET, the cursor here carries the full
+    key of the last row. The next page is fetched with a row comparison against
+    that key, so every page costs the same index range scan no matter how deep
+    the client has paged.
+
+    Old clients can ask for the plain, unpaginated list with `?paginate=false`.
+    """
+    ordering = ('id',)
+    page_size = 50
+    max_page_size = 500
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    legacy_query_param = 'paginate'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.get_page_window(queryset, request)
+        if window is None:
+            return None
+        return self.set_page(list(window))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async counterpart of paginate_queryset for the async views; accepts a
+        DRF Request or a plain Django HttpRequest.
+        """
+        window = self.get_page_window(queryset, request)
+        if window is None:
+            return None
+        return self.set_page([row async for row in window])
+
+    def get_page_window(self, queryset, request):
+        """
+        The ordered, cursor-filtered slice of `queryset` holding the next page
+        plus one extra row, or None if the client asked for the unpaginated list.
+        """
+        params = self.get_query_params(request)
+        if params.get(self.legacy_query_param, '').lower() in ('false', '0', 'no'):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(params)
+        queryset = queryset.order_by(*self.ordering)
+
+        encoded = params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self.get_cursor_filter(self.decode_cursor(encoded, queryset.model)))
+
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_query_params(self, request):
+        return getattr(request, 'query_params', request.GET)
+
+    def get_page_size(self, params):
+        try:
+            page_size = int(params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_cursor_filter(self, values):
+        """
+        Expand (a, b, c) > (x, y, z) into
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+        flipping the comparison for descending fields.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        return condition
+
+    def encode_cursor(self, row):
+        values = [getattr(row, field.lstrip('-')) for field in self.ordering]
+        payload = json.dumps([value.isoformat() if hasattr(value, 'isoformat') else value for value in values])
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, encoded, model):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            return self.parse_cursor_values(values, model)
+        except (TypeError, ValueError, binascii.Error, ValidationError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+
+    def parse_cursor_values(self, values, model):
+        return [
+            model._meta.get_field(field.lstrip('-')).to_python(value)
+            for field, value in zip(self.ordering, values)
+        ]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_data(self, data):
+        return {
+            'next': self.get_next_link(),
+            'results': data,
+        }
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class DoctorCursorPagination(KeysetPagination):
+    ordering = ('id',)
+
+
+class ScheduleCursorPagination(KeysetPagination):
+    ordering = ('date', 'start_time', 'id')
+
+
+class GridSlotPagination(KeysetPagination):
+    """
+    Keyset pages over slots expanded from SlotGrid rows (see api/slotgrid.py),
+    in the same order as ScheduleCursorPagination. The cursor carries
+    (date, start_time, grid id, slot index).
+    """
+    ordering = ('date', 'start_time', 'grid_id', 'index')
+
+    def paginate_slots(self, grids, request, available_only=False):
+        params = self.get_query_params(request)
+        if params.get(self.legacy_query_param, '').lower() in ('false', '0', 'no'):
+            return None
+
+        self.request = request
+        self.page_size = self.get_page_size(params)
+        encoded = params.get(self.cursor_query_param)
+        after = tuple(self.decode_cursor(encoded, grids.model)) if encoded else None
+        return self.set_page(list(islice(iter_slots(grids, available_only, after), self.page_size + 1)))
+
+    def parse_cursor_values(self, values, model):
+        day, start_time, grid_id, index = values
+        return [
+            model._meta.get_field('date').to_python(day),
+            model._meta.get_field('start_time').to_python(start_time),
+            int(grid_id),
+            int(index),
+        ]
+
+
+class AppointmentCursorPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+
+class WaitlistCursorPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+class RankedPagination(KeysetPagination):
+    """
+    Offset paging for relevance-ranked results, which have no stable key to
+    seek on. Same response shape as the keyset pages and, like them, no
+    COUNT(*). Deep offsets are rare for search and capped by `max_offset`.
+    """
+    page_size = 20
+    max_page_size = 100
+    offset_query_param = 'offset'
+    max_offset = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = self.get_query_params(request)
+        self.request = request
+        self.page_size = self.get_page_size(params)
+        try:
+            self.offset = min(max(int(params.get(self.offset_query_param, 0)), 0), self.max_offset)
+        except ValueError:
+            self.offset = 0
+        return self.set_page(list(queryset[self.offset:self.offset + self.page_size + 1]))
+
+    def get_next_link(self):
+        if not self.has_next or self.offset + self.page_size > self.max_offset:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.offset_query_param, self.offset + self.page_size)
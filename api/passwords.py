@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, identify_hasher, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .instrumentation import timed_section
+from .models import Patient
+
+
+class PasswordHashingBusy(APIException):
+    """
+    Raised when the hashing pool is saturated, so callers fail fast instead of queueing behind a login storm.
+    """
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many login or registration requests, please retry shortly.'
+    default_code = 'password_hashing_busy'
+    retry_after = 1
+
+
+class HashingPool:
+    """
+    A size-limited executor for password hashing.
+
+    PBKDF2 is pure CPU work (hashlib releases the GIL while it runs), so it is
+    capped at `workers` concurrent hashes with room for `queue_size` more to
+    wait. Anything beyond that is rejected with PasswordHashingBusy right away.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, fn, *args):
+        with timed_section('password_hash'):
+            return self.submit(fn, *args).result()
+
+    async def arun(self, fn, *args):
+        with timed_section('password_hash'):
+            return await asyncio.wrap_future(self.submit(fn, *args))
+
+
+pool = HashingPool(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE_SIZE)
+
+
+def hash_password(raw_password):
+    return pool.run(make_password, raw_password)
+
+
+async def ahash_password(raw_password):
+    return await pool.arun(make_password, raw_password)
+
+
+async def aauthenticate(email, password):
+    """
+    Async equivalent of `authenticate()` with ModelBackend, with the hashing done in the pool.
+
+    Returns the active patient for these credentials, or None.
+    """
+    try:
+        user = await Patient._default_manager.aget(email=email)
+    except Patient.DoesNotExist:
+        # Hash anyway so unknown emails take as long as wrong passwords (as ModelBackend does).
+        await pool.arun(make_password, password)
+        return None
+
+    if not await pool.arun(check_password, password, user.password):
+        return None
+    if not user.is_active:
+        return None
+
+    if identify_hasher(user.password).must_update(user.password):
+        # The hasher's work factor was raised since this password was set.
+        user.password = await pool.arun(make_password, password)
+        await user.asave(update_fields=['password'])
+    return user
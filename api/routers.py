@@ -0,0 +1,152 @@
+"""
+Read replicas with read-your-writes.
+
+With replicas configured (DB_REPLICA_HOSTS, see settings.DATABASE_REPLICAS),
+PrimaryReplicaRouter sends reads to a replica and everything else to the
+primary. Replica reads are only used where they are known to be safe:
+
+- inside GET/HEAD/OPTIONS requests, which ReplicaReadMiddleware marks in a
+  context variable. Management commands, job handlers and the writes of
+  POST/PUT/PATCH/DELETE requests keep reading from the primary, as before.
+- outside transactions on the primary, whose reads must see their own writes.
+
+Each request picks one replica at random and reads everything from it.
+Replicas lag by different amounts, so a request spread over several could
+read a version counter from one and the rows from another, and e.g. cache
+a listing under a version it does not match (see api/caching.py).
+
+A replica can lag behind the primary. So a client whose write succeeded is
+pinned to the primary for READ_YOUR_WRITES_SECONDS, and a patient who just
+booked or cancelled never sees the slot in its old state. The pin is kept
+twice: as a cookie, and under the patient's id in the 'api' cache for
+token-authenticated clients that drop cookies. The latter only holds across
+workers when that cache is shared (API_CACHE_BACKEND=redis).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.authentication import get_authorization_header
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedTokenAuthentication
+from .caching import API_CACHE
+
+PIN_COOKIE = 'db_primary_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# The replica reads go to in this context, or None for the primary.
+_replica = ContextVar('replica', default=None)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Let (or, with enabled=False, stop) reads in the block go to one replica, picked at random.
+    """
+    token = _replica.set(random.choice(settings.DATABASE_REPLICAS) if enabled and settings.DATABASE_REPLICAS else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def pin_key(user_id):
+    return f'db-primary-pin:{user_id}'
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = _replica.get()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMiddleware:
+    """
+    Lets safe requests read from the replicas, unless the client wrote
+    within READ_YOUR_WRITES_SECONDS, and pins clients after each successful write.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = self.token_key(request)
+        user_id = self.token_user_id(key) if key is not None else None
+        with replica_reads(self.can_use_replicas(request, user_id)):
+            response = self.get_response(request)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        key = self.token_key(request)
+        user_id = None
+        if key is not None:
+            cached = CachedTokenAuthentication.cache.get(key)
+            user_id = cached[0].pk if cached is not None else await sync_to_async(self.token_user_id)(key)
+        with replica_reads(self.can_use_replicas(request, user_id)):
+            response = await self.get_response(request)
+        return self.pin(request, response)
+
+    def is_replica_candidate(self, request):
+        return bool(settings.DATABASE_REPLICAS) and request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+
+    def token_key(self, request):
+        """
+        The token of a safe request that could go to the replicas, or None.
+        """
+        if not self.is_replica_candidate(request):
+            return None
+        auth = get_authorization_header(request).split()
+        if len(auth) != 2 or auth[0].lower() != CachedTokenAuthentication.keyword.lower().encode():
+            return None
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            return None
+
+    def token_user_id(self, key):
+        """
+        The id of the patient `key` belongs to, or None. Read through the
+        token cache, so the view's own authentication is a hit.
+        """
+        try:
+            user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+        except AuthenticationFailed:
+            return None  # the view rejects the request
+        return user.pk
+
+    def can_use_replicas(self, request, user_id):
+        if not self.is_replica_candidate(request):
+            return False
+        return user_id is None or caches[API_CACHE].get(pin_key(user_id)) is None
+
+    def pin(self, request, response):
+        if settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS and response.status_code < 400:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.READ_YOUR_WRITES_SECONDS, httponly=True, samesite='Lax')
+            # DRF hands the user it authenticated down to the Django request.
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                caches[API_CACHE].set(pin_key(user.pk), True, settings.READ_YOUR_WRITES_SECONDS)
+        return response
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.db.models import Count, F, Q, Sum
+
+from .models import Schedule, SlotGrid
+from .slotgrid import full_mask, grid_storage_enabled
+from .versioning import bump_versions_on_commit
+
+
+def iter_template_days(template, start_date, weeks):
+    """
+    Yield the dates `template` applies to in the `weeks` weeks starting at
+    `start_date`, clipped to the template's validity.
+    """
+    first_day = max(start_date, template.valid_from)
+    last_day = start_date + timedelta(weeks=weeks) - timedelta(days=1)
+    if template.valid_until is not None:
+        last_day = min(last_day, template.valid_until)
+
+    day = first_day
+    while day <= last_day:
+        if day.weekday() in template.weekdays:
+            yield day
+        day += timedelta(days=1)
+
+
+def iter_template_slots(template, start_date, weeks):
+    """
+    Yield unsaved Schedule objects for every slot `template` covers in the
+    `weeks` weeks starting at `start_date`, clipped to the template's validity.
+    """
+    step = timedelta(minutes=template.slot_minutes)
+    for day in iter_template_days(template, start_date, weeks):
+        slot_start = datetime.combine(day, template.start_time)
+        day_end = datetime.combine(day, template.end_time)
+        while slot_start + step <= day_end:
+            yield Schedule(
+                doctor_id=template.doctor_id,
+                date=day,
+                start_time=slot_start.time(),
+                end_time=(slot_start + step).time(),
+                is_available=True,
+            )
+            slot_start += step
+
+
+def iter_template_grids(template, start_date, weeks):
+    """
+    Like iter_template_slots, but yields one unsaved SlotGrid per day with all its slots free.
+    """
+    session = datetime.combine(start_date, template.end_time) - datetime.combine(start_date, template.start_time)
+    slot_count = int(session.total_seconds()) // 60 // template.slot_minutes
+    if slot_count <= 0:
+        return
+    end_time = (datetime.combine(start_date, template.start_time) + timedelta(minutes=slot_count * template.slot_minutes)).time()
+    for day in iter_template_days(template, start_date, weeks):
+        yield SlotGrid(
+            doctor_id=template.doctor_id,
+            date=day,
+            start_time=template.start_time,
+            end_time=end_time,
+            slot_minutes=template.slot_minutes,
+            slot_count=slot_count,
+            available=full_mask(slot_count),
+            free_slots=slot_count,
+        )
+
+
+def materialize_templates(templates, start_date, weeks, batch_size=2000):
+    """
+    Create the Schedule rows for `templates` over `weeks` weeks with one
+    multi-row INSERT per `batch_size` slots, or one SlotGrid per template day
+    when SCHEDULE_STORAGE = 'grid'.
+
+    Inserts use ON CONFLICT DO NOTHING against the (doctor, date, start_time)
+    unique constraint, so re-running over an overlapping range only fills in
+    missing slots and never touches booked ones.
+
+    Returns the number of slots generated (including ones that already existed).
+    """
+    doctor_ids = set()
+    model, iter_rows = (SlotGrid, iter_template_grids) if grid_storage_enabled() else (Schedule, iter_template_slots)
+
+    def rows():
+        for template in templates:
+            doctor_ids.add(template.doctor_id)
+            yield from iter_rows(template, start_date, weeks)
+
+    generated = 0
+    remaining = rows()
+    while True:
+        batch = list(islice(remaining, batch_size))
+        if not batch:
+            break
+        model.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+        generated += sum(row.slot_count for row in batch) if model is SlotGrid else len(batch)
+
+    if generated:
+        bump_versions_on_commit(doctor_ids)
+    return generated
+
+
+def availability_calendar(queryset, start, end):
+    """
+    Free and booked slot counts for each day from `start` to `end` inclusive,
+    computed with a single GROUP BY over `queryset` (of Schedule or SlotGrid).
+
+    Days without any slots are included with zero counts, so callers can draw
+    a calendar straight from the result.
+    """
+    if queryset.model is SlotGrid:
+        counts = {'free': Sum('free_slots'), 'booked': Sum(F('slot_count') - F('free_slots'))}
+    else:
+        counts = {'free': Count('id', filter=Q(is_available=True)), 'booked': Count('id', filter=Q(is_available=False))}
+    rows = queryset.filter(date__range=(start, end)).order_by().values('date').annotate(**counts)
+    counts = {row['date']: row for row in rows}
+
+    days = []
+    day = start
+    while day <= end:
+        row = counts.get(day)
+        days.append({
+            'date': day,
+            'free': row['free'] if row else 0,
+            'booked': row['booked'] if row else 0,
+        })
+        day += timedelta(days=1)
+    return days
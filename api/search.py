@@ -0,0 +1,36 @@
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection
+from django.db.models import Case, FloatField, Q, Value, When
+from django.db.models.functions import Greatest
+
+SEARCH_FIELDS = ('name', 'specialty', 'department')
+
+
+def search_doctors(queryset, query):
+    """
+    Rank doctors matching `query` by name, specialty or department.
+
+    On PostgreSQL rows are selected with pg_trgm's word-similarity operator
+    (`<%`), which the GIN trigram indexes on each column serve and which
+    matches both prefixes ("card" -> "Cardiology") and misspellings
+    ("cardiolgy"). The rank is the best word similarity across the three
+    columns, with an exact prefix match sorted first.
+    """
+    query = query.strip()
+    if connection.vendor != 'postgresql':
+        matches = Q()
+        for field in SEARCH_FIELDS:
+            matches |= Q(**{f'{field}__icontains': query})
+        return queryset.filter(matches).order_by('name', 'id')
+
+    matches = Q()
+    for field in SEARCH_FIELDS:
+        matches |= Q(**{f'{field}__trigram_word_similar': query})
+    prefix = Q()
+    for field in SEARCH_FIELDS:
+        prefix |= Q(**{f'{field}__istartswith': query})
+
+    return queryset.filter(matches).annotate(
+        rank=Greatest(*(TrigramWordSimilarity(query, field) for field in SEARCH_FIELDS))
+        + Case(When(prefix, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+    ).order_by('-rank', 'id')
@@ -1,8 +1,31 @@
 from rest_framework import serializers
-from .models import Patient, Doctor, Schedule, Appointment
-from django.contrib.auth import authenticate
+from django.utils import timezone
+from .models import Patient, Doctor, Schedule, Appointment, ArchivedAppointment, SlotHold, WaitlistEntry
+from .passwords import hash_password
+from .instrumentation import timed_section
+from .slotgrid import get_slot, is_slot_ref
 
-class PatientSerializer(serializers.ModelSerializer):
+
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed_section('serialize'):
+            return super().data
+
+
+class TimedModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer whose rendering time shows up as `serialize` in the
+    per-request performance metrics. Subclasses' Meta should set
+    `list_serializer_class = TimedListSerializer` so lists are timed too.
+    """
+    @property
+    def data(self):
+        with timed_section('serialize'):
+            return super().data
+
+
+class PatientSerializer(TimedModelSerializer):
     password = serializers.CharField(write_only=True)
 
     class Meta:
@@ -10,23 +33,31 @@ class PatientSerializer(serializers.ModelSerializer):
         # 'username' is handled internally, not exposed to the client for registration.
         fields = ('id', 'username', 'first_name', 'email', 'password', 'phone', 'birthday')
         read_only_fields = ('id', 'username',)
+        list_serializer_class = TimedListSerializer
 
     def create(self, validated_data):
         """
         Create a new patient without using create_user to avoid username issues.
-        Password is set manually using set_password to ensure hashing.
+        The password is hashed up front (callers may pass an already computed
+        `password_hash` to save()), so the patient is written with a single INSERT.
         """
+        password_hash = validated_data.pop('password_hash', None)
+        if password_hash is None:
+            password_hash = hash_password(validated_data['password'])
         user = Patient.objects.create(
             email=validated_data['email'],
             first_name=validated_data.get('first_name', ''),
             phone=validated_data.get('phone'),
-            birthday=validated_data.get('birthday')
+            birthday=validated_data.get('birthday'),
+            password=password_hash
         )
-        user.set_password(validated_data['password'])
-        user.save()
         return user
 
 class EmailAuthTokenSerializer(serializers.Serializer):
+    """
+    Validates the shape of a login request. The credentials themselves are
+    checked by `api.passwords.aauthenticate`, off the request thread.
+    """
     email = serializers.EmailField(label="Email")
     password = serializers.CharField(
         label="Password",
@@ -34,49 +65,138 @@ class EmailAuthTokenSerializer(serializers.Serializer):
         trim_whitespace=False
     )
 
-    def validate(self, attrs):
-        try:
-            email = attrs.get('email')
-            password = attrs.get('password')
-
-            print(f"[Auth Debug] Email: {email}, Password: {password}")
-            if email and password:
-                # Since we set USERNAME_FIELD = 'email' in our Patient model,
-                # Django's authenticate function will correctly handle email as the username.
-                user = authenticate(request=self.context.get('request'),
-                                    username=email, password=password)
-                print(f"[Auth Debug] User object: {user}")
-
-                if not user:
-                    msg = 'Unable to log in with provided credentials.'
-                    raise serializers.ValidationError(msg, code='authorization')
-            else:
-                msg = 'Must include "email" and "password".'
-                raise serializers.ValidationError(msg, code='authorization')
-
-            attrs['user'] = user
-            return attrs
-        except Exception as e:
-            raise serializers.ValidationError(str(e))
-
 
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(TimedModelSerializer):
     class Meta:
         model = Doctor
         fields = ('id', 'name', 'specialty', 'department')
+        list_serializer_class = TimedListSerializer
 
 
-class ScheduleSerializer(serializers.ModelSerializer):
+class ScheduleSerializer(TimedModelSerializer):
     class Meta:
         model = Schedule
         fields = ('id', 'doctor', 'date', 'start_time', 'end_time', 'is_available')
+        list_serializer_class = TimedListSerializer
+
+
+class GridSlotSerializer(serializers.Serializer):
+    """
+    Renders an api.slotgrid.GridSlot with the same fields as ScheduleSerializer;
+    `id` is the slot reference to book it with.
+    """
+    id = serializers.CharField()
+    doctor = serializers.IntegerField(source='doctor_id')
+    date = serializers.DateField()
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+    is_available = serializers.BooleanField()
+
+    class Meta:
+        list_serializer_class = TimedListSerializer
+
+
+class ScheduleField(serializers.PrimaryKeyRelatedField):
+    """
+    A Schedule primary key, or a "<grid id>:<index>" reference to a slot kept in a SlotGrid.
+    """
+
+    def to_internal_value(self, data):
+        if is_slot_ref(data):
+            slot = get_slot(data)
+            if slot is None:
+                self.fail('does_not_exist', pk_value=data)
+            return slot
+        return super().to_internal_value(data)
+
+
+class CalendarQuerySerializer(serializers.Serializer):
+    """
+    Validates the query string of the availability calendar: exactly one of
+    `doctor_id` or `specialty`, and a `start`..`end` range of at most
+    MAX_DAYS days.
+    """
+    MAX_DAYS = 92
+
+    doctor_id = serializers.IntegerField(required=False)
+    specialty = serializers.CharField(required=False)
+    start = serializers.DateField()
+    end = serializers.DateField()
+
+    def validate(self, attrs):
+        if ('doctor_id' in attrs) == ('specialty' in attrs):
+            raise serializers.ValidationError("Provide either doctor_id or specialty.")
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError({'end': ["Must not be before start."]})
+        if (attrs['end'] - attrs['start']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError({'end': [f"The range may cover at most {self.MAX_DAYS} days."]})
+        return attrs
+
+
+class SlotEventQuerySerializer(serializers.Serializer):
+    """
+    Validates the query string of the slot event stream: a doctor, and optionally a single date.
+    """
+    doctor_id = serializers.IntegerField()
+    date = serializers.DateField(required=False)
+
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    """
+    Base for the batch booking and cancellation payloads: a list of at most
+    MAX_ITEMS distinct ids and a `mode`. In `all_or_nothing` mode (the
+    default) the batch is rolled back unless every item succeeds; in
+    `best_effort` mode each item succeeds or fails on its own.
+    """
+    MAX_ITEMS = 50
+    ALL_OR_NOTHING = 'all_or_nothing'
+    BEST_EFFORT = 'best_effort'
+
+    mode = serializers.ChoiceField(choices=(ALL_OR_NOTHING, BEST_EFFORT), default=ALL_OR_NOTHING)
+
+    def validate_items(self, value):
+        if len(set(value)) != len(value):
+            raise serializers.ValidationError("Each item may only be listed once.")
+        return value
+
+
+class BatchBookingSerializer(BatchRequestSerializer):
+    schedules = serializers.ListField(
+        child=serializers.CharField(), allow_empty=False, max_length=BatchRequestSerializer.MAX_ITEMS
+    )
+
+    def validate_schedules(self, value):
+        """
+        Schedule primary keys become ints; "<grid id>:<index>" slot references stay strings.
+        """
+        ids = []
+        for item in value:
+            if is_slot_ref(item):
+                ids.append(item)
+            elif item.isascii() and item.isdigit():  # isdigit() alone accepts e.g. '²', which int() rejects
+                ids.append(int(item))
+            else:
+                raise serializers.ValidationError(f'"{item}" is not a schedule id.')
+        return self.validate_items(ids)
 
 
-class AppointmentSerializer(serializers.ModelSerializer):
+class BatchCancelSerializer(BatchRequestSerializer):
+    appointments = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False, max_length=BatchRequestSerializer.MAX_ITEMS
+    )
+
+    def validate_appointments(self, value):
+        return self.validate_items(value)
+
+class AppointmentSerializer(TimedModelSerializer):
+    schedule = ScheduleField(queryset=Schedule.objects.all())
+
     class Meta:
         model = Appointment
         fields = ('id', 'patient', 'schedule', 'status', 'created_at')
         read_only_fields = ('patient', 'status', 'created_at')
+        list_serializer_class = TimedListSerializer
 
     def validate_schedule(self, value):
         """
@@ -86,3 +206,67 @@ class AppointmentSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("This schedule is not available.")
         return value
 
+
+
+class SlotHoldSerializer(TimedModelSerializer):
+    schedule = ScheduleField(queryset=Schedule.objects.all())
+
+    class Meta:
+        model = SlotHold
+        fields = ('id', 'schedule', 'expires_at', 'created_at')
+        read_only_fields = ('expires_at', 'created_at')
+
+    def validate_schedule(self, value):
+        if not value.is_available:
+            raise serializers.ValidationError("This schedule is not available.")
+        return value
+
+
+class ArchivedAppointmentSerializer(TimedModelSerializer):
+    class Meta:
+        model = ArchivedAppointment
+        fields = ('id', 'doctor', 'date', 'start_time', 'end_time', 'status', 'created_at')
+        list_serializer_class = TimedListSerializer
+
+
+class WaitlistEntrySerializer(TimedModelSerializer):
+    class Meta:
+        model = WaitlistEntry
+        fields = ('id', 'doctor', 'date', 'status', 'appointment', 'created_at')
+        read_only_fields = ('status', 'appointment', 'created_at')
+        list_serializer_class = TimedListSerializer
+
+    def validate_date(self, value):
+        if value < timezone.localdate():
+            raise serializers.ValidationError("Cannot join the waitlist for a past date.")
+        return value
+
+    def validate(self, attrs):
+        patient = self.context['request'].user
+        if WaitlistEntry.objects.filter(patient=patient, doctor=attrs['doctor'], date=attrs['date'], status='waiting').exists():
+            raise serializers.ValidationError("You are already on the waitlist for this doctor and date.")
+        return attrs
+
+class ScheduleWithDoctorSerializer(ScheduleSerializer):
+    doctor = DoctorSerializer(read_only=True)
+
+
+class AppointmentWithScheduleSerializer(AppointmentSerializer):
+    """
+    Read-only appointment representation with the schedule inlined, for `?expand=schedule`.
+    """
+    schedule = ScheduleSerializer(read_only=True)
+
+
+class AppointmentWithScheduleDoctorSerializer(AppointmentSerializer):
+    """
+    Read-only appointment representation with the schedule and its doctor inlined, for `?expand=schedule.doctor`.
+    """
+    schedule = ScheduleWithDoctorSerializer(read_only=True)
+
+
+# `?expand=` values accepted by the appointment list.
+APPOINTMENT_EXPANSIONS = {
+    'schedule': AppointmentWithScheduleSerializer,
+    'schedule.doctor': AppointmentWithScheduleDoctorSerializer,
+}
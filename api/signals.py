@@ -0,0 +1,53 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .instrumentation import install_query_recorder
+from .models import Appointment, Doctor, Patient, Schedule, SlotGrid
+from .versioning import bump_versions_on_commit
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Patient)
+def forget_patient_tokens(sender, instance, **kwargs):
+    # Covers deactivation as well as profile edits, so cached users never go stale in this process.
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_delete, sender=Doctor)
+def bump_doctor_versions(sender, instance, **kwargs):
+    bump_versions_on_commit([instance.pk], roster=True)
+
+
+@receiver(post_save, sender=Schedule)
+@receiver(post_delete, sender=Schedule)
+@receiver(post_save, sender=SlotGrid)
+@receiver(post_delete, sender=SlotGrid)
+def bump_schedule_versions(sender, instance, **kwargs):
+    bump_versions_on_commit([instance.doctor_id])
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def bump_appointment_versions(sender, instance, **kwargs):
+    # Bookings pass the schedule in; only look it up when it wasn't loaded.
+    if Appointment.schedule.is_cached(instance):
+        doctor_ids = [instance.schedule.doctor_id]
+    else:
+        doctor_ids = Schedule.objects.filter(pk=instance.schedule_id).values_list('doctor_id', flat=True)
+    bump_versions_on_commit(doctor_ids)
+
+
+# Queryset update() and bulk_create() send no signals; api.booking,
+# api.slotgrid's callers and api.scheduling bump the counters for those writes themselves.
+
+
+connection_created.connect(install_query_recorder, dispatch_uid='api.instrumentation.install_query_recorder')
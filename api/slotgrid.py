@@ -0,0 +1,252 @@
+"""
+Bitmap slot storage.
+
+With SCHEDULE_STORAGE = 'grid', open slots live in SlotGrid rows, one per
+doctor session, instead of one Schedule row per slot: a year of 5-minute
+slots for a doctor is a few hundred rows rather than tens of thousands.
+
+Slots are addressed as "<grid id>:<slot index>" in the API. They are expanded
+from the grids when listed, claimed by clearing their bit with a conditional
+UPDATE when booked (the same race-free pattern as api.booking), and only
+then get a Schedule row for the appointment to point at.
+
+The bit is what makes a grid slot free. Once a slot has a Schedule row it
+can also be booked by that row's pk, so every claim and release of such a
+row updates the bit in the same transaction (claim_schedule_bit and
+release_slot), and a slot claimed through its bit only takes over a row
+that is still available.
+"""
+import heapq
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import BinaryField, F, Func, IntegerField, Q
+from django.db.models.lookups import Exact
+from django.utils import timezone
+
+from .models import Schedule, SlotGrid
+
+SLOT_REF_SEPARATOR = ':'
+
+# Creates the slot's row on its first booking, or takes over the row a
+# cancelled booking left behind, but not a row that is booked or held.
+CLAIM_ROW_SQL = f"""
+    INSERT INTO {Schedule._meta.db_table} (doctor_id, date, start_time, end_time, is_available)
+    VALUES (%s, %s, %s, %s, false)
+    ON CONFLICT (doctor_id, date, start_time) DO UPDATE SET is_available = false
+    WHERE {Schedule._meta.db_table}.is_available
+    RETURNING id
+"""
+
+
+def grid_storage_enabled():
+    return settings.SCHEDULE_STORAGE == 'grid'
+
+
+class GetBit(Func):
+    function = 'get_bit'
+    output_field = IntegerField()
+
+
+class SetBit(Func):
+    function = 'set_bit'
+    output_field = BinaryField()
+
+
+def full_mask(slot_count):
+    """
+    The `available` value of a grid with all `slot_count` slots free.
+    """
+    return ((1 << slot_count) - 1).to_bytes((slot_count + 7) // 8 or 1, 'little')
+
+
+class GridSlot:
+    """
+    One slot of a SlotGrid, with the attributes of a Schedule so it renders and books like one.
+    """
+    __slots__ = ('grid', 'index', 'is_available', 'start_time', 'end_time')
+
+    def __init__(self, grid, index, is_available):
+        self.grid = grid
+        self.index = index
+        self.is_available = is_available
+        start = datetime.combine(grid.date, grid.start_time) + timedelta(minutes=grid.slot_minutes * index)
+        self.start_time = start.time()
+        self.end_time = (start + timedelta(minutes=grid.slot_minutes)).time()
+
+    @property
+    def id(self):
+        return f'{self.grid.pk}{SLOT_REF_SEPARATOR}{self.index}'
+
+    @property
+    def grid_id(self):
+        return self.grid.pk
+
+    @property
+    def doctor_id(self):
+        return self.grid.doctor_id
+
+    @property
+    def date(self):
+        return self.grid.date
+
+    @property
+    def sort_key(self):
+        # Matches the (date, start_time, id) order of row-per-slot listings.
+        return (self.grid.date, self.start_time, self.grid.pk, self.index)
+
+
+def is_slot_ref(value):
+    return isinstance(value, str) and SLOT_REF_SEPARATOR in value
+
+
+def get_slot(ref):
+    """
+    The GridSlot for a "<grid id>:<index>" reference, or None if there is no such slot.
+    """
+    try:
+        grid_id, index = (int(part) for part in ref.split(SLOT_REF_SEPARATOR))
+    except ValueError:
+        return None
+    grid = SlotGrid.objects.filter(pk=grid_id).first()
+    if grid is None or not 0 <= index < grid.slot_count:
+        return None
+    return GridSlot(grid, index, bool(int.from_bytes(bytes(grid.available), 'little') >> index & 1))
+
+
+def filter_grids(queryset, params):
+    """
+    The grid counterpart of views.filter_schedules: restrict to `doctor_id`
+    and `date`, or without a date to grids from today on with free slots.
+
+    Returns the queryset and whether only free slots should be listed.
+    """
+    doctor_id = params.get('doctor_id')
+    date = params.get('date')
+
+    if doctor_id is not None:
+        queryset = queryset.filter(doctor__pk=doctor_id)
+    if date is not None:
+        return queryset.filter(date=date), False
+    return queryset.filter(date__gte=timezone.now().date(), free_slots__gt=0), True
+
+
+def grid_slots(grid, available_only=False, after=None):
+    mask = int.from_bytes(bytes(grid.available), 'little')
+    for index in range(grid.slot_count):
+        is_available = bool(mask >> index & 1)
+        if available_only and not is_available:
+            continue
+        slot = GridSlot(grid, index, is_available)
+        if after is not None and slot.sort_key <= after:
+            continue
+        yield slot
+
+
+def iter_slots(grids, available_only=False, after=None, chunk_size=100):
+    """
+    Yield the slots of `grids` in (date, start_time, grid id, index) order,
+    starting after the `after` sort key if given.
+
+    Grids are streamed in start order and merged with a heap. A slot is
+    emitted as soon as no grid still to be read can start before it, so a
+    page only reads the grids it actually shows.
+    """
+    if after is not None:
+        grids = grids.filter(Q(date__gt=after[0]) | Q(date=after[0], end_time__gt=after[1]))
+    grids = grids.order_by('date', 'start_time', 'id')
+
+    heap = []
+
+    def push(slots):
+        slot = next(slots, None)
+        if slot is not None:
+            heapq.heappush(heap, (slot.sort_key, slot, slots))
+
+    def pop():
+        _, slot, slots = heapq.heappop(heap)
+        push(slots)
+        return slot
+
+    for grid in grids.iterator(chunk_size=chunk_size):
+        while heap and heap[0][0] < (grid.date, grid.start_time):
+            yield pop()
+        push(grid_slots(grid, available_only, after))
+    while heap:
+        yield pop()
+
+
+def claim_slot(slot):
+    """
+    Clear the slot's bit if it is still set and return the Schedule row the
+    appointment should point at, or None if someone else claimed it first.
+    Must run inside the booking transaction.
+    """
+    # A savepoint, so a slot whose row turns out to be taken keeps its bit.
+    with transaction.atomic():
+        claimed = SlotGrid.objects.filter(Exact(GetBit('available', slot.index), 1), pk=slot.grid_id).update(
+            available=SetBit('available', slot.index, 0),
+            free_slots=F('free_slots') - 1,
+        )
+        if not claimed:
+            return None
+
+        with connection.cursor() as cursor:
+            cursor.execute(CLAIM_ROW_SQL, [slot.doctor_id, slot.date, slot.start_time, slot.end_time])
+            row = cursor.fetchone()
+        if row is None:
+            transaction.set_rollback(True)
+            return None
+    return Schedule(
+        pk=row[0], doctor_id=slot.doctor_id, date=slot.date, start_time=slot.start_time, end_time=slot.end_time, is_available=False
+    )
+
+
+def covering_slot(schedule):
+    """
+    The grid `schedule` lies in and its index there, or (None, None) if it
+    was not made from a grid.
+    """
+    grid = SlotGrid.objects.filter(
+        doctor_id=schedule.doctor_id, date=schedule.date, start_time__lte=schedule.start_time, end_time__gt=schedule.start_time
+    ).first()
+    if grid is None:
+        return None, None
+    offset = datetime.combine(grid.date, schedule.start_time) - datetime.combine(grid.date, grid.start_time)
+    index, remainder = divmod(int(offset.total_seconds()) // 60, grid.slot_minutes)
+    if remainder:
+        return None, None
+    return grid, index
+
+
+def claim_schedule_bit(schedule):
+    """
+    Clear the bit of the grid slot `schedule` was created for, when it is
+    claimed by pk. Returns False if the bit was clear already, i.e. the slot
+    is taken through the grid; True otherwise, including when the schedule
+    was not made from a grid.
+    """
+    grid, index = covering_slot(schedule)
+    if grid is None:
+        return True
+    return bool(SlotGrid.objects.filter(Exact(GetBit('available', index), 1), pk=grid.pk).update(
+        available=SetBit('available', index, 0),
+        free_slots=F('free_slots') - 1,
+    ))
+
+
+def release_slot(schedule):
+    """
+    Set the bit of the grid slot `schedule` was created for, if any, after
+    its appointment was cancelled. Returns the slot's reference if it was
+    freed, otherwise None.
+    """
+    grid, index = covering_slot(schedule)
+    if grid is None:
+        return None
+    released = SlotGrid.objects.filter(Exact(GetBit('available', index), 0), pk=grid.pk).update(
+        available=SetBit('available', index, 1),
+        free_slots=F('free_slots') + 1,
+    )
+    return GridSlot(grid, index, True).id if released else None
@@ -0,0 +1,38 @@
+"""
+Job handlers for the side effects of bookings and cancellations (see api/jobs.py).
+"""
+from django.core.mail import send_mail
+
+from .jobs import job
+from .models import Appointment
+
+
+def _describe(appointment):
+    schedule = appointment.schedule
+    return f"Dr. {schedule.doctor.name} on {schedule.date:%Y-%m-%d} at {schedule.start_time:%H:%M}"
+
+
+@job('send_booking_confirmation')
+def send_booking_confirmation(appointment_id):
+    appointment = Appointment.objects.select_related('patient', 'schedule__doctor').filter(pk=appointment_id).first()
+    if appointment is None or appointment.status != 'booked':
+        return  # cancelled or deleted before the job ran
+    send_mail(
+        'Appointment confirmed',
+        f"Your appointment with {_describe(appointment)} is confirmed.",
+        None,
+        [appointment.patient.email],
+    )
+
+
+@job('send_cancellation_notice')
+def send_cancellation_notice(appointment_id):
+    appointment = Appointment.objects.select_related('patient', 'schedule__doctor').filter(pk=appointment_id).first()
+    if appointment is None:
+        return
+    send_mail(
+        'Appointment cancelled',
+        f"Your appointment with {_describe(appointment)} has been cancelled.",
+        None,
+        [appointment.patient.email],
+    )
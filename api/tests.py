@@ -1,7 +1,39 @@
+import json
+import threading
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock
+from unittest import SkipTest, skipUnless
+from django.core import mail
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse
-from .models import Patient, Doctor, Schedule, Appointment
+from django.utils import timezone
+from psycopg_pool import ConnectionPool
+from .models import Patient, Doctor, Schedule, Appointment, ArchivedAppointment, ScheduleTemplate, SlotGrid, WaitlistEntry, Job, IdempotencyKey, SlotHold
+from .booking import book_schedule, cancel_appointment, cancel_appointments, SlotUnavailable
+from .scheduling import materialize_templates
+from .slotgrid import get_slot, release_slot
+from .archive import archive_schedules
+from .authentication import TokenCache, token_cache
+from .routers import PIN_COOKIE, PrimaryReplicaRouter, ReplicaReadMiddleware, replica_reads
+from .events import SlotEventHub, Subscription, hub
+from .caching import API_CACHE, get_or_compute
+from .idempotency import REPLAYED_HEADER
+from .holds import expire_holds, hold_schedule, release_hold
+from .jobs import claim_jobs, enqueue, handlers, job, requeue_stale_jobs, run_jobs
+from .passwords import HashingPool
+from . import fastpath
+from .fastpath import dumps
+from .serializers import AppointmentSerializer, AppointmentWithScheduleDoctorSerializer, DoctorSerializer, ScheduleSerializer
+from rest_framework.renderers import JSONRenderer
 from rest_framework.authtoken.models import Token
 
 class RegistrationAPITest(APITestCase):
@@ -107,8 +139,8 @@ class DoctorAPITest(APITestCase):
         response = self.client.get(url, format='json')
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
-        self.assertEqual(response.data[0]['name'], 'Dr. Emily Carter')
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(response.data['results'][0]['name'], 'Dr. Emily Carter')
 
     def test_can_retrieve_single_doctor(self):
         """
@@ -122,6 +154,14 @@ class DoctorAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['name'], doctor.name)
 
+    def test_search_requires_a_query(self):
+        """
+        Ensure searching without `q` is a validation error rather than a full listing.
+        """
+        response = self.client.get(reverse('doctor-search'), format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
 class ScheduleAPITest(APITestCase):
     def setUp(self):
         self.doctor1 = Doctor.objects.create(name='Dr. Alan Grant', specialty='Paleontology')
@@ -145,9 +185,9 @@ class ScheduleAPITest(APITestCase):
         response = self.client.get(url, format='json')
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2) # Should only return schedule1 and schedule2
+        self.assertEqual(len(response.data['results']), 2) # Should only return schedule1 and schedule2
         # Check if the returned schedules belong to the correct doctor and date
-        for schedule_data in response.data:
+        for schedule_data in response.data['results']:
             self.assertEqual(schedule_data['doctor'], self.doctor1.pk)
 
     def test_can_list_all_available_schedules_for_a_doctor(self):
@@ -160,9 +200,9 @@ class ScheduleAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
         # Should return schedule1 and schedule3, but not schedule2 (unavailable) or past_schedule
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data['results']), 2)
         
-        response_ids = {item['id'] for item in response.data}
+        response_ids = {item['id'] for item in response.data['results']}
         self.assertIn(self.schedule1.id, response_ids)
         self.assertIn(self.schedule3.id, response_ids)
 
@@ -224,8 +264,8 @@ class AppointmentAPITest(APITestCase):
         response = self.client.get(url, format='json')
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['id'], self.appointment1.id)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['id'], self.appointment1.id)
 
     def test_patient_cannot_list_other_patients_appointments(self):
         """
@@ -236,7 +276,7 @@ class AppointmentAPITest(APITestCase):
         response = self.client.get(url, format='json')
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 0) # Patient 2 should have no appointments
+        self.assertEqual(len(response.data['results']), 0) # Patient 2 should have no appointments
 
     def test_patient_can_cancel_their_own_appointment(self):
         """
@@ -268,3 +308,1973 @@ class AppointmentAPITest(APITestCase):
         # The original appointment should remain unchanged
         self.appointment1.refresh_from_db()
         self.assertEqual(self.appointment1.status, 'booked')
+
+
+class BookingEngineTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='booker@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        self.other_patient = Patient.objects.create(email='other.booker@example.com')
+        self.doctor = Doctor.objects.create(name='Dr. Race', specialty='Concurrency')
+        self.schedule = Schedule.objects.create(doctor=self.doctor, date='2025-12-25', start_time='09:00', end_time='09:30', is_available=True)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_booking_runs_in_a_fixed_number_of_queries(self):
+        """
+        Ensure booking is token lookup, schedule lookup, one conditional UPDATE and two INSERTs.
+        """
+        url = reverse('appointment-list')
+        # token, schedule, SAVEPOINT, UPDATE, INSERT appointment, INSERT confirmation job, NOTIFY, RELEASE SAVEPOINT
+        with self.assertNumQueries(8):
+            response = self.client.post(url, {'schedule': self.schedule.pk}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['schedule'], self.schedule.pk)
+
+    def test_losing_a_race_raises_conflict(self):
+        """
+        Ensure a booker holding a stale view of an available schedule gets a conflict, not a second booking.
+        """
+        stale_schedule = Schedule.objects.get(pk=self.schedule.pk)
+        book_schedule(self.other_patient, self.schedule)
+
+        with self.assertRaises(SlotUnavailable):
+            book_schedule(self.patient, stale_schedule)
+        self.assertEqual(Appointment.objects.filter(schedule=self.schedule).count(), 1)
+
+    def test_cancelled_schedule_can_be_booked_again(self):
+        """
+        Ensure a schedule freed by a cancellation can be booked by another patient.
+        """
+        appointment = book_schedule(self.other_patient, self.schedule)
+        self.assertTrue(cancel_appointment(appointment))
+
+        url = reverse('appointment-list')
+        response = self.client.post(url, {'schedule': self.schedule.pk}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Appointment.objects.filter(schedule=self.schedule, status='booked').get().patient, self.patient)
+
+
+
+class BatchAppointmentTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='family@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        self.other_patient = Patient.objects.create(email='neighbour@example.com')
+        self.doctor = Doctor.objects.create(name='Dr. Batch', specialty='Families')
+        self.schedules = [
+            Schedule.objects.create(doctor=self.doctor, date='2099-04-01', start_time=time(9, minute), end_time=time(9, minute + 5))
+            for minute in range(0, 50, 5)
+        ]
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def book(self, schedules, mode='all_or_nothing'):
+        return self.client.post(
+            reverse('appointment-batch'), {'schedules': [schedule.pk for schedule in schedules], 'mode': mode}, format='json'
+        )
+
+    def cancel(self, appointments, mode='all_or_nothing'):
+        return self.client.post(
+            reverse('appointment-batch-cancel'), {'appointments': [appointment.pk for appointment in appointments], 'mode': mode},
+            format='json',
+        )
+
+    def test_batch_booking_books_every_schedule(self):
+        """
+        Ensure a batch books all its schedules and reports each appointment.
+        """
+        response = self.book(self.schedules[:3])
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([item['status'] for item in response.data['results']], ['booked'] * 3)
+        self.assertEqual([item['appointment']['schedule'] for item in response.data['results']], [s.pk for s in self.schedules[:3]])
+        self.assertEqual(Schedule.objects.filter(pk__in=[s.pk for s in self.schedules[:3]], is_available=False).count(), 3)
+        self.assertEqual(Appointment.objects.filter(patient=self.patient, status='booked').count(), 3)
+
+    def test_batch_query_count_does_not_depend_on_the_batch_size(self):
+        """
+        Ensure booking and cancelling 2 or 8 items costs the same queries: one lock, bulk UPDATEs, one INSERT.
+        """
+        self.book(self.schedules[:1])  # warm the token cache
+        counts = []
+        for schedules in (self.schedules[1:3], self.schedules[3:]):
+            with CaptureQueriesContext(connection) as booking:
+                self.book(schedules)
+            appointments = list(Appointment.objects.filter(schedule__in=schedules))
+            with CaptureQueriesContext(connection) as cancelling:
+                self.cancel(appointments)
+            counts.append((len(booking), len(cancelling)))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_all_or_nothing_batch_is_rolled_back_on_any_failure(self):
+        """
+        Ensure one taken schedule fails the whole batch, with the outcome of every item.
+        """
+        book_schedule(self.other_patient, self.schedules[1])
+        response = self.client.post(
+            reverse('appointment-batch'), {'schedules': [self.schedules[0].pk, self.schedules[1].pk, 999999]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual([item['status'] for item in response.data['results']], ['skipped', 'unavailable', 'not_found'])
+        self.assertFalse(Appointment.objects.filter(patient=self.patient).exists())
+        self.schedules[0].refresh_from_db()
+        self.assertTrue(self.schedules[0].is_available)
+
+    def test_best_effort_batch_books_what_it_can(self):
+        """
+        Ensure best-effort mode books the free schedules and reports the others.
+        """
+        book_schedule(self.other_patient, self.schedules[1])
+        response = self.book(self.schedules[:3], mode='best_effort')
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([item['status'] for item in response.data['results']], ['booked', 'unavailable', 'booked'])
+        self.assertEqual(Appointment.objects.filter(patient=self.patient).count(), 2)
+
+    def test_batch_cancellation_releases_every_schedule(self):
+        """
+        Ensure a batch cancellation cancels the appointments and frees their schedules.
+        """
+        appointments = [book_schedule(self.patient, schedule) for schedule in self.schedules[:3]]
+        response = self.cancel(appointments)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['status'] for item in response.data['results']], ['cancelled'] * 3)
+        self.assertEqual(Schedule.objects.filter(pk__in=[s.pk for s in self.schedules[:3]], is_available=True).count(), 3)
+
+    def test_batch_cancellation_modes(self):
+        """
+        Ensure other patients' and already cancelled appointments fail an all-or-nothing
+        cancellation, and are skipped over in best-effort mode.
+        """
+        mine = book_schedule(self.patient, self.schedules[0])
+        theirs = book_schedule(self.other_patient, self.schedules[1])
+        cancelled = book_schedule(self.patient, self.schedules[2])
+        cancel_appointment(cancelled)
+
+        response = self.cancel([mine, theirs, cancelled])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual([item['status'] for item in response.data['results']], ['skipped', 'not_found', 'not_cancellable'])
+        mine.refresh_from_db()
+        self.assertEqual(mine.status, 'booked')
+
+        response = self.cancel([mine, theirs, cancelled], mode='best_effort')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([item['status'] for item in response.data['results']], ['cancelled', 'not_found', 'not_cancellable'])
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.status, 'booked')
+
+    def test_batch_payload_is_validated(self):
+        """
+        Ensure duplicate, malformed and oversized batches are rejected.
+        """
+        pk = self.schedules[0].pk
+        for payload in ({'schedules': [pk, pk]}, {'schedules': ['abc']}, {'schedules': []}, {'schedules': list(range(1, 52))}):
+            response = self.client.post(reverse('appointment-batch'), payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, payload)
+
+    def test_non_ascii_digits_are_not_schedule_ids(self):
+        """
+        Ensure ids made of Unicode digits such as superscripts are a 400, not a server error.
+        """
+        for item in ('²', '١٢', f'{self.schedules[0].pk}²'):
+            response = self.client.post(reverse('appointment-batch'), {'schedules': [item]}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, item)
+
+
+class WaitlistTest(APITestCase):
+    def setUp(self):
+        self.day = date.today() + timedelta(days=30)
+        self.doctor = Doctor.objects.create(name='Dr. Queue', specialty='Waiting')
+        self.schedules = [
+            Schedule.objects.create(doctor=self.doctor, date=self.day, start_time=time(hour), end_time=time(hour, 30))
+            for hour in (9, 10)
+        ]
+        self.holder = Patient.objects.create(email='holder@example.com')
+        self.appointments = [book_schedule(self.holder, schedule) for schedule in self.schedules]
+        self.waiters = [Patient.objects.create(email=f'waiter{i}@example.com') for i in range(3)]
+        self.tokens = [Token.objects.create(user=waiter) for waiter in self.waiters]
+
+    def join(self, index, **data):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.tokens[index].key)
+        return self.client.post(reverse('waitlist-list'), {'doctor': self.doctor.pk, 'date': str(self.day), **data}, format='json')
+
+    def test_patient_can_join_the_waitlist_once(self):
+        """
+        Ensure joining creates a waiting entry, and joining again for the same doctor and date is rejected.
+        """
+        response = self.join(0)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['status'], 'waiting')
+
+        self.assertEqual(self.join(0).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.join(0, date=str(date.today() - timedelta(days=1))).status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('waitlist-list'))
+        self.assertEqual([entry['status'] for entry in response.data['results']], ['waiting'])
+
+    def test_cancellation_goes_to_the_longest_waiting_patient(self):
+        """
+        Ensure a cancelled slot is booked for the first waiter in the same transaction and never listed as free.
+        """
+        self.join(0)
+        self.join(1)
+        self.assertTrue(cancel_appointment(self.appointments[0]))
+
+        first, second = WaitlistEntry.objects.order_by('created_at', 'id')
+        self.assertEqual(first.status, 'assigned')
+        self.assertEqual((first.appointment.patient, first.appointment.schedule), (self.waiters[0], self.schedules[0]))
+        self.assertEqual(second.status, 'waiting')
+        self.schedules[0].refresh_from_db()
+        self.assertFalse(self.schedules[0].is_available)
+
+    def test_waiters_who_booked_meanwhile_are_passed_over(self):
+        """
+        Ensure a waiter who already has a booking with the doctor that day does not get a second one.
+        """
+        self.join(0)
+        self.join(1)
+        extra = Schedule.objects.create(doctor=self.doctor, date=self.day, start_time=time(11), end_time=time(11, 30))
+        book_schedule(self.waiters[0], extra)
+
+        cancel_appointment(self.appointments[0])
+        self.assertEqual(WaitlistEntry.objects.get(status='assigned').patient, self.waiters[1])
+
+    def test_cancelling_patient_is_not_offered_their_own_slot(self):
+        """
+        Ensure a patient who cancels while on the waitlist for that doctor and date does not get the slot back.
+        """
+        self.join(0)
+        Token.objects.create(user=self.holder)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.holder.auth_token.key)
+        self.client.post(reverse('waitlist-list'), {'doctor': self.doctor.pk, 'date': str(self.day)}, format='json')
+        WaitlistEntry.objects.filter(patient=self.holder).update(created_at=timezone.now() - timedelta(days=1))
+
+        cancel_appointment(self.appointments[0])
+        self.assertEqual(WaitlistEntry.objects.get(status='assigned').patient, self.waiters[0])
+
+        cancel_appointments(self.holder, [self.appointments[1].pk])
+        self.assertEqual(WaitlistEntry.objects.get(patient=self.holder).status, 'waiting')
+        self.schedules[1].refresh_from_db()
+        self.assertTrue(self.schedules[1].is_available)
+
+    def test_slot_is_released_when_nobody_is_waiting(self):
+        """
+        Ensure withdrawn entries are ignored and the slot goes back on the list.
+        """
+        entry = self.join(0).data
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.tokens[0].key)
+        response = self.client.delete(reverse('waitlist-withdraw', kwargs={'pk': entry['id']}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        cancel_appointment(self.appointments[0])
+        self.schedules[0].refresh_from_db()
+        self.assertTrue(self.schedules[0].is_available)
+        self.assertFalse(Appointment.objects.filter(schedule=self.schedules[0], status='booked').exists())
+
+    def test_batch_cancellation_assigns_each_slot_to_a_different_waiter(self):
+        """
+        Ensure a batch cancellation serves the queue in order, one slot per waiter.
+        """
+        for index in range(3):
+            self.join(index)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=self.holder).key)
+        response = self.client.post(
+            reverse('appointment-batch-cancel'), {'appointments': [a.pk for a in self.appointments]}, format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            list(WaitlistEntry.objects.order_by('created_at', 'id').values_list('status', 'appointment__schedule')),
+            [('assigned', self.schedules[0].pk), ('assigned', self.schedules[1].pk), ('waiting', None)],
+        )
+
+
+class JobQueueTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='jobs@example.com')
+        self.doctor = Doctor.objects.create(name='Dr. Async', specialty='Queues')
+        self.schedule = Schedule.objects.create(doctor=self.doctor, date='2099-05-01', start_time='09:00', end_time='09:30')
+        self.calls = []
+
+        @job('test_record')
+        def record(value):
+            self.calls.append(value)
+
+        @job('test_fail')
+        def fail():
+            raise RuntimeError('mail server down')
+
+        self.addCleanup(handlers.pop, 'test_record')
+        self.addCleanup(handlers.pop, 'test_fail')
+
+    def test_booking_and_cancelling_send_emails_from_the_worker(self):
+        """
+        Ensure confirmation and cancellation emails are queued with the write and sent by run_jobs, not inline.
+        """
+        appointment = book_schedule(self.patient, self.schedule)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Job.objects.get().name, 'send_booking_confirmation')
+        call_command('run_jobs', once=True, stdout=StringIO())
+
+        cancel_appointment(appointment)
+        call_command('run_jobs', once=True, stdout=StringIO())
+        self.assertEqual([message.subject for message in mail.outbox], ['Appointment confirmed', 'Appointment cancelled'])
+        self.assertEqual(mail.outbox[1].to, ['jobs@example.com'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_confirmation_is_skipped_for_appointments_cancelled_before_it_ran(self):
+        """
+        Ensure a patient who cancels right away only gets the cancellation email.
+        """
+        cancel_appointment(book_schedule(self.patient, self.schedule))
+        call_command('run_jobs', once=True, stdout=StringIO())
+        self.assertEqual([message.subject for message in mail.outbox], ['Appointment cancelled'])
+
+    def test_jobs_are_not_queued_for_rolled_back_bookings(self):
+        """
+        Ensure a booking that loses its race leaves no job behind.
+        """
+        book_schedule(self.patient, self.schedule)
+        with self.assertRaises(SlotUnavailable):
+            book_schedule(Patient.objects.create(email='late.jobs@example.com'), Schedule.objects.get(pk=self.schedule.pk))
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_claims_are_batched_and_exclusive(self):
+        """
+        Ensure a claim takes at most `limit` due jobs, oldest first, and claimed or future jobs are not handed out again.
+        """
+        for value in range(5):
+            enqueue('test_record', value=value)
+        enqueue('test_record', delay=timedelta(hours=1), value='later')
+
+        first = claim_jobs('worker-1', limit=3)
+        second = claim_jobs('worker-2', limit=3)
+        self.assertEqual([claimed.payload['value'] for claimed in first], [0, 1, 2])
+        self.assertEqual([claimed.payload['value'] for claimed in second], [3, 4])
+        self.assertEqual(claim_jobs('worker-3'), [])
+
+        self.assertEqual(run_jobs(first + second), (5, 0))
+        self.assertEqual(self.calls, [0, 1, 2, 3, 4])
+        self.assertEqual(Job.objects.get().payload, {'value': 'later'})
+
+    @override_settings(JOB_RETRY_BACKOFF=10, JOB_RETRY_BACKOFF_MAX=15)
+    def test_failed_jobs_are_retried_with_backoff_then_kept(self):
+        """
+        Ensure a failing job is rescheduled with a growing, capped delay and marked failed after its last attempt.
+        """
+        queued = enqueue('test_fail')
+        Job.objects.filter(pk=queued.pk).update(max_attempts=3)
+        delays = []
+        for _ in range(3):
+            Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+            started = timezone.now()
+            self.assertEqual(run_jobs(claim_jobs('worker')), (0, 1))
+            queued.refresh_from_db()
+            delays.append(round((queued.run_at - started).total_seconds()))
+
+        self.assertEqual(delays[:2], [10, 15])
+        self.assertEqual((queued.status, queued.attempts), ('failed', 3))
+        self.assertIn('mail server down', queued.last_error)
+        self.assertEqual(claim_jobs('worker'), [])
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_jobs_of_a_dead_worker_are_requeued(self):
+        """
+        Ensure a job left running past the lock timeout is put back in the queue.
+        """
+        enqueue('test_record', value='orphan')
+        claimed, = claim_jobs('crashed-worker')
+        self.assertEqual(requeue_stale_jobs(), 0)
+
+        Job.objects.filter(pk=claimed.pk).update(locked_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(requeue_stale_jobs(), 1)
+        retried, = claim_jobs('worker')
+        self.assertEqual(retried.attempts, 2)
+
+    @override_settings(JOB_LOCK_TIMEOUT=60)
+    def test_stale_jobs_out_of_attempts_are_failed_not_requeued(self):
+        """
+        Ensure a job whose worker dies on every attempt ends up failed instead of being requeued forever.
+        """
+        enqueue('test_record', value='poison')
+        Job.objects.update(max_attempts=2)
+        for attempt in (1, 2):
+            claimed, = claim_jobs('crashing-worker')
+            Job.objects.filter(pk=claimed.pk).update(locked_at=timezone.now() - timedelta(minutes=2))
+            self.assertEqual(requeue_stale_jobs(), 1 if attempt == 1 else 0)
+
+        job = Job.objects.get(pk=claimed.pk)
+        self.assertEqual((job.status, job.attempts, job.locked_by), ('failed', 2, ''))
+        self.assertEqual(claim_jobs('worker'), [])
+
+
+class ArchiveTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='archive@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        self.doctor = Doctor.objects.create(name='Dr. Past', specialty='History')
+        today = timezone.localdate()
+        self.old_day = today - timedelta(days=200)
+        self.old = [
+            Schedule.objects.create(doctor=self.doctor, date=self.old_day, start_time=time(hour), end_time=time(hour, 30))
+            for hour in range(9, 14)
+        ]
+        self.recent = Schedule.objects.create(doctor=self.doctor, date=today - timedelta(days=1), start_time=time(9), end_time=time(9, 30))
+        self.attended = book_schedule(self.patient, self.old[0])
+        cancelled = book_schedule(self.patient, self.old[1])
+        cancel_appointment(cancelled)
+        self.entry = WaitlistEntry.objects.create(
+            patient=self.patient, doctor=self.doctor, date=self.old_day, status='assigned', appointment=self.attended
+        )
+        self.recent_appointment = book_schedule(self.patient, self.recent)
+        # An expired hold the sweeper never got to.
+        self.leftover_hold = hold_schedule(self.patient, self.old[4])
+        SlotHold.objects.filter(pk=self.leftover_hold.pk).update(expires_at=timezone.now() - timedelta(days=199))
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_past_schedules_move_to_the_archive_in_batches(self):
+        """
+        Ensure slots older than ARCHIVE_AFTER_DAYS leave the live tables in bounded batches, appointments with them.
+        """
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('archive_past_schedules', '--days', '90', '--batch-size', '2', stdout=out)
+
+        self.assertIn('Archived 2 appointments, deleted 5 schedules', out.getvalue())
+        self.assertEqual(list(Schedule.objects.all()), [self.recent])
+        self.assertEqual(list(Appointment.objects.all()), [self.recent_appointment])
+        archived = ArchivedAppointment.objects.get(pk=self.attended.pk)
+        self.assertEqual((archived.doctor, archived.date, archived.start_time, archived.status), (self.doctor, self.old_day, time(9), 'booked'))
+        self.assertEqual(archived.created_at, self.attended.created_at)
+        self.entry.refresh_from_db()
+        self.assertIsNone(self.entry.appointment)
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_a_batch_moves_at_most_its_limit(self):
+        """
+        Ensure one batch touches no more schedules than asked, oldest first.
+        """
+        self.assertEqual(archive_schedules(self.old_day, 10), (0, 0))
+        self.assertEqual(archive_schedules(self.old_day + timedelta(days=1), 1), (1, 1))
+        self.assertEqual(ArchivedAppointment.objects.get().pk, self.attended.pk)
+        self.assertEqual(Schedule.objects.filter(date=self.old_day).count(), 4)
+
+    def test_patients_can_read_their_archived_appointments(self):
+        """
+        Ensure the appointment history lists only the patient's own archived appointments, newest first.
+        """
+        other = Patient.objects.create(email='other.archive@example.com')
+        book_schedule(other, self.old[2])
+        archive_schedules(self.old_day + timedelta(days=1), 100)
+
+        response = self.client.get(reverse('appointment-history'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.attended.pk + 1, self.attended.pk])
+        self.assertEqual(response.data['results'][1]['start_time'], '09:00:00')
+        self.assertEqual(response.data['results'][1]['doctor'], self.doctor.pk)
+
+
+class KeysetPaginationTest(APITestCase):
+    def setUp(self):
+        self.doctor = Doctor.objects.create(name='Dr. Page', specialty='Pagination')
+        self.schedules = [
+            Schedule.objects.create(doctor=self.doctor, date=day, start_time=start, end_time='18:00')
+            for day in ('2099-01-02', '2099-01-01')
+            for start in ('11:00', '09:00', '10:00')
+        ]
+
+    def test_schedules_are_paged_in_date_and_start_time_order(self):
+        """
+        Ensure following `next` links walks every schedule once, ordered by (date, start_time, id).
+        """
+        url = f"{reverse('schedule-list')}?doctor_id={self.doctor.pk}&page_size=4"
+        seen = []
+        while url:
+            response = self.client.get(url, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend((item['date'], item['start_time']) for item in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(len(seen), len(self.schedules))
+        self.assertEqual(seen, sorted(seen))
+
+    def test_unpaginated_list_is_available_to_old_clients(self):
+        """
+        Ensure `?paginate=false` returns the plain list shape.
+        """
+        url = f"{reverse('schedule-list')}?doctor_id={self.doctor.pk}&paginate=false"
+        response = self.client.get(url, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), len(self.schedules))
+
+    def test_invalid_cursor_is_rejected(self):
+        """
+        Ensure a tampered cursor returns 404 rather than a server error.
+        """
+        url = f"{reverse('schedule-list')}?cursor=not-a-cursor"
+        response = self.client.get(url, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are only checked against PostgreSQL.')
+class QueryPlanRegressionTest(APITestCase):
+    """
+    Runs every endpoint query against a seeded table and fails if Postgres plans
+    a sequential scan over one of the large tables, so a dropped or unused
+    index shows up here rather than in production latency.
+    """
+    LARGE_TABLES = ('api_doctor', 'api_schedule', 'api_appointment', 'api_waitlistentry', 'api_slothold')
+
+    @classmethod
+    def setUpTestData(cls):
+        start = date.today() + timedelta(days=1)
+        doctors = Doctor.objects.bulk_create(
+            Doctor(name=f'Dr. Plan {i}', specialty='Planning', department='QA') for i in range(2000)
+        )
+        Schedule.objects.bulk_create(
+            (
+                Schedule(
+                    doctor=doctor,
+                    date=start + timedelta(days=day),
+                    start_time=time(9 + slot),
+                    end_time=time(10 + slot),
+                    is_available=(day + slot) % 3 != 0,
+                )
+                for doctor in doctors
+                for day in range(10)
+                for slot in range(4)
+            ),
+            batch_size=5000,
+        )
+        patients = Patient.objects.bulk_create(
+            Patient(email=f'plan{i}@example.com', password='!') for i in range(2000)
+        )
+        booked = Schedule.objects.filter(is_available=False).order_by('id')[:len(patients) * 5]
+        Appointment.objects.bulk_create(
+            (Appointment(patient=patients[i % len(patients)], schedule=schedule) for i, schedule in enumerate(booked)),
+            batch_size=5000,
+        )
+        cls.doctor = doctors[len(doctors) // 2]
+        cls.day = start + timedelta(days=3)
+        cls.token = Token.objects.create(user=patients[0])
+        # A waiter per doctor and day, and a long queue for the doctor under test.
+        WaitlistEntry.objects.bulk_create(
+            (
+                WaitlistEntry(patient=patients[i % len(patients)], doctor=doctor, date=start + timedelta(days=day))
+                for i, doctor in enumerate(doctors) if doctor != cls.doctor
+                for day in range(10)
+            ),
+            batch_size=5000,
+        )
+        WaitlistEntry.objects.bulk_create(WaitlistEntry(patient=patient, doctor=cls.doctor, date=cls.day) for patient in patients[1:])
+
+        with connection.cursor() as cursor:
+            for table in cls.LARGE_TABLES:
+                cursor.execute(f'ANALYZE {table}')
+
+    def assertNoSequentialScans(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertQueriesUseIndexes(context.captured_queries, url)
+
+    def assertQueriesUseIndexes(self, queries, label):
+        with connection.cursor() as cursor:
+            for query in queries:
+                if not query['sql'].lstrip().startswith(('SELECT', 'WITH')):
+                    continue
+                cursor.execute('EXPLAIN ' + query['sql'])
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                for table in self.LARGE_TABLES:
+                    self.assertNotIn(f'Seq Scan on {table}', plan, f'{label}\n{query["sql"]}\n{plan}')
+
+    def test_doctor_list_uses_an_index(self):
+        self.assertNoSequentialScans(reverse('doctor-list'))
+
+    def test_doctor_detail_uses_an_index(self):
+        self.assertNoSequentialScans(reverse('doctor-detail', kwargs={'pk': self.doctor.pk}))
+
+    def test_schedule_list_for_doctor_and_date_uses_an_index(self):
+        self.assertNoSequentialScans(f"{reverse('schedule-list')}?doctor_id={self.doctor.pk}&date={self.day}")
+
+    def test_open_schedules_for_doctor_use_an_index(self):
+        self.assertNoSequentialScans(f"{reverse('schedule-list')}?doctor_id={self.doctor.pk}")
+
+    def test_open_schedules_for_all_doctors_use_an_index(self):
+        self.assertNoSequentialScans(reverse('schedule-list'))
+
+    def test_schedules_for_a_date_use_an_index(self):
+        self.assertNoSequentialScans(f"{reverse('schedule-list')}?date={self.day}")
+
+    def test_doctor_calendar_uses_an_index(self):
+        end = self.day + timedelta(days=30)
+        self.assertNoSequentialScans(f"{reverse('schedule-calendar')}?doctor_id={self.doctor.pk}&start={self.day}&end={end}")
+
+    def test_appointment_list_uses_an_index(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.assertNoSequentialScans(reverse('appointment-list'))
+
+    def test_archiving_a_batch_uses_indexes(self):
+        expires_at = timezone.now() + timedelta(minutes=5)
+        SlotHold.objects.bulk_create(
+            (
+                SlotHold(patient=self.token.user, schedule=schedule, expires_at=expires_at)
+                for schedule in Schedule.objects.filter(is_available=True).order_by('id')[:20000]
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE api_slothold')
+
+        with CaptureQueriesContext(connection) as context:
+            archive_schedules(date.today() + timedelta(days=2), 1000)
+
+        self.assertEqual(Schedule.objects.filter(date__lt=date.today() + timedelta(days=2)).count(), 7000)
+        self.assertQueriesUseIndexes(context.captured_queries, 'archive batch')
+
+    def test_waitlist_assignment_uses_an_index(self):
+        schedule = Schedule.objects.filter(doctor=self.doctor, date=self.day, is_available=True).first()
+        appointment = book_schedule(self.token.user, schedule)
+        with CaptureQueriesContext(connection) as context:
+            self.assertTrue(cancel_appointment(appointment))
+
+        self.assertEqual(Appointment.objects.get(schedule=schedule, status='booked').patient.email, 'plan1@example.com')
+        self.assertQueriesUseIndexes(context.captured_queries, 'cancel with waitlist')
+
+    def test_hold_sweep_uses_the_expiry_index(self):
+        now = timezone.now()
+        schedules = Schedule.objects.filter(is_available=True).order_by('id')[:20000]
+        SlotHold.objects.bulk_create(
+            (
+                SlotHold(patient=self.token.user, schedule=schedule, expires_at=now + timedelta(seconds=i - 1000, milliseconds=1))
+                for i, schedule in enumerate(schedules)
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE api_slothold')
+
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(expire_holds(limit=400, now=now), 1000)
+
+        self.assertEqual(SlotHold.objects.count(), 19000)
+        self.assertQueriesUseIndexes(context.captured_queries, 'hold sweep')
+
+
+class ScheduleTemplateTest(APITestCase):
+    def setUp(self):
+        self.doctor = Doctor.objects.create(name='Dr. Template', specialty='Recurrence')
+        # 2099-01-05 is a Monday
+        self.template = ScheduleTemplate.objects.create(
+            doctor=self.doctor, start_time=time(9), end_time=time(12), slot_minutes=15, valid_from=date(2099, 1, 5)
+        )
+
+    def test_template_materializes_weekday_slots(self):
+        """
+        Ensure Mon-Fri 09:00-12:00 in 15-minute slots yields 12 slots on each weekday and none at weekends.
+        """
+        generated = materialize_templates([self.template], date(2099, 1, 5), weeks=2)
+
+        self.assertEqual(generated, 2 * 5 * 12)
+        self.assertEqual(Schedule.objects.filter(doctor=self.doctor).count(), 2 * 5 * 12)
+        self.assertFalse(Schedule.objects.filter(doctor=self.doctor, date__in=[date(2099, 1, 10), date(2099, 1, 11)]).exists())
+        first = Schedule.objects.filter(doctor=self.doctor).order_by('date', 'start_time').first()
+        self.assertEqual((first.start_time, first.end_time), (time(9, 0), time(9, 15)))
+
+    def test_materializing_again_keeps_existing_slots(self):
+        """
+        Ensure re-running over an overlapping range neither duplicates slots nor frees booked ones.
+        """
+        materialize_templates([self.template], date(2099, 1, 5), weeks=1)
+        booked = Schedule.objects.filter(doctor=self.doctor).first()
+        booked.is_available = False
+        booked.save()
+
+        materialize_templates([self.template], date(2099, 1, 5), weeks=2)
+
+        self.assertEqual(Schedule.objects.filter(doctor=self.doctor).count(), 2 * 5 * 12)
+        booked.refresh_from_db()
+        self.assertFalse(booked.is_available)
+
+    def test_slots_are_inserted_in_batches(self):
+        """
+        Ensure generation issues one INSERT per batch rather than one per slot.
+        """
+        with self.assertNumQueries(3):
+            materialize_templates([self.template], date(2099, 1, 5), weeks=2, batch_size=50)
+
+    def test_zero_length_slots_and_sessions_are_rejected(self):
+        """
+        Ensure templates that would never finish generating slots cannot be saved.
+        """
+        for fields in ({'slot_minutes': 0}, {'end_time': time(9)}, {'end_time': time(8)}):
+            with self.subTest(**fields), self.assertRaises(IntegrityError), transaction.atomic():
+                ScheduleTemplate.objects.create(
+                    doctor=self.doctor, **{'start_time': time(9), 'end_time': time(12), 'valid_from': date(2099, 1, 5), **fields}
+                )
+
+    def test_weekdays_must_be_weekday_numbers(self):
+        """
+        Ensure validation refuses weekdays that are not a list of integers from 0 to 6.
+        """
+        for weekdays in ('0,1,2', {'0': True}, [7], [-1], ['1'], [True], None):
+            self.template.weekdays = weekdays
+            with self.subTest(weekdays=weekdays), self.assertRaises(ValidationError) as context:
+                self.template.full_clean()
+            self.assertIn('weekdays', context.exception.message_dict)
+        self.template.weekdays = [0, 6]
+        self.template.full_clean()
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+    def setUp(self):
+        token_cache.clear()
+        self.patient = Patient.objects.create(email='cached@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.url = reverse('appointment-list')
+
+    def test_repeat_requests_skip_the_token_lookup(self):
+        """
+        Ensure only the first request with a token queries the Token table.
+        """
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as second:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(second), len(first) - 1)
+        self.assertGreaterEqual(token_cache.stats()['hits'], 1)
+
+    def test_deleted_token_is_rejected(self):
+        """
+        Ensure deleting a token evicts it from the cache straight away.
+        """
+        self.client.get(self.url)
+        self.token.delete()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_patient_is_rejected(self):
+        """
+        Ensure deactivating a patient evicts their cached tokens.
+        """
+        self.client.get(self.url)
+        self.patient.is_active = False
+        self.patient.save()
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_cache_is_bounded_and_expires_entries(self):
+        """
+        Ensure the least recently used entry is evicted at capacity and entries expire after the TTL.
+        """
+        now = [0.0]
+        cache = TokenCache(max_size=2, ttl=10, clock=lambda: now[0])
+        cache.set('a', self.patient, None)
+        cache.set('b', self.patient, None)
+        cache.get('a')
+        cache.set('c', self.patient, None)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        now[0] = 11
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+
+    def test_staff_can_read_the_cache_counters(self):
+        """
+        Ensure the hit, miss and eviction counters are served to staff only.
+        """
+        self.client.get(self.url)
+        response = self.client.get(reverse('token-cache-metrics'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.patient.is_staff = True
+        self.patient.save()
+        response = self.client.get(reverse('token-cache-metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertLessEqual({'hits', 'misses', 'evictions', 'hit_ratio'}, set(response.data['token_cache']))
+        self.assertGreaterEqual(response.data['token_cache']['misses'], 1)
+
+
+class PasswordHashingPoolTest(APITestCase):
+    def test_registered_patient_can_log_in(self):
+        """
+        Ensure the password hashed by the pool at registration verifies at login.
+        """
+        credentials = {'email': 'pooled@example.com', 'password': 'someStrongPassword123'}
+        response = self.client.post(reverse('register'), credentials, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(Patient.objects.get(email='pooled@example.com').check_password(credentials['password']))
+
+        response = self.client.post(reverse('login'), credentials, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['token'], Token.objects.get(user__email='pooled@example.com').key)
+
+    def test_wrong_password_is_rejected(self):
+        """
+        Ensure a wrong password is a 400 with the usual error message.
+        """
+        patient = Patient.objects.create(email='wrong.password@example.com')
+        patient.set_password('someStrongPassword123')
+        patient.save()
+
+        response = self.client.post(reverse('login'), {'email': patient.email, 'password': 'nope'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'non_field_errors': ['Unable to log in with provided credentials.']})
+
+    def test_saturated_pool_rejects_with_503(self):
+        """
+        Ensure logins are turned away immediately once every worker and queue slot is taken.
+        """
+        saturated = HashingPool(workers=1, queue_size=0)
+        release = threading.Event()
+        saturated.submit(release.wait)
+        try:
+            with mock.patch('api.passwords.pool', saturated):
+                response = self.client.post(
+                    reverse('login'), {'email': 'busy@example.com', 'password': 'whatever'}, format='json'
+                )
+        finally:
+            release.set()
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+class PerformanceInstrumentationTest(APITestCase):
+    def setUp(self):
+        doctor = Doctor.objects.create(name='Dr. Timing', specialty='Observability')
+        Schedule.objects.create(doctor=doctor, date='2099-01-01', start_time='09:00', end_time='09:30')
+
+    def test_response_carries_server_timing(self):
+        """
+        Ensure responses report total, database and serializer time along with the query count.
+        """
+        response = self.client.get(reverse('schedule-list'))
+
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        # The version counter lookup (api.versioning) and the listing itself.
+        self.assertIn('desc="2 queries"', timing)
+        self.assertIn('serialize;dur=', timing)
+
+    @override_settings(PERFORMANCE_QUERY_BUDGET=0)
+    def test_requests_over_the_query_budget_are_logged_as_warnings(self):
+        """
+        Ensure a request exceeding the query budget produces a structured warning.
+        """
+        with self.assertLogs('api.performance', level='WARNING') as logs:
+            self.client.get(reverse('doctor-list'))
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'doctor-list')
+        self.assertEqual(record['queries'], 2)
+        self.assertEqual(record['query_budget'], 0)
+
+
+@override_settings(ROOT_URLCONF='med_appointment.asgi_urls')
+class AsyncReadViewTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='async@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        self.doctor = Doctor.objects.create(name='Dr. Async', specialty='Concurrency')
+        self.schedules = [
+            Schedule.objects.create(doctor=self.doctor, date='2099-01-01', start_time=f'{hour:02d}:00', end_time=f'{hour:02d}:30')
+            for hour in range(9, 13)
+        ]
+        Appointment.objects.create(patient=self.patient, schedule=self.schedules[0])
+
+    async def test_async_views_match_the_sync_views(self):
+        """
+        Ensure the async read endpoints return exactly what the DRF views return.
+        """
+        headers = {'Authorization': 'Token ' + self.token.key}
+        for url in (
+            f"/api/doctors/?page_size=1",
+            f"/api/doctors/{self.doctor.pk}/",
+            f"/api/schedules/?doctor_id={self.doctor.pk}&page_size=2",
+            f"/api/schedules/?doctor_id={self.doctor.pk}&paginate=false",
+            "/api/appointments/",
+            "/api/appointments/?expand=schedule.doctor",
+        ):
+            async_response = await self.async_client.get(url, headers=headers)
+            with override_settings(ROOT_URLCONF='med_appointment.urls'):
+                sync_response = await self.async_client.get(url, headers=headers)
+
+            self.assertEqual(async_response.status_code, status.HTTP_200_OK, url)
+            self.assertEqual(async_response.content, sync_response.content, url)
+            self.assertEqual(async_response.get('ETag'), sync_response.get('ETag'), url)
+
+    async def test_async_appointment_list_requires_a_valid_token(self):
+        """
+        Ensure the async appointment list rejects anonymous and invalid-token requests.
+        """
+        response = await self.async_client.get('/api/appointments/')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+        response = await self.async_client.get('/api/appointments/', headers={'Authorization': 'Token nope'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_booking_is_delegated_to_the_sync_view(self):
+        """
+        Ensure POST on the async appointment route still books through the DRF view.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.post('/api/appointments/', {'schedule': self.schedules[1].pk}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['schedule'], self.schedules[1].pk)
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='etag@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor = Doctor.objects.create(name='Dr. Etag', specialty='Caching')
+            self.other_doctor = Doctor.objects.create(name='Dr. Other', specialty='Caching')
+            self.schedule = Schedule.objects.create(doctor=self.doctor, date='2099-01-01', start_time='09:00', end_time='09:30')
+            Schedule.objects.create(doctor=self.other_doctor, date='2099-01-01', start_time='09:00', end_time='09:30')
+        self.schedules_url = f"{reverse('schedule-list')}?doctor_id={self.doctor.pk}"
+
+    def revalidate(self, url, etag):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_listing_returns_304_without_querying_schedules(self):
+        """
+        Ensure a matching If-None-Match costs one counter lookup and never reads the Schedule table.
+        """
+        response = self.client.get(self.schedules_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Last-Modified', response)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        with CaptureQueriesContext(connection) as context:
+            revalidated = self.revalidate(self.schedules_url, response['ETag'])
+
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertNotIn('api_schedule', context.captured_queries[0]['sql'])
+
+    def test_if_modified_since_is_honoured(self):
+        """
+        Ensure clients that only send If-Modified-Since also get a 304.
+        """
+        response = self.client.get(reverse('doctor-detail', kwargs={'pk': self.doctor.pk}))
+        revalidated = self.client.get(
+            reverse('doctor-detail', kwargs={'pk': self.doctor.pk}), HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_booking_and_cancelling_change_the_doctors_etags_only(self):
+        """
+        Ensure a booking invalidates that doctor's schedules but not other doctors or the roster.
+        """
+        other_url = f"{reverse('schedule-list')}?doctor_id={self.other_doctor.pk}"
+        etags = {url: self.client.get(url)['ETag'] for url in (self.schedules_url, other_url, reverse('doctor-list'))}
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('appointment-list'), {'schedule': self.schedule.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(self.revalidate(self.schedules_url, etags[self.schedules_url]).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.revalidate(other_url, etags[other_url]).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(self.revalidate(reverse('doctor-list'), etags[reverse('doctor-list')]).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        booked_etag = self.client.get(self.schedules_url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(reverse('appointment-cancel', kwargs={'pk': response.data['id']}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.revalidate(self.schedules_url, booked_etag).status_code, status.HTTP_200_OK)
+
+    def test_admin_style_writes_change_the_etag(self):
+        """
+        Ensure plain model saves (e.g. from the admin) bump the counters through signals.
+        """
+        url = reverse('doctor-list')
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.name = 'Dr. Renamed'
+            self.doctor.save()
+        self.assertEqual(self.revalidate(url, etag).status_code, status.HTTP_200_OK)
+
+    def test_etag_depends_on_media_type(self):
+        """
+        Ensure the browsable API and JSON representations never share an ETag.
+        """
+        url = reverse('doctor-list')
+        json_etag = self.client.get(url, HTTP_ACCEPT='application/json')['ETag']
+        html_etag = self.client.get(url, HTTP_ACCEPT='text/html')['ETag']
+        self.assertNotEqual(json_etag, html_etag)
+
+
+class CachedListingTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='cache@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor = Doctor.objects.create(name='Dr. Cache', specialty='Caching')
+            self.other_doctor = Doctor.objects.create(name='Dr. Elsewhere', specialty='Caching')
+            self.schedule = Schedule.objects.create(doctor=self.doctor, date='2099-01-01', start_time='09:00', end_time='09:30')
+            Schedule.objects.create(doctor=self.other_doctor, date='2099-01-01', start_time='09:00', end_time='09:30')
+
+    def schedules_url(self, doctor):
+        return f"{reverse('schedule-list')}?doctor_id={doctor.pk}&date=2099-01-01&paginate=false"
+
+    def test_repeated_listing_is_served_from_the_cache(self):
+        """
+        Ensure a second anonymous read costs only the version lookup and returns the same payload.
+        """
+        first = self.client.get(reverse('doctor-list'))
+        with CaptureQueriesContext(connection) as context:
+            second = self.client.get(reverse('doctor-list'))
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('api_resourceversion', context.captured_queries[0]['sql'])
+
+    @override_settings(ALLOWED_HOSTS=['internal.example', 'public.example'])
+    def test_cached_next_links_keep_the_host_and_scheme_of_the_request(self):
+        """
+        Ensure clients reaching the API under different host names or schemes never get each other's next links.
+        """
+        url = f"{reverse('doctor-list')}?page_size=1"
+        for host, secure in (('internal.example', False), ('public.example', True), ('public.example', False)):
+            for _ in range(2):  # the second read is served from the cache
+                response = self.client.get(url, HTTP_HOST=host, secure=secure)
+                self.assertTrue(response.json()['next'].startswith(f"{'https' if secure else 'http'}://{host}/"), response.json())
+
+    def test_booking_and_cancelling_invalidate_that_doctors_schedules_only(self):
+        """
+        Ensure a booking or cancellation is visible at once, while other doctors stay cached.
+        """
+        self.assertTrue(self.client.get(self.schedules_url(self.doctor)).json()[0]['is_available'])
+        self.client.get(self.schedules_url(self.other_doctor))
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        with self.captureOnCommitCallbacks(execute=True):
+            booked = self.client.post(reverse('appointment-list'), {'schedule': self.schedule.pk}, format='json')
+        self.assertFalse(self.client.get(self.schedules_url(self.doctor)).json()[0]['is_available'])
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.schedules_url(self.other_doctor))
+        self.assertEqual(len(context.captured_queries), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('appointment-cancel', kwargs={'pk': booked.data['id']}))
+        self.assertTrue(self.client.get(self.schedules_url(self.doctor)).json()[0]['is_available'])
+
+    def test_admin_style_writes_invalidate_the_roster(self):
+        """
+        Ensure plain model saves (e.g. from the admin) reach the cached roster through signals.
+        """
+        url = f"{reverse('doctor-list')}?paginate=false"
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.doctor.name = 'Dr. Renamed'
+            self.doctor.save()
+        self.assertIn('Dr. Renamed', [doctor['name'] for doctor in self.client.get(url).json()])
+
+    def test_concurrent_misses_compute_once(self):
+        """
+        Ensure requests missing the same key wait for one recompute instead of each running it.
+        """
+        key = 'payload:test:single-flight'
+        self.addCleanup(caches[API_CACHE].delete, key)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            threading.Event().wait(0.2)
+            return ['payload']
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_or_compute(key, compute))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [['payload']] * 5)
+
+
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='retry@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.doctor = Doctor.objects.create(name='Dr. Retry', specialty='Networks')
+        self.schedule = Schedule.objects.create(doctor=self.doctor, date='2099-03-01', start_time='09:00', end_time='09:30')
+        self.other_schedule = Schedule.objects.create(doctor=self.doctor, date='2099-03-01', start_time='09:30', end_time='10:00')
+
+    def book(self, schedule, key='booking-1'):
+        return self.client.post(reverse('appointment-list'), {'schedule': schedule.pk}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_booking_is_replayed_with_one_lookup(self):
+        """
+        Ensure a retry gets the first response back instead of a 409, without booking twice.
+        """
+        first = self.book(self.schedule)
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as context:
+            retry = self.book(self.schedule)
+
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('api_idempotencykey', context.captured_queries[0]['sql'])
+        self.assertEqual(Appointment.objects.filter(patient=self.patient).count(), 1)
+
+    def test_retried_cancellation_is_replayed(self):
+        """
+        Ensure a retried cancel answers 204 again rather than "cannot be cancelled".
+        """
+        appointment = Appointment.objects.create(patient=self.patient, schedule=self.schedule)
+        url = reverse('appointment-cancel', kwargs={'pk': appointment.pk})
+        self.assertEqual(self.client.patch(url, HTTP_IDEMPOTENCY_KEY='cancel-1').status_code, status.HTTP_204_NO_CONTENT)
+
+        retry = self.client.patch(url, HTTP_IDEMPOTENCY_KEY='cancel-1')
+        self.assertEqual(retry.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertEqual(self.client.patch(url).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_key_reused_for_a_different_request_is_refused(self):
+        """
+        Ensure a key can't replay one booking's response for another schedule.
+        """
+        self.book(self.schedule)
+        response = self.book(self.other_schedule)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertTrue(Schedule.objects.get(pk=self.other_schedule.pk).is_available)
+
+    def test_keys_are_scoped_to_the_patient(self):
+        """
+        Ensure another patient's identical key runs its own request.
+        """
+        self.book(self.schedule)
+        other = Patient.objects.create(email='other-retry@example.com')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=other).key)
+        response = self.book(self.schedule)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn(REPLAYED_HEADER, response)
+
+    def test_duplicate_that_waited_replays_the_first_response(self):
+        """
+        Ensure a request whose key insert waited for a concurrent first request
+        replays that request's stored response rather than running again.
+        """
+        first = self.book(self.schedule)
+        # Misses the initial lookup, as if the first request had not committed yet.
+        with mock.patch('api.idempotency.lookup', return_value=None):
+            retry = self.book(self.schedule)
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Appointment.objects.filter(patient=self.patient).count(), 1)
+
+    def test_expired_keys_are_purged(self):
+        """
+        Ensure purge_idempotency_keys removes only keys past their TTL.
+        """
+        self.book(self.schedule)
+        self.book(self.other_schedule, key='booking-2')
+        IdempotencyKey.objects.filter(key='booking-1').update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        call_command('purge_idempotency_keys', stdout=StringIO())
+
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['booking-2'])
+
+
+class SlotHoldTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='holder@example.com')
+        self.other = Patient.objects.create(email='latecomer@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        self.other_token = Token.objects.create(user=self.other)
+        self.doctor = Doctor.objects.create(name='Dr. Hold', specialty='Waiting')
+        self.schedule = Schedule.objects.create(doctor=self.doctor, date='2099-04-01', start_time='09:00', end_time='09:30')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def hold(self):
+        response = self.client.post(reverse('hold-create'), {'schedule': self.schedule.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data['id']
+
+    def listed(self):
+        return [slot['id'] for slot in self.client.get(f"{reverse('schedule-list')}?doctor_id={self.doctor.pk}&paginate=false").json()]
+
+    def test_held_slot_is_hidden_and_cannot_be_taken(self):
+        """
+        Ensure a held slot leaves the schedule list and other patients can neither book nor hold it.
+        """
+        self.hold()
+        self.assertEqual(self.listed(), [])
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.other_token.key)
+        booking = self.client.post(reverse('appointment-list'), {'schedule': self.schedule.pk}, format='json')
+        hold = self.client.post(reverse('hold-create'), {'schedule': self.schedule.pk}, format='json')
+        self.assertEqual(booking.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(hold.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_confirming_a_hold_books_the_slot(self):
+        """
+        Ensure confirming turns the hold into an appointment for the holder.
+        """
+        hold_id = self.hold()
+        response = self.client.post(reverse('hold-confirm', kwargs={'pk': hold_id}))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        appointment = Appointment.objects.get(pk=response.data['id'])
+        self.assertEqual((appointment.patient, appointment.schedule, appointment.status), (self.patient, self.schedule, 'booked'))
+        self.assertFalse(SlotHold.objects.exists())
+        self.assertFalse(Schedule.objects.get(pk=self.schedule.pk).is_available)
+
+    def test_only_the_holder_can_confirm(self):
+        hold_id = self.hold()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.other_token.key)
+        response = self.client.post(reverse('hold-confirm', kwargs={'pk': hold_id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expired_hold_cannot_be_confirmed_and_is_swept(self):
+        """
+        Ensure an expired hold is refused at confirm, and the sweep puts its slot back on the list.
+        """
+        hold_id = self.hold()
+        live = Schedule.objects.create(doctor=self.doctor, date='2099-04-01', start_time='10:00', end_time='10:30')
+        self.client.post(reverse('hold-create'), {'schedule': live.pk}, format='json')
+        SlotHold.objects.filter(pk=hold_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.client.post(reverse('hold-confirm', kwargs={'pk': hold_id}))
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        self.assertEqual(expire_holds(), 1)
+        self.assertEqual(self.listed(), [self.schedule.pk])
+        self.assertEqual(list(SlotHold.objects.values_list('schedule', flat=True)), [live.pk])
+
+    def test_releasing_a_hold_reopens_the_slot(self):
+        hold_id = self.hold()
+        response = self.client.delete(reverse('hold-release', kwargs={'pk': hold_id}))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.listed(), [self.schedule.pk])
+        self.assertEqual(self.client.delete(reverse('hold-release', kwargs={'pk': hold_id})).status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(SLOT_HOLD_MAX_PER_PATIENT=2)
+    def test_a_patient_holds_a_limited_number_of_slots(self):
+        """
+        Ensure holds beyond the per-patient limit are refused, and expired holds no longer count towards it.
+        """
+        schedules = [
+            Schedule.objects.create(doctor=self.doctor, date='2099-04-02', start_time=time(hour), end_time=time(hour, 30))
+            for hour in (9, 10, 11)
+        ]
+        for schedule in schedules[:2]:
+            hold_schedule(self.patient, schedule)
+
+        response = self.client.post(reverse('hold-create'), {'schedule': schedules[2].pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['detail'].code, 'hold_limit_reached')
+        self.assertTrue(Schedule.objects.get(pk=schedules[2].pk).is_available)
+
+        SlotHold.objects.filter(schedule=schedules[0]).update(expires_at=timezone.now())
+        response = self.client.post(reverse('hold-create'), {'schedule': schedules[2].pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_expired_and_released_holds_go_to_the_waitlist_first(self):
+        """
+        Ensure a slot given back by a hold is booked for the first waiter, never for its holder, like a cancellation.
+        """
+        WaitlistEntry.objects.create(patient=self.patient, doctor=self.doctor, date=date(2099, 4, 1))
+        WaitlistEntry.objects.create(patient=self.other, doctor=self.doctor, date=date(2099, 4, 1))
+        second = Schedule.objects.create(doctor=self.doctor, date='2099-04-01', start_time='10:00', end_time='10:30')
+        expiring = hold_schedule(self.patient, self.schedule)
+        released = hold_schedule(self.patient, second)
+
+        SlotHold.objects.filter(pk=expiring.pk).update(expires_at=timezone.now())
+        self.assertEqual(expire_holds(), 1)
+        self.assertEqual(Appointment.objects.get(schedule=self.schedule).patient, self.other)
+        self.assertEqual(WaitlistEntry.objects.get(patient=self.patient).status, 'waiting')
+
+        self.assertTrue(release_hold(released))
+        self.assertFalse(Appointment.objects.filter(schedule=second).exists())
+        self.assertEqual(self.listed(), [second.pk])
+
+
+@override_settings(SCHEDULE_STORAGE='grid')
+class SlotGridStorageTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='grid@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        self.doctor = Doctor.objects.create(name='Dr. Grid', specialty='Bitmaps')
+        self.other_doctor = Doctor.objects.create(name='Dr. Offset', specialty='Bitmaps')
+        # 2099-01-05 is a Monday: a week of 09:00-10:00 in 15-minute slots, and 09:10-10:10 in 20-minute slots.
+        templates = [
+            ScheduleTemplate.objects.create(
+                doctor=self.doctor, weekdays=list(range(7)), start_time=time(9), end_time=time(10), slot_minutes=15, valid_from=date(2099, 1, 5)
+            ),
+            ScheduleTemplate.objects.create(
+                doctor=self.other_doctor, weekdays=[0], start_time=time(9, 10), end_time=time(10, 10), slot_minutes=20, valid_from=date(2099, 1, 5)
+            ),
+        ]
+        self.generated = materialize_templates(templates, date(2099, 1, 5), weeks=1)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def list_slots(self, **params):
+        response = self.client.get(reverse('schedule-list'), {'paginate': 'false', **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_templates_materialize_one_grid_per_day(self):
+        """
+        Ensure each template day becomes a single row holding all of its slots.
+        """
+        self.assertEqual(self.generated, 7 * 4 + 3)
+        self.assertEqual(SlotGrid.objects.count(), 7 + 1)
+        self.assertFalse(Schedule.objects.exists())
+
+    def test_listing_merges_grids_in_schedule_order(self):
+        """
+        Ensure grid slots list like schedule rows, interleaving doctors by start time.
+        """
+        slots = self.list_slots(date='2099-01-05')
+
+        self.assertEqual(
+            [(slot['doctor'], slot['start_time']) for slot in slots],
+            [
+                (self.doctor.pk, '09:00:00'), (self.other_doctor.pk, '09:10:00'), (self.doctor.pk, '09:15:00'),
+                (self.doctor.pk, '09:30:00'), (self.other_doctor.pk, '09:30:00'), (self.doctor.pk, '09:45:00'),
+                (self.other_doctor.pk, '09:50:00'),
+            ],
+        )
+        self.assertEqual(slots[0], {
+            'id': slots[0]['id'], 'doctor': self.doctor.pk, 'date': '2099-01-05',
+            'start_time': '09:00:00', 'end_time': '09:15:00', 'is_available': True,
+        })
+
+    def test_cursor_pages_cover_every_slot_once(self):
+        """
+        Ensure walking the cursor returns every open slot exactly once, in order.
+        """
+        seen = []
+        url = f"{reverse('schedule-list')}?page_size=5"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(len(seen), self.generated)
+        self.assertEqual(len({slot['id'] for slot in seen}), self.generated)
+        keys = [(slot['date'], slot['start_time']) for slot in seen]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_booking_and_cancelling_a_grid_slot(self):
+        """
+        Ensure a slot reference books like a schedule id, hides the slot, and is freed again by cancelling.
+        """
+        slot = self.list_slots(doctor_id=self.doctor.pk, date='2099-01-06')[1]
+
+        response = self.client.post(reverse('appointment-list'), {'schedule': slot['id']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        appointment = Appointment.objects.get(pk=response.data['id'])
+        self.assertEqual((appointment.schedule.start_time, appointment.schedule.is_available), (time(9, 15), False))
+
+        self.assertFalse(self.list_slots(doctor_id=self.doctor.pk, date='2099-01-06')[1]['is_available'])
+        self.assertNotIn(slot['id'], [item['id'] for item in self.list_slots(doctor_id=self.doctor.pk)])
+        response = self.client.post(reverse('appointment-list'), {'schedule': slot['id']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.patch(reverse('appointment-cancel', kwargs={'pk': appointment.pk}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertTrue(self.list_slots(doctor_id=self.doctor.pk, date='2099-01-06')[1]['is_available'])
+
+        # Booking the freed slot again reuses its Schedule row.
+        response = self.client.post(reverse('appointment-list'), {'schedule': slot['id']}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Schedule.objects.count(), 1)
+
+    def test_losing_a_race_for_a_grid_slot_raises_conflict(self):
+        """
+        Ensure the bit is claimed atomically: a stale view of a free slot cannot book it twice.
+        """
+        ref = self.list_slots(doctor_id=self.doctor.pk, date='2099-01-05')[0]['id']
+        stale = get_slot(ref)
+        book_schedule(self.patient, get_slot(ref))
+
+        with self.assertRaises(SlotUnavailable):
+            book_schedule(Patient.objects.create(email='late@example.com'), stale)
+        self.assertEqual(SlotGrid.objects.get(pk=stale.grid_id).free_slots, 3)
+
+    def test_booking_by_schedule_id_takes_the_grid_slot_too(self):
+        """
+        Ensure a slot booked through its Schedule row's id cannot be booked again through its reference.
+        """
+        ref = self.list_slots(doctor_id=self.doctor.pk, date='2099-01-08')[2]['id']
+        cancel_appointment(book_schedule(self.patient, get_slot(ref)))
+        schedule = Schedule.objects.get(doctor=self.doctor, date=date(2099, 1, 8), start_time=time(9, 30))
+        self.assertTrue(get_slot(ref).is_available)
+
+        response = self.client.post(reverse('appointment-list'), {'schedule': schedule.pk}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(get_slot(ref).is_available)
+        response = self.client.post(reverse('appointment-list'), {'schedule': ref}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('appointment-batch'), {'schedules': [ref]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(Appointment.objects.filter(schedule=schedule, status='booked').count(), 1)
+
+    def test_grid_claim_does_not_take_over_a_booked_row(self):
+        """
+        Ensure a set bit alone does not book a slot whose Schedule row is taken, and the refused claim keeps the bit.
+        """
+        ref = self.list_slots(doctor_id=self.doctor.pk, date='2099-01-08')[0]['id']
+        appointment = book_schedule(self.patient, get_slot(ref))
+        release_slot(appointment.schedule)  # bit set, row still booked
+
+        # A hold creates no appointment, so the booked-appointment constraint would not catch it.
+        with self.assertRaises(SlotUnavailable):
+            hold_schedule(Patient.objects.create(email='second@example.com'), get_slot(ref))
+        self.assertTrue(get_slot(ref).is_available)
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_batch_booking_and_cancelling_grid_slots(self):
+        """
+        Ensure slot references can be booked and cancelled in batches, and a taken one fails an all-or-nothing batch.
+        """
+        refs = [slot['id'] for slot in self.list_slots(doctor_id=self.doctor.pk, date='2099-01-07')]
+        book_schedule(Patient.objects.create(email='first@example.com'), get_slot(refs[0]))
+
+        response = self.client.post(reverse('appointment-batch'), {'schedules': refs[:3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(SlotGrid.objects.get(pk=get_slot(refs[1]).grid_id).free_slots, 3)
+
+        response = self.client.post(reverse('appointment-batch'), {'schedules': refs[1:3]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(SlotGrid.objects.get(pk=get_slot(refs[1]).grid_id).free_slots, 1)
+
+        appointments = [item['appointment']['id'] for item in response.data['results']]
+        response = self.client.post(reverse('appointment-batch-cancel'), {'appointments': appointments}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(SlotGrid.objects.get(pk=get_slot(refs[1]).grid_id).free_slots, 3)
+
+    def test_unknown_slot_reference_is_rejected(self):
+        """
+        Ensure a reference to a missing grid is a validation error, not a server error.
+        """
+        response = self.client.post(reverse('appointment-list'), {'schedule': '999999:0'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_calendar_counts_grid_slots(self):
+        """
+        Ensure the availability calendar aggregates the grids' free counts.
+        """
+        ref = self.list_slots(doctor_id=self.other_doctor.pk, date='2099-01-05')[0]['id']
+        book_schedule(self.patient, get_slot(ref))
+        response = self.client.get(reverse('schedule-calendar'), {'specialty': 'Bitmaps', 'start': '2099-01-05', 'end': '2099-01-06'})
+
+        self.assertEqual(response.data, [
+            {'date': '2099-01-05', 'free': 6, 'booked': 1},
+            {'date': '2099-01-06', 'free': 4, 'booked': 0},
+        ])
+
+    def test_held_grid_slot_is_hidden_until_swept(self):
+        """
+        Ensure holds work on slot references, and the sweep sets the slot's bit again.
+        """
+        ref = self.list_slots(doctor_id=self.other_doctor.pk, date='2099-01-05')[0]['id']
+        response = self.client.post(reverse('hold-create'), {'schedule': ref}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(self.list_slots(doctor_id=self.other_doctor.pk, date='2099-01-05')[0]['is_available'])
+        self.assertNotIn(ref, [slot['id'] for slot in self.list_slots(doctor_id=self.other_doctor.pk)])
+
+        SlotHold.objects.update(expires_at=timezone.now())
+        self.assertEqual(expire_holds(), 1)
+        self.assertTrue(self.list_slots(doctor_id=self.other_doctor.pk, date='2099-01-05')[0]['is_available'])
+
+
+class FastReadPathTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='fast@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        # Names exercising JSON escaping: quotes, backslashes, control and line-separator characters, non-ASCII.
+        self.doctors = [
+            Doctor.objects.create(name=name, specialty='Rendering', department='QA')
+            for name in ('Plain', 'Chén 陳醫師', 'Quote " and \\ slash', 'Tab\tNew\nline', 'Sep\u2028arator\u2029', 'Emoji 🩺')
+        ]
+        for index, doctor in enumerate(self.doctors):
+            for hour in (9, 10):
+                Schedule.objects.create(doctor=doctor, date=date(2099, 2, 1 + index), start_time=time(hour, 5), end_time=time(hour, 35))
+        for schedule in Schedule.objects.order_by('id')[:3]:
+            book_schedule(self.patient, schedule)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def assertRendersLikeSerializer(self, url, serializer_class, queryset, ordering):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        page_size = len(response.data['results'])
+        instances = list(queryset.order_by(*ordering)[:page_size])
+        expected = JSONRenderer().render({
+            'next': response.data['next'],
+            'results': serializer_class(instances, many=True).data,
+        })
+        self.assertEqual(response.content, expected, url)
+
+    def test_list_endpoints_are_byte_identical_to_the_serializers(self):
+        """
+        Ensure the values_list() path renders exactly what the ModelSerializers and JSONRenderer did.
+        """
+        self.assertRendersLikeSerializer(f"{reverse('doctor-list')}?page_size=4", DoctorSerializer, Doctor.objects.all(), ['id'])
+        self.assertRendersLikeSerializer(
+            f"{reverse('schedule-list')}?date=2099-02-01", ScheduleSerializer, Schedule.objects.filter(date='2099-02-01'), ['date', 'start_time', 'id']
+        )
+        self.assertRendersLikeSerializer(
+            f"{reverse('schedule-list')}?page_size=5", ScheduleSerializer,
+            Schedule.objects.filter(is_available=True, date__gte=date.today()), ['date', 'start_time', 'id'],
+        )
+        self.assertRendersLikeSerializer(
+            reverse('appointment-list'), AppointmentSerializer, Appointment.objects.filter(patient=self.patient), ['-created_at', '-id']
+        )
+
+    def test_unpaginated_lists_use_the_fast_path_too(self):
+        """
+        Ensure `?paginate=false` renders the same bytes as the serializer over the same query.
+        """
+        response = self.client.get(f"{reverse('schedule-list')}?date=2099-02-02&paginate=false")
+        expected = JSONRenderer().render(ScheduleSerializer(Schedule.objects.filter(date='2099-02-02'), many=True).data)
+        self.assertEqual(response.content, expected)
+
+    def test_dumps_matches_json_renderer(self):
+        """
+        Ensure the orjson-backed encoder escapes exactly like DRF's JSONRenderer.
+        """
+        payload = {'text': 'a\u2028b\u2029c "q" \\ \x00 \x1f \x7f é 🩺', 'n': [1, -2, 2 ** 62, True, None], 'nested': {'k': []}}
+        self.assertEqual(dumps(payload), JSONRenderer().render(payload))
+
+    def test_indented_json_still_uses_the_regular_renderer(self):
+        """
+        Ensure clients asking for indented JSON still get it.
+        """
+        response = self.client.get(reverse('doctor-list'), HTTP_ACCEPT='application/json; indent=2')
+        self.assertIn(b'\n  ', response.content)
+
+    @skipUnless(fastpath.orjson is not None, 'orjson is not installed.')
+    def test_list_responses_are_encoded_with_orjson(self):
+        """
+        Ensure the default JSON settings send list responses through orjson, not the stdlib renderer.
+        """
+        with mock.patch.object(fastpath.orjson, 'dumps', wraps=fastpath.orjson.dumps) as encode:
+            response = self.client.get(reverse('schedule-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        encode.assert_called_once()
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+
+
+class AppointmentExpansionTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='expand@example.com')
+        self.token = Token.objects.create(user=self.patient)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def book(self, count):
+        for index in range(count):
+            doctor = Doctor.objects.create(name=f'Dr. Expand {index}', specialty='Nesting', department='QA')
+            schedule = Schedule.objects.create(doctor=doctor, date=date(2099, 3, 1), start_time=time(9), end_time=time(9, 30))
+            book_schedule(self.patient, schedule)
+
+    def count_list_queries(self, url):
+        self.client.get(url)  # warm the token cache
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_expand_inlines_schedule_and_doctor(self):
+        """
+        Ensure `?expand=schedule.doctor` renders what the nested serializers render over select_related().
+        """
+        self.book(3)
+        response = self.client.get(f"{reverse('appointment-list')}?expand=schedule.doctor")
+
+        appointment = response.json()['results'][0]
+        self.assertEqual(set(appointment['schedule']), {'id', 'doctor', 'date', 'start_time', 'end_time', 'is_available'})
+        self.assertEqual(appointment['schedule']['doctor']['name'], 'Dr. Expand 2')
+        instances = Appointment.objects.filter(patient=self.patient).select_related('schedule__doctor').order_by('-created_at', '-id')
+        expected = JSONRenderer().render({'next': None, 'results': AppointmentWithScheduleDoctorSerializer(instances, many=True).data})
+        self.assertEqual(response.content, expected)
+
+        response = self.client.get(f"{reverse('appointment-list')}?expand=schedule")
+        self.assertIsInstance(response.json()['results'][0]['schedule']['doctor'], int)
+
+    def test_expanded_list_query_count_does_not_grow_with_the_list(self):
+        """
+        Ensure the expanded list is read with the same number of queries for 2 and 40 appointments.
+        """
+        url = f"{reverse('appointment-list')}?expand=schedule.doctor&paginate=false"
+        self.book(2)
+        few = self.count_list_queries(url)
+        self.book(38)
+        many = self.count_list_queries(url)
+
+        self.assertEqual(few, many)
+        self.assertEqual(many, 1)
+
+    def test_unknown_expansion_is_rejected(self):
+        """
+        Ensure an unsupported `expand` value is a 400 naming the accepted ones.
+        """
+        response = self.client.get(f"{reverse('appointment-list')}?expand=patient")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('schedule.doctor', response.json()['expand'][0])
+
+    def test_booking_response_is_not_expanded(self):
+        """
+        Ensure POST still takes and returns the schedule as an id, even with `expand` in the URL.
+        """
+        doctor = Doctor.objects.create(name='Dr. Plain', specialty='Nesting')
+        schedule = Schedule.objects.create(doctor=doctor, date=date(2099, 3, 2), start_time=time(9), end_time=time(9, 30))
+        response = self.client.post(f"{reverse('appointment-list')}?expand=schedule.doctor", {'schedule': schedule.pk}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['schedule'], schedule.pk)
+
+def trigram_available():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+class DoctorSearchTest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        if not trigram_available():
+            raise SkipTest('Doctor search needs PostgreSQL with pg_trgm.')
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardiologist = Doctor.objects.create(name='Emily Carter', specialty='Cardiology', department='Internal Medicine')
+        cls.neurologist = Doctor.objects.create(name='Ben Adams', specialty='Neurology', department='Internal Medicine')
+        cls.surgeon = Doctor.objects.create(name='Carla Cardenas', specialty='Orthopedics', department='Surgery')
+
+    def search(self, query):
+        response = self.client.get(reverse('doctor-search'), {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.data['results']]
+
+    def test_prefix_matches_any_field(self):
+        """
+        Ensure a prefix of a name, specialty or department finds the doctor.
+        """
+        self.assertEqual(self.search('neuro'), [self.neurologist.pk])
+        self.assertEqual(self.search('surg'), [self.surgeon.pk])
+        self.assertEqual(set(self.search('internal')), {self.cardiologist.pk, self.neurologist.pk})
+
+    def test_misspelled_query_still_matches(self):
+        """
+        Ensure fuzzy matching tolerates a typo.
+        """
+        self.assertIn(self.cardiologist.pk, self.search('cardiolgy'))
+
+    def test_prefix_matches_rank_first(self):
+        """
+        Ensure a doctor whose field starts with the query ranks above weaker fuzzy matches.
+        """
+        self.assertEqual(self.search('Carla')[0], self.surgeon.pk)
+
+
+class ScheduleCalendarTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='calendar@example.com')
+        self.cardiologist = Doctor.objects.create(name='Dr. Month', specialty='Cardiology')
+        self.other_cardiologist = Doctor.objects.create(name='Dr. Week', specialty='Cardiology')
+        self.neurologist = Doctor.objects.create(name='Dr. Day', specialty='Neurology')
+        self.first_day = date(2030, 3, 1)
+        for doctor in (self.cardiologist, self.other_cardiologist, self.neurologist):
+            for hour in (9, 10, 11):
+                Schedule.objects.create(doctor=doctor, date=self.first_day, start_time=time(hour), end_time=time(hour, 30))
+        Schedule.objects.create(doctor=self.cardiologist, date=self.first_day + timedelta(days=2), start_time=time(9), end_time=time(9, 30))
+        book_schedule(self.patient, Schedule.objects.filter(doctor=self.cardiologist).first())
+        self.url = reverse('schedule-calendar')
+
+    def test_counts_free_and_booked_slots_per_day_in_one_query(self):
+        """
+        Ensure a doctor's calendar is one GROUP BY query and lists every day in the range.
+        """
+        params = {'doctor_id': self.cardiologist.pk, 'start': '2030-03-01', 'end': '2030-03-03'}
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, params)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'date': '2030-03-01', 'free': 2, 'booked': 1},
+            {'date': '2030-03-02', 'free': 0, 'booked': 0},
+            {'date': '2030-03-03', 'free': 1, 'booked': 0},
+        ])
+
+    def test_specialty_calendar_sums_its_doctors(self):
+        """
+        Ensure a specialty calendar counts the slots of every doctor in it, and only those.
+        """
+        response = self.client.get(self.url, {'specialty': 'Cardiology', 'start': '2030-03-01', 'end': '2030-03-01'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{'date': '2030-03-01', 'free': 5, 'booked': 1}])
+
+    def test_rejects_ambiguous_or_oversized_queries(self):
+        """
+        Ensure exactly one of doctor_id/specialty is required and the range is bounded.
+        """
+        both = {'doctor_id': self.cardiologist.pk, 'specialty': 'Cardiology', 'start': '2030-03-01', 'end': '2030-03-02'}
+        too_long = {'doctor_id': self.cardiologist.pk, 'start': '2030-01-01', 'end': '2030-12-31'}
+        backwards = {'doctor_id': self.cardiologist.pk, 'start': '2030-03-02', 'end': '2030-03-01'}
+
+        for params in (both, too_long, backwards, {'start': '2030-03-01', 'end': '2030-03-02'}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+@override_settings(ROOT_URLCONF='med_appointment.asgi_urls')
+class SlotEventTest(APITestCase):
+    def setUp(self):
+        self.patient = Patient.objects.create(email='events@example.com')
+        self.doctor = Doctor.objects.create(name='Dr. Push', specialty='Events')
+        self.schedule = Schedule.objects.create(doctor=self.doctor, date='2099-02-01', start_time='09:00', end_time='09:30')
+        self.addCleanup(hub.close)
+
+    def event(self, doctor_id, day='2099-02-01', slot_id=1):
+        return json.dumps({'id': slot_id, 'doctor': doctor_id, 'date': day, 'start_time': '09:00:00', 'is_available': False})
+
+    def test_booking_and_cancelling_publish_the_slot(self):
+        """
+        Ensure bookings and cancellations publish the changed slot in their transaction.
+        """
+        with mock.patch('api.booking.publish_slot_changes') as publish:
+            appointment = book_schedule(self.patient, self.schedule)
+            cancel_appointment(appointment)
+
+        booked, = publish.call_args_list[0].args[0]
+        released, = publish.call_args_list[1].args[0]
+        self.assertEqual(booked, (self.schedule.pk, self.doctor.pk, self.schedule.date, self.schedule.start_time, False))
+        self.assertEqual(released[0], self.schedule.pk)
+        self.assertIs(released[4], True)
+
+    async def test_hub_routes_events_by_doctor_and_date(self):
+        """
+        Ensure subscribers only get events for their doctor and, if given, their date.
+        """
+        events = SlotEventHub()
+        doctor = Subscription(1)
+        one_day = Subscription(1, '2099-02-01')
+        other_doctor = Subscription(2)
+        for subscription in (doctor, one_day, other_doctor):
+            events.subscribers[subscription.doctor_id].add(subscription)
+
+        events.dispatch(self.event(1, day='2099-02-02'))
+        events.dispatch(self.event(1))
+
+        self.assertEqual(doctor.queue.qsize(), 2)
+        self.assertEqual(await one_day.get(), ('slot', self.event(1)))
+        self.assertTrue(one_day.queue.empty())
+        self.assertTrue(other_doctor.queue.empty())
+
+    async def test_slow_subscribers_are_told_to_resync(self):
+        """
+        Ensure a subscriber that falls too far behind gets one resync event instead of a backlog.
+        """
+        subscription = Subscription(1, max_pending=3)
+        for slot_id in range(5):
+            subscription.put(('slot', self.event(1, slot_id=slot_id)))
+
+        # The fourth event overflowed the queue; the fifth happened after the resync point.
+        self.assertEqual(await subscription.get(), Subscription.RESYNC)
+        self.assertEqual(await subscription.get(), ('slot', self.event(1, slot_id=4)))
+        self.assertTrue(subscription.queue.empty())
+
+    async def test_stream_sends_the_doctors_slot_events(self):
+        """
+        Ensure the event stream relays the doctor's slot changes as Server-Sent Events.
+        """
+        response = await self.async_client.get(f'/api/schedules/events/?doctor_id={self.doctor.pk}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        hub.dispatch(self.event(self.doctor.pk + 1))
+        hub.dispatch(self.event(self.doctor.pk))
+        self.assertEqual(await anext(stream), f'event: slot\ndata: {self.event(self.doctor.pk)}\n\n'.encode())
+
+        await stream.aclose()
+
+    async def test_stream_requires_a_doctor(self):
+        """
+        Ensure the event stream rejects requests without a valid doctor_id.
+        """
+        for query in ('', '?doctor_id=abc', '?doctor_id=1&date=tomorrow'):
+            response = await self.async_client.get(f'/api/schedules/events/{query}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'], READ_YOUR_WRITES_SECONDS=15)
+class ReplicaRoutingTest(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+        caches[API_CACHE].clear()
+        token_cache.clear()
+        self.addCleanup(token_cache.clear)
+
+    def route(self, request, status_code=200, user=None):
+        """
+        Run `request` through the middleware, authenticating `user` like DRF
+        would; returns (where a read would go, the response).
+        """
+        seen = []
+
+        def view(request):
+            if user is not None:
+                request.user = user
+            seen.append(self.router.db_for_read(Doctor))
+            return HttpResponse(status=status_code)
+
+        response = ReplicaReadMiddleware(view)(request)
+        return seen[0], response
+
+    def test_reads_outside_requests_stay_on_the_primary(self):
+        """
+        Ensure commands and jobs, which run outside requests, never read from a replica; writes always go to the primary.
+        """
+        self.assertEqual(self.router.db_for_read(Schedule), 'default')
+        with replica_reads():
+            self.assertIn(self.router.db_for_read(Schedule), ('replica1', 'replica2'))
+            self.assertEqual(self.router.db_for_write(Schedule), 'default')
+        self.assertFalse(self.router.allow_migrate('replica1', 'api'))
+
+    def test_safe_requests_read_from_replicas(self):
+        """
+        Ensure GET requests read from a replica and leave no pin behind.
+        """
+        database, response = self.route(self.factory.get('/api/doctors/'))
+
+        self.assertIn(database, ('replica1', 'replica2'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        """
+        Ensure a successful write reads from the primary and pins the client's next reads there.
+        """
+        database, response = self.route(self.factory.post('/api/appointments/'), status_code=201)
+        self.assertEqual(database, 'default')
+        self.assertEqual(response.cookies[PIN_COOKIE]['max-age'], 15)
+
+        request = self.factory.get('/api/schedules/')
+        request.COOKIES[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        database, _ = self.route(request)
+        self.assertEqual(database, 'default')
+
+    def test_a_request_reads_from_a_single_replica(self):
+        """
+        Ensure every read of one request goes to the same replica, so it sees one consistent state.
+        """
+        with replica_reads():
+            self.assertEqual(len({self.router.db_for_read(model) for model in [Doctor, Schedule] * 20}), 1)
+
+    def test_writes_pin_token_clients_without_cookies(self):
+        """
+        Ensure a token client that drops cookies is pinned to the primary by its patient id.
+        """
+        patient = Patient(pk=4242, email='token-client@example.com')
+        token_cache.set('pinned-token', patient, None)
+        _, response = self.route(self.factory.post('/api/appointments/'), status_code=201, user=patient)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        database, _ = self.route(self.factory.get('/api/schedules/', HTTP_AUTHORIZATION='Token pinned-token'))
+        self.assertEqual(database, 'default')
+        token_cache.set('other-token', Patient(pk=4343, email='other@example.com'), None)
+        database, _ = self.route(self.factory.get('/api/schedules/', HTTP_AUTHORIZATION='Token other-token'))
+        self.assertIn(database, ('replica1', 'replica2'))
+
+    def test_failed_writes_do_not_pin(self):
+        """
+        Ensure a rejected write (nothing changed) keeps the client on the replicas.
+        """
+        _, response = self.route(self.factory.post('/api/appointments/'), status_code=409)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_means_no_routing(self):
+        """
+        Ensure the single-database setup is unchanged: primary reads, no cookies.
+        """
+        database, response = self.route(self.factory.post('/api/appointments/'), status_code=201)
+        self.assertEqual(database, 'default')
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+class DatabasePoolMetricsTest(APITestCase):
+    def setUp(self):
+        self.staff = Patient.objects.create(email='ops@example.com', is_staff=True)
+        self.patient = Patient.objects.create(email='not-ops@example.com')
+
+    def test_staff_can_read_this_workers_pool_counters(self):
+        """
+        Ensure the pool metrics report size, in-use connections, checkouts and wait time per pooled database.
+        """
+        if connection.pool is None:
+            raise SkipTest('Connection pooling is off (DB_POOL=false).')
+        self.client.force_authenticate(self.staff)
+
+        response = self.client.get(reverse('db-pool-metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        pool = response.data['pools']['default']
+        # The test case's transaction holds a connection for the whole test.
+        self.assertGreaterEqual(pool['in_use'], 1)
+        self.assertGreaterEqual(pool['checkouts'], 1)
+        self.assertLessEqual(pool['size'], pool['max_size'])
+        self.assertIn('wait_ms_total', pool)
+
+    def test_pool_checks_connections_before_handing_them_out(self):
+        """
+        Ensure the pool has a `check` callback; Django's per-request health check skips pooled connections.
+        """
+        if connection.pool is None:
+            raise SkipTest('Connection pooling is off (DB_POOL=false).')
+        self.assertIs(connection.pool._check, ConnectionPool.check_connection)
+
+    def test_patients_cannot_read_pool_metrics(self):
+        """
+        Ensure pool metrics are staff-only.
+        """
+        self.client.force_authenticate(self.patient)
+        response = self.client.get(reverse('db-pool-metrics'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
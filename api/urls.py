@@ -1,8 +1,11 @@
 from django.urls import path
+from .async_views import PatientRegistrationView, CustomAuthToken
 from .views import (
-    PatientRegistrationView, CustomAuthToken, UserProfileView, 
-    DoctorListView, DoctorDetailView, ScheduleListView,
-    AppointmentListCreateView, AppointmentCancelView
+    UserProfileView,
+    DoctorListView, DoctorSearchView, DoctorDetailView, ScheduleListView, ScheduleCalendarView,
+    AppointmentListCreateView, AppointmentHistoryView, AppointmentCancelView, AppointmentBatchView, AppointmentBatchCancelView,
+    SlotHoldCreateView, SlotHoldConfirmView, SlotHoldReleaseView, WaitlistListCreateView, WaitlistWithdrawView, DatabasePoolMetricsView,
+    TokenCacheMetricsView,
 )
 
 urlpatterns = [
@@ -10,8 +13,20 @@ urlpatterns = [
     path('login/', CustomAuthToken.as_view(), name='login'),
     path('me/', UserProfileView.as_view(), name='user-profile'),
     path('doctors/', DoctorListView.as_view(), name='doctor-list'),
+    path('doctors/search/', DoctorSearchView.as_view(), name='doctor-search'),
     path('doctors/<int:pk>/', DoctorDetailView.as_view(), name='doctor-detail'),
     path('schedules/', ScheduleListView.as_view(), name='schedule-list'),
+    path('schedules/calendar/', ScheduleCalendarView.as_view(), name='schedule-calendar'),
     path('appointments/', AppointmentListCreateView.as_view(), name='appointment-list'),
+    path('appointments/history/', AppointmentHistoryView.as_view(), name='appointment-history'),
     path('appointments/<int:pk>/cancel/', AppointmentCancelView.as_view(), name='appointment-cancel'),
+    path('appointments/batch/', AppointmentBatchView.as_view(), name='appointment-batch'),
+    path('appointments/batch/cancel/', AppointmentBatchCancelView.as_view(), name='appointment-batch-cancel'),
+    path('holds/', SlotHoldCreateView.as_view(), name='hold-create'),
+    path('holds/<int:pk>/', SlotHoldReleaseView.as_view(), name='hold-release'),
+    path('holds/<int:pk>/confirm/', SlotHoldConfirmView.as_view(), name='hold-confirm'),
+    path('waitlist/', WaitlistListCreateView.as_view(), name='waitlist-list'),
+    path('waitlist/<int:pk>/', WaitlistWithdrawView.as_view(), name='waitlist-withdraw'),
+    path('metrics/db-pool/', DatabasePoolMetricsView.as_view(), name='db-pool-metrics'),
+    path('metrics/token-cache/', TokenCacheMetricsView.as_view(), name='token-cache-metrics'),
 ]
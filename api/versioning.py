@@ -0,0 +1,109 @@
+"""
+Version counters behind the ETag and Last-Modified headers of the doctor and
+schedule read endpoints.
+
+Every write to a Doctor, Schedule or Appointment bumps the 'global' counter
+and the counter of the doctor it belongs to ('doctor:<id>'); Doctor writes
+also bump 'doctors', the roster behind the doctor list. Bumps run after the
+transaction commits (see `bump_versions_on_commit` and api/signals.py) and
+update one row per statement, so bookings never hold these rows locked.
+
+A conditional GET then costs one primary-key lookup on the counter table
+instead of the listing query and its serialization.
+"""
+import hashlib
+from datetime import datetime, time
+
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponseNotModified
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import ResourceVersion
+
+GLOBAL_KEY = 'global'
+ROSTER_KEY = 'doctors'
+
+
+def doctor_key(doctor_id):
+    return f'doctor:{doctor_id}'
+
+
+def bump_versions(doctor_ids=(), roster=False):
+    """
+    Increment the global counter, the roster counter if `roster`, and the
+    counters of `doctor_ids`, creating any that don't exist yet.
+    """
+    now = timezone.now()
+    keys = [GLOBAL_KEY]
+    if roster:
+        keys.append(ROSTER_KEY)
+    keys.extend(doctor_key(pk) for pk in sorted(set(doctor_ids)))
+
+    for key in keys:
+        counter = ResourceVersion.objects.filter(pk=key)
+        if not counter.update(version=F('version') + 1, updated_at=now):
+            # First write for this key. Creating it at 0 and bumping again keeps
+            # the version moving even if a concurrent bump created it meanwhile.
+            ResourceVersion.objects.bulk_create([ResourceVersion(key=key, version=0, updated_at=now)], ignore_conflicts=True)
+            counter.update(version=F('version') + 1, updated_at=now)
+
+
+def bump_versions_on_commit(doctor_ids=(), roster=False):
+    """
+    Bump the counters once the current transaction commits (right away outside one).
+    A failed bump is logged rather than failing a write that already committed.
+    """
+    doctor_ids = set(doctor_ids)
+    transaction.on_commit(lambda: bump_versions(doctor_ids, roster), robust=True)
+
+
+def get_version(key):
+    return ResourceVersion.objects.filter(pk=key).values_list('version', 'updated_at').first() or (0, None)
+
+
+async def aget_version(key):
+    return await ResourceVersion.objects.filter(pk=key).values_list('version', 'updated_at').afirst() or (0, None)
+
+
+class Validators:
+    """
+    The ETag and Last-Modified of one representation of a versioned resource.
+
+    `variant` lists everything else the body depends on, such as the
+    negotiated media type. Pass `daily=True` for responses that also depend
+    on today's date, e.g. schedule listings that start from today.
+    """
+
+    def __init__(self, key, version, updated_at, variant=(), daily=False):
+        parts = [key, str(version), *map(str, variant)]
+        if daily:
+            today = timezone.localdate()
+            parts.append(today.isoformat())
+            midnight = timezone.make_aware(datetime.combine(today, time.min))
+            updated_at = max(updated_at, midnight) if updated_at else midnight
+        self.etag = '"%s"' % hashlib.sha1(':'.join(parts).encode()).hexdigest()
+        self.last_modified = int(updated_at.timestamp()) if updated_at else None
+
+    def evaluate(self, request):
+        """
+        Return a 304 (or 412) response if the request's preconditions say the
+        client's copy is current, otherwise None.
+        """
+        response = get_conditional_response(request, etag=self.etag, last_modified=self.last_modified)
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response):
+        if not (200 <= response.status_code < 300 or isinstance(response, HttpResponseNotModified)):
+            return response
+        response['ETag'] = self.etag
+        if self.last_modified is not None:
+            response['Last-Modified'] = http_date(self.last_modified)
+        # Shared caches (nginx) may store the response but must revalidate it on every use.
+        patch_cache_control(response, public=True, no_cache=True)
+        patch_vary_headers(response, ['Accept'])
+        return response
@@ -1,48 +1,138 @@
+import os
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics, serializers
-from .serializers import PatientSerializer, EmailAuthTokenSerializer, DoctorSerializer, ScheduleSerializer, AppointmentSerializer
-from rest_framework.authtoken.views import ObtainAuthToken
-from rest_framework.authtoken.models import Token
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.authentication import TokenAuthentication
-from .models import Patient, Doctor, Schedule, Appointment
+from .serializers import (
+    PatientSerializer, DoctorSerializer, ScheduleSerializer, AppointmentSerializer, CalendarQuerySerializer, GridSlotSerializer,
+    APPOINTMENT_EXPANSIONS, BatchBookingSerializer, BatchCancelSerializer, BatchRequestSerializer, WaitlistEntrySerializer,
+    ArchivedAppointmentSerializer, SlotHoldSerializer,
+)
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
+from .models import Patient, Doctor, Schedule, Appointment, ArchivedAppointment, SlotGrid, SlotHold, WaitlistEntry
+from .authentication import CachedTokenAuthentication, token_cache
+from .fastpath import FastJSONRenderer, row_serializer
+from .dbpool import pool_stats
+from .caching import get_or_compute, payload_key
+from .holds import confirm_hold, hold_schedule, release_hold
+from .idempotency import idempotent
+from .booking import BOOKED, CANCELLED, book_schedule, book_schedules, cancel_appointment, cancel_appointments
+from .pagination import (
+    DoctorCursorPagination, ScheduleCursorPagination, AppointmentCursorPagination, GridSlotPagination, RankedPagination,
+    WaitlistCursorPagination,
+)
+from .scheduling import availability_calendar
+from .search import search_doctors
+from .slotgrid import filter_grids, grid_storage_enabled, iter_slots
+from .versioning import GLOBAL_KEY, ROSTER_KEY, Validators, doctor_key, get_version
+from django.db import IntegrityError, transaction
 from django.utils import timezone
 
-class PatientRegistrationView(APIView):
+
+def filter_schedules(queryset, params):
     """
-    Allows new patients to register.
+    Optionally restricts the returned schedules to a given doctor and date,
+    by filtering against `doctor_id` and `date` query parameters in the URL.
+    Shared by the sync and async schedule list views.
     """
-    authentication_classes = []
-    permission_classes = [AllowAny]
+    doctor_id = params.get('doctor_id')
+    date = params.get('date')
 
-    def post(self, request, format=None):
-        serializer = PatientSerializer(data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    if doctor_id is not None:
+        queryset = queryset.filter(doctor__pk=doctor_id)
 
-class CustomAuthToken(ObtainAuthToken):
-    serializer_class = EmailAuthTokenSerializer
+    if date is not None:
+        queryset = queryset.filter(date=date)
+    else:
+        # If no date is specified, return all available schedules from today onwards
+        queryset = queryset.filter(date__gte=timezone.now().date(), is_available=True)
+
+    return queryset
+
+
+def expanded_appointment_serializer(params):
+    """
+    The serializer for an appointment listing with an optional `expand`
+    query parameter (see serializers.APPOINTMENT_EXPANSIONS), e.g.
+    `?expand=schedule.doctor`. Expanded lists are still read with one query:
+    api.fastpath joins the related tables into the same values_list().
+    Shared by the sync and async appointment list views.
+    """
+    expand = params.get('expand')
+    if not expand:
+        return AppointmentSerializer
+    try:
+        return APPOINTMENT_EXPANSIONS[expand]
+    except KeyError:
+        choices = ', '.join(APPOINTMENT_EXPANSIONS)
+        raise serializers.ValidationError({'expand': [f'Unknown expansion "{expand}". Choose from: {choices}.']})
+
+
+def schedule_version_key(params):
+    """
+    The version counter a schedule listing with these query parameters depends on.
+    """
+    doctor_id = params.get('doctor_id')
+    return doctor_key(doctor_id) if doctor_id is not None else GLOBAL_KEY
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag and Last-Modified headers (see api/versioning.py) to GET
+    responses, and answers with 304 Not Modified before the view runs its
+    query when the client's copy is still current. Views that set
+    `payload_cache_name` also share their payloads between clients through
+    api/caching.py, keyed by the same version.
+    """
+    # Set when the response also depends on today's date.
+    version_is_daily = False
+    # Set to a name to keep the payloads in the api cache (see api/caching.py).
+    payload_cache_name = None
+
+    def get_version_key(self):
+        return GLOBAL_KEY
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_version_key()
+        version, updated_at = get_version(key)
+        validators = Validators(key, version, updated_at, variant=[request.accepted_media_type], daily=self.version_is_daily)
+        not_modified = validators.evaluate(request)
+        if not_modified is not None:
+            return not_modified
+        payload = None
+        if self.payload_cache_name is not None:
+            payload = payload_key(
+                self.payload_cache_name, key, version, updated_at, request.query_params, request.build_absolute_uri('/'),
+                self.version_is_daily,
+            )
+        if payload is None:
+            return validators.apply(super().get(request, *args, **kwargs))
+        fetch = super().get
+        return validators.apply(Response(get_or_compute(payload, lambda: fetch(request, *args, **kwargs).data)))
+
+
+class FastListMixin:
+    """
+    Lists through api.fastpath: rows are read with values_list() and rendered
+    as the serializer would render them, then encoded by FastJSONRenderer.
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        rows = row_serializer(self.get_serializer_class())
+        queryset = rows.values_list(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(rows.to_representation(queryset))
+        return self.get_paginated_response(rows.to_representation(page))
 
-    def post(self, request, *args, **kwargs):
-        serializer = self.serializer_class(data=request.data,
-                                           context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        user = serializer.validated_data['user']
-        token, created = Token.objects.get_or_create(user=user)
-        return Response({
-            'token': token.key,
-            'user_id': user.pk,
-            'email': user.email
-        })
 
 class UserProfileView(APIView):
     """
     Handles retrieving and updating authenticated user's profile.
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request, format=None):
@@ -64,16 +154,37 @@ class UserProfileView(APIView):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class DoctorListView(generics.ListAPIView):
+class DoctorListView(ConditionalGetMixin, FastListMixin, generics.ListAPIView):
     """
-    Provides a list of all doctors.
+    Provides a list of all doctors, one cursor page at a time.
     """
     queryset = Doctor.objects.all()
     serializer_class = DoctorSerializer
     permission_classes = [AllowAny]
+    pagination_class = DoctorCursorPagination
+    payload_cache_name = 'doctors'
+
+    def get_version_key(self):
+        return ROSTER_KEY
+
+
+class DoctorSearchView(generics.ListAPIView):
+    """
+    Searches doctors by name, specialty or department, best matches first.
+    Matches prefixes and tolerates typos, e.g. `?q=cardiolgy`.
+    """
+    serializer_class = DoctorSerializer
+    permission_classes = [AllowAny]
+    pagination_class = RankedPagination
+
+    def get_queryset(self):
+        query = self.request.query_params.get('q', '').strip()
+        if not query:
+            raise serializers.ValidationError({'q': ['This query parameter is required.']})
+        return search_doctors(Doctor.objects.all(), query)
 
 
-class DoctorDetailView(generics.RetrieveAPIView):
+class DoctorDetailView(ConditionalGetMixin, generics.RetrieveAPIView):
     """
     Provides details of a single doctor.
     """
@@ -81,44 +192,82 @@ class DoctorDetailView(generics.RetrieveAPIView):
     serializer_class = DoctorSerializer
     permission_classes = [AllowAny]
 
+    def get_version_key(self):
+        return doctor_key(self.kwargs['pk'])
+
 
 from django.utils import timezone
 
-class ScheduleListView(generics.ListAPIView):
+class ScheduleListView(ConditionalGetMixin, FastListMixin, generics.ListAPIView):
     """
     List schedules, filtered by doctor_id and date.
     If no date is provided, returns all future available schedules for the doctor.
+    Results are cursor-paginated on (date, start_time, id).
+    With SCHEDULE_STORAGE = 'grid' the slots are expanded from SlotGrid rows.
     """
     serializer_class = ScheduleSerializer
     permission_classes = [AllowAny]
+    pagination_class = ScheduleCursorPagination
+    payload_cache_name = 'schedules'
 
     def get_queryset(self):
-        """
-        Optionally restricts the returned schedules to a given doctor and date,
-        by filtering against `doctor_id` and `date` query parameters in the URL.
-        """
-        queryset = Schedule.objects.all()
-        doctor_id = self.request.query_params.get('doctor_id')
-        date = self.request.query_params.get('date')
-
-        if doctor_id is not None:
-            queryset = queryset.filter(doctor__pk=doctor_id)
-        
-        if date is not None:
-            queryset = queryset.filter(date=date)
+        return filter_schedules(Schedule.objects.all(), self.request.query_params)
+
+    def list(self, request, *args, **kwargs):
+        if not grid_storage_enabled():
+            return super().list(request, *args, **kwargs)
+
+        grids, available_only = filter_grids(SlotGrid.objects.all(), request.query_params)
+        paginator = GridSlotPagination()
+        page = paginator.paginate_slots(grids, request, available_only)
+        if page is None:
+            return Response(GridSlotSerializer(iter_slots(grids, available_only), many=True).data)
+        return paginator.get_paginated_response(GridSlotSerializer(page, many=True).data)
+
+    def get_version_key(self):
+        return schedule_version_key(self.request.query_params)
+
+    @property
+    def version_is_daily(self):
+        # Without a date the listing starts from today.
+        return 'date' not in self.request.query_params
+
+
+class ScheduleCalendarView(APIView):
+    """
+    Free and booked slot counts per day for a doctor (`doctor_id`) or a whole
+    specialty (`specialty`) between `start` and `end`, e.g. to draw a month
+    view with one request instead of one per day.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, format=None):
+        params = CalendarQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+
+        schedules = SlotGrid.objects.all() if grid_storage_enabled() else Schedule.objects.all()
+        if 'doctor_id' in query:
+            schedules = schedules.filter(doctor_id=query['doctor_id'])
         else:
-            # If no date is specified, return all available schedules from today onwards
-            queryset = queryset.filter(date__gte=timezone.now().date(), is_available=True)
-            
-        return queryset
+            schedules = schedules.filter(doctor__specialty=query['specialty'])
+
+        days = availability_calendar(schedules, query['start'], query['end'])
+        return Response([
+            {'date': day['date'].isoformat(), 'free': day['free'], 'booked': day['booked']}
+            for day in days
+        ])
 
-class AppointmentListCreateView(generics.ListCreateAPIView):
+class AppointmentListCreateView(FastListMixin, generics.ListCreateAPIView):
     """
     List all appointments for the logged-in user, or create a new appointment.
+    `?expand=schedule` or `?expand=schedule.doctor` inlines the related records.
+    Bookings may carry an `Idempotency-Key` header (see api/idempotency.py).
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     serializer_class = AppointmentSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = AppointmentCursorPagination
 
     def get_queryset(self):
         """
@@ -127,29 +276,48 @@ class AppointmentListCreateView(generics.ListCreateAPIView):
         """
         return Appointment.objects.filter(patient=self.request.user)
 
+    def get_serializer_class(self):
+        # Bookings are validated and answered with the plain serializer.
+        if self.request.method == 'GET':
+            return expanded_appointment_serializer(self.request.query_params)
+        return AppointmentSerializer
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
     def perform_create(self, serializer):
+        # The serializer has already rejected schedules that were visibly taken;
+        # book_schedule settles any remaining race and raises a 409 for the loser.
         schedule = serializer.validated_data['schedule']
-        
-        if not schedule.is_available:
-            raise serializers.ValidationError({"error": "This schedule is not available."})
+        serializer.instance = book_schedule(self.request.user, schedule)
+
+class AppointmentHistoryView(FastListMixin, generics.ListAPIView):
+    """
+    Lists the logged-in patient's archived appointments: those whose slot
+    was moved out of the live tables by `manage.py archive_past_schedules`.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    serializer_class = ArchivedAppointmentSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = AppointmentCursorPagination
+
+    def get_queryset(self):
+        return ArchivedAppointment.objects.filter(patient=self.request.user)
 
-        # Set the patient to the logged-in user
-        appointment = serializer.save(patient=self.request.user)
-        
-        # Mark the schedule as unavailable
-        schedule.is_available = False
-        schedule.save()
 
 class AppointmentCancelView(APIView):
     """
-    Allows a patient to cancel their appointment.
+    Allows a patient to cancel their appointment. Accepts an `Idempotency-Key`
+    header like bookings do.
     """
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @idempotent
     def patch(self, request, pk, format=None):
         try:
-            appointment = Appointment.objects.get(pk=pk, patient=request.user)
+            appointment = Appointment.objects.select_related('schedule').get(pk=pk, patient=request.user)
         except Appointment.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -157,12 +325,186 @@ class AppointmentCancelView(APIView):
         if appointment.status != 'booked':
             return Response({'error': 'This appointment cannot be cancelled.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        appointment.status = 'cancelled'
-        appointment.save()
+        # Cancels the appointment and makes the schedule available again
+        if not cancel_appointment(appointment):
+            return Response({'error': 'This appointment cannot be cancelled.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-        # Make the schedule available again
-        schedule = appointment.schedule
-        schedule.is_available = True
-        schedule.save()
 
+class SlotHoldCreateView(generics.CreateAPIView):
+    """
+    Holds a schedule for the logged-in patient for SLOT_HOLD_SECONDS while
+    they fill in the booking form: `{"schedule": 1}`. The slot is off the
+    schedule list for everyone until the hold is confirmed, deleted or
+    expires (see api/holds.py).
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    serializer_class = SlotHoldSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        # Like bookings: a slot taken since validation gets a 409.
+        serializer.instance = hold_schedule(self.request.user, serializer.validated_data['schedule'])
+
+
+class SlotHoldConfirmView(APIView):
+    """
+    Books the held slot for the patient. Accepts an `Idempotency-Key` header like bookings do.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    @idempotent
+    def post(self, request, pk, format=None):
+        try:
+            hold = SlotHold.objects.select_related('schedule').get(pk=pk, patient=request.user)
+        except SlotHold.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        appointment = confirm_hold(hold)
+        return Response(AppointmentSerializer(appointment).data, status=status.HTTP_201_CREATED)
+
+
+class SlotHoldReleaseView(APIView):
+    """
+    Gives a held slot back before the hold expires.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, pk, format=None):
+        try:
+            hold = SlotHold.objects.select_related('schedule').get(pk=pk, patient=request.user)
+        except SlotHold.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        if not release_hold(hold):
+            return Response(status=status.HTTP_404_NOT_FOUND)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def batch_status(succeeded, total):
+    """
+    200/201 when every item succeeded, 207 Multi-Status when only some did, 409 when none did.
+    """
+    if succeeded == total:
+        return None
+    return status.HTTP_207_MULTI_STATUS if succeeded else status.HTTP_409_CONFLICT
+
+
+class AppointmentBatchView(APIView):
+    """
+    Books several schedules at once, e.g. for a family:
+    `{"schedules": [1, 2, 3], "mode": "all_or_nothing" | "best_effort"}`.
+
+    Every item is reported with its outcome (`booked`, `unavailable`,
+    `not_found`, or `skipped` when an all-or-nothing batch was rolled back).
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        serializer = BatchBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        results = book_schedules(
+            request.user, data['schedules'], all_or_nothing=data['mode'] == BatchRequestSerializer.ALL_OR_NOTHING
+        )
+
+        items = []
+        for schedule, outcome, appointment in results:
+            item = {'schedule': schedule, 'status': outcome}
+            if appointment is not None:
+                item['appointment'] = AppointmentSerializer(appointment).data
+            items.append(item)
+        booked = sum(outcome == BOOKED for _, outcome, _ in results)
+        return Response(
+            {'mode': data['mode'], 'results': items},
+            status=batch_status(booked, len(results)) or status.HTTP_201_CREATED,
+        )
+
+
+class AppointmentBatchCancelView(APIView):
+    """
+    Cancels several of the patient's appointments at once:
+    `{"appointments": [1, 2, 3], "mode": "all_or_nothing" | "best_effort"}`.
+
+    Every item is reported with its outcome (`cancelled`, `not_cancellable`,
+    `not_found`, or `skipped` when an all-or-nothing batch was not applied).
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, format=None):
+        serializer = BatchCancelSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        results = cancel_appointments(
+            request.user, data['appointments'], all_or_nothing=data['mode'] == BatchRequestSerializer.ALL_OR_NOTHING
+        )
+
+        cancelled = sum(outcome == CANCELLED for _, outcome in results)
+        return Response(
+            {'mode': data['mode'], 'results': [{'appointment': pk, 'status': outcome} for pk, outcome in results]},
+            status=batch_status(cancelled, len(results)) or status.HTTP_200_OK,
+        )
+
+
+class WaitlistListCreateView(FastListMixin, generics.ListCreateAPIView):
+    """
+    Lists the logged-in patient's waitlist entries, or joins the waitlist for
+    a doctor and date. When a booking with that doctor on that date is
+    cancelled, the slot is booked for the longest-waiting patient and their
+    entry becomes `assigned`, pointing at the new appointment.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    serializer_class = WaitlistEntrySerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = WaitlistCursorPagination
+
+    def get_queryset(self):
+        return WaitlistEntry.objects.filter(patient=self.request.user)
+
+    def perform_create(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save(patient=self.request.user)
+        except IntegrityError:
+            # A concurrent request added the same entry after validation.
+            raise serializers.ValidationError(["You are already on the waitlist for this doctor and date."])
+
+
+class WaitlistWithdrawView(APIView):
+    """
+    Takes the patient off the waitlist for one doctor and date.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, pk, format=None):
+        withdrawn = WaitlistEntry.objects.filter(pk=pk, patient=request.user, status='waiting').update(status='withdrawn')
+        if not withdrawn:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class DatabasePoolMetricsView(APIView):
+    """
+    Connection pool counters of the worker process answering the request (see api.dbpool); staff only.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response({'pid': os.getpid(), 'pools': pool_stats()})
+
+
+class TokenCacheMetricsView(APIView):
+    """
+    Hit, miss and eviction counters of the token cache in the worker process answering the request; staff only.
+    """
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, format=None):
+        return Response({'pid': os.getpid(), 'token_cache': token_cache.stats()})
+
@@ -0,0 +1,89 @@
+"""
+Waitlist assignment.
+
+When someone is waiting for a doctor and date, a cancelled booking does not
+put its slot back on the schedule list: the slot is booked for the
+longest-waiting eligible patient inside the cancelling transaction, so it
+is never visible as free and nobody has to race for it.
+
+The next waiters are read off the partial waitlist_queue_idx index, one
+index probe however long the queue is. They are locked with
+FOR UPDATE SKIP LOCKED, so concurrent cancellations for the same doctor and
+date hand their slots to different waiters instead of queueing behind each
+other's locks.
+"""
+from collections import defaultdict
+
+from django.db.models import Exists, OuterRef
+
+from .jobs import enqueue_many
+from .models import Appointment, WaitlistEntry
+
+
+def next_waiters(doctor_id, day, count, released_by=()):
+    """
+    Up to `count` waiting entries for the doctor and date, oldest first,
+    locked until the transaction ends. Inactive patients, patients who
+    have since booked with the doctor that day and the patients in
+    `released_by` (those giving the slots up) are passed over.
+    """
+    booked = Appointment.objects.filter(
+        patient=OuterRef('patient_id'), status='booked', schedule__doctor_id=doctor_id, schedule__date=day
+    )
+    waiters = WaitlistEntry.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+        ~Exists(booked), doctor_id=doctor_id, date=day, status='waiting', patient__is_active=True
+    )
+    if released_by:
+        # Their own booking is cancelled already, so the Exists() above no longer excludes them.
+        waiters = waiters.exclude(patient_id__in=released_by)
+    return list(waiters.order_by('created_at', 'id')[:count])
+
+
+def assign_freed_schedules(schedules, released_by=None):
+    """
+    Book each of the just-freed `schedules` (still marked unavailable) for
+    the next waiter for its doctor and date. `released_by` maps schedule ids
+    to the patient who gave the schedule up, who is never handed it back.
+    Must run inside the cancelling transaction; costs one queue lookup per
+    doctor and date, plus an INSERT for the appointments, one for their
+    confirmation jobs and one UPDATE when anyone was waiting.
+
+    Returns the schedules nobody was waiting for, which the caller releases.
+    """
+    released_by = released_by or {}
+    by_day = defaultdict(list)
+    for schedule in schedules:
+        by_day[(schedule.doctor_id, schedule.date)].append(schedule)
+
+    unassigned = []
+    if len(by_day) > 1:
+        # One query finds the doctors and dates anyone waits for, instead of a queue lookup for each.
+        waited_for = set(
+            WaitlistEntry.objects.filter(
+                status='waiting', doctor_id__in={doctor_id for doctor_id, _ in by_day}, date__in={day for _, day in by_day}
+            ).values_list('doctor_id', 'date').distinct()
+        )
+        for key in [key for key in by_day if key not in waited_for]:
+            unassigned.extend(by_day.pop(key))
+
+    assigned = []
+    for (doctor_id, day), freed in by_day.items():
+        releasers = {released_by[schedule.pk] for schedule in freed if schedule.pk in released_by}
+        waiters = next_waiters(doctor_id, day, len(freed), releasers)
+        assigned.extend(zip(freed, waiters))
+        unassigned.extend(freed[len(waiters):])
+    if not assigned:
+        return unassigned
+
+    # The caller bumps the doctors' versions for the cancellations; these bookings are in the same ones.
+    appointments = Appointment.objects.bulk_create(
+        Appointment(patient_id=entry.patient_id, schedule=schedule) for schedule, entry in assigned
+    )
+    entries = []
+    for (_, entry), appointment in zip(assigned, appointments):
+        entry.status = 'assigned'
+        entry.appointment = appointment
+        entries.append(entry)
+    WaitlistEntry.objects.bulk_update(entries, ['status', 'appointment'])
+    enqueue_many('send_booking_confirmation', [{'appointment_id': appointment.pk} for appointment in appointments])
+    return unassigned
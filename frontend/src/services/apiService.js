@@ -37,8 +37,9 @@ export default {
   },
 
   // Doctors
+  // List endpoints are cursor-paginated; the views below still expect plain arrays.
   getDoctors() {
-    return apiClient.get('/doctors/');
+    return apiClient.get('/doctors/?paginate=false');
   },
   getDoctor(id) {
     return apiClient.get(`/doctors/${id}/`);
@@ -46,7 +47,7 @@ export default {
 
   // Schedules
   getSchedules(doctorId, date) {
-    let url = `/schedules/?doctor_id=${doctorId}`;
+    let url = `/schedules/?doctor_id=${doctorId}&paginate=false`;
     if (date) {
       url += `&date=${date}`;
     }
@@ -58,7 +59,7 @@ export default {
     return apiClient.post('/appointments/', { schedule: scheduleId });
   },
   getAppointments() {
-    return apiClient.get('/appointments/');
+    return apiClient.get('/appointments/?paginate=false');
   },
   cancelAppointment(id) {
     return apiClient.patch(`/appointments/${id}/cancel/`);
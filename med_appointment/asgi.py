@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "med_appointment.settings")
+# Route the read-heavy endpoints to their async views when served over ASGI.
+os.environ.setdefault("DJANGO_ROOT_URLCONF", "med_appointment.asgi_urls")
 
 application = get_asgi_application()
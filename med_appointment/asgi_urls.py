@@ -0,0 +1,13 @@
+"""
+URL configuration used by the ASGI application (see asgi.py).
+
+Same routes as urls.py, except that the read-heavy API endpoints resolve to
+async views first, so a slow client or query does not occupy the worker's
+single sync thread.
+"""
+from django.urls import path, include
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path("api/", include("api.async_urls")),
+] + wsgi_urlpatterns
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -40,6 +41,8 @@ CORS_ALLOWED_ORIGINS = [
     'http://127.0.0.1',
     'http://localhost:5173',
 ]
+# Lets browser clients send Idempotency-Key on bookings and cancellations (see api/idempotency.py).
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 
 # Application definition
@@ -51,6 +54,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
     "rest_framework.authtoken",
     "corsheaders",
@@ -59,6 +63,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.instrumentation.PerformanceMiddleware",
+    "api.routers.ReplicaReadMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -69,7 +75,8 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
-ROOT_URLCONF = "med_appointment.urls"
+# asgi.py points this at med_appointment.asgi_urls to serve the async read views.
+ROOT_URLCONF = os.environ.get("DJANGO_ROOT_URLCONF", "med_appointment.urls")
 
 TEMPLATES = [
     {
@@ -117,6 +124,40 @@ else:
         }
     }
 
+# Connection pooling: each worker process keeps up to DB_POOL_MAX_SIZE connections per database
+# (Django's psycopg pool) instead of opening one per request, and checks each one is alive before
+# handing it out. Requests beyond the pool size wait up to DB_POOL_TIMEOUT seconds for a connection.
+# Metrics per worker: /api/metrics/db-pool/ (see api/dbpool.py).
+if os.environ.get("DB_POOL", "true").lower() == "true":
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", 10)),
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", 10)),
+        },
+    }
+# For a pooled database Django turns this into the pool's `check` callback
+# (ConnectionPool.check_connection) and does not check the connection itself;
+# a "check" key in the pool options would clash with it.
+DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
+# Read replicas (see api/routers.py): DB_REPLICA_HOSTS="host[:port],..." adds one alias per
+# replica, with the primary's name and credentials. Listing the primary's own host gives
+# aliased connections to try the routing locally without a second server.
+DATABASE_REPLICAS = []
+for _number, _replica in enumerate(filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(",")), start=1):
+    _host, _, _port = _replica.strip().partition(":")
+    DATABASES[f"replica{_number}"] = {
+        **DATABASES["default"],
+        "HOST": _host,
+        "PORT": _port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{_number}")
+DATABASE_ROUTERS = ["api.routers.PrimaryReplicaRouter"]
+# Seconds a client's reads stay on the primary after one of its writes
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("READ_YOUR_WRITES_SECONDS", 15))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -166,10 +207,97 @@ AUTH_USER_MODEL = 'api.Patient'
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication', # For browsable API
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-}
\ No newline at end of file
+}
+
+# How open schedule slots are stored: 'rows' (one Schedule row per slot) or
+# 'grid' (one SlotGrid bitmask per doctor session, see api/slotgrid.py)
+SCHEDULE_STORAGE = os.environ.get('SCHEDULE_STORAGE', 'rows')
+
+# Per-process cache of authenticated tokens (see api/authentication.py). A token deleted or a
+# patient deactivated in one worker stays accepted by the others for up to TOKEN_CACHE_TTL.
+TOKEN_CACHE_MAX_SIZE = int(os.environ.get('TOKEN_CACHE_MAX_SIZE', 10000))
+TOKEN_CACHE_TTL = int(os.environ.get('TOKEN_CACHE_TTL', 60))  # seconds
+
+# Cached doctor and schedule listings (see api/caching.py): 'locmem' keeps them per
+# process, 'redis' shares them between workers through any Redis-compatible server
+# at API_CACHE_LOCATION, 'dummy' turns the cache off
+API_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+API_CACHE_BACKEND = os.environ.get('API_CACHE_BACKEND', 'locmem')
+API_CACHE_TTL = int(os.environ.get('API_CACHE_TTL', 300))  # seconds an entry outlives its last version
+API_CACHE_LOCK_TIMEOUT = int(os.environ.get('API_CACHE_LOCK_TIMEOUT', 5))  # seconds others wait for a recompute
+CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'api': {
+        'BACKEND': API_CACHE_BACKENDS[API_CACHE_BACKEND],
+        'LOCATION': os.environ.get('API_CACHE_LOCATION', 'redis://localhost:6379/0' if API_CACHE_BACKEND == 'redis' else 'api'),
+        'TIMEOUT': API_CACHE_TTL,
+        'KEY_PREFIX': 'med-appointment',
+    },
+}
+
+# Bookings and cancellations sent with an Idempotency-Key header are replayed to
+# retries for this long (see api/idempotency.py); `manage.py purge_idempotency_keys` deletes older keys
+IDEMPOTENCY_KEY_TTL = int(os.environ.get('IDEMPOTENCY_KEY_TTL', 86400))  # seconds
+
+# Slot holds (see api/holds.py): how long a held slot stays off the market, how many slots a
+# patient may hold at once, and how many expired holds each sweep transaction in `manage.py run_jobs` releases
+SLOT_HOLD_SECONDS = int(os.environ.get('SLOT_HOLD_SECONDS', 300))
+SLOT_HOLD_MAX_PER_PATIENT = int(os.environ.get('SLOT_HOLD_MAX_PER_PATIENT', 3))
+SLOT_HOLD_SWEEP_BATCH = int(os.environ.get('SLOT_HOLD_SWEEP_BATCH', 5000))
+
+# Bounded pool for password hashing in login/registration (see api/passwords.py)
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', 2))
+PASSWORD_HASHING_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASHING_QUEUE_SIZE', 16))
+
+# Per-request performance instrumentation (see api/instrumentation.py)
+PERFORMANCE_QUERY_BUDGET = int(os.environ.get('PERFORMANCE_QUERY_BUDGET', 10))
+PERFORMANCE_SERVER_TIMING = os.environ.get('PERFORMANCE_SERVER_TIMING', 'true').lower() == 'true'
+
+# Background job queue (see api/jobs.py); `manage.py run_jobs` runs the jobs
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', 300))  # seconds before a running job is considered abandoned
+JOB_RETRY_BACKOFF = int(os.environ.get('JOB_RETRY_BACKOFF', 10))  # seconds before the first retry, doubled per attempt
+JOB_RETRY_BACKOFF_MAX = int(os.environ.get('JOB_RETRY_BACKOFF_MAX', 3600))
+
+# `manage.py archive_past_schedules` moves slots older than this out of the live tables (see api/archive.py)
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 90))
+
+# Patient notifications are sent by background jobs (see api/tasks.py)
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'no-reply@med-appointment.local')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.performance': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERFORMANCE_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'api.jobs': {
+            'handlers': ['console'],
+            'level': os.environ.get('JOB_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+        'api.events': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}